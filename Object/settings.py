@@ -53,11 +53,13 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "drf_yasg",
     "corsheaders",
     "category",
     "product",
+    "images",
 ]
 
 MIDDLEWARE = [
@@ -108,6 +110,44 @@ cloudinary.config(
 )
 
 
+### backend lưu ảnh: upload, xoá ảnh qua outbox, tạo ảnh phái sinh (images.backends)
+### images.backends.LocalBackend: lưu trên đĩa, không cần Cloudinary (benchmark / load test / CI)
+IMAGE_STORAGE = {
+    "BACKEND": os.environ.get("IMAGE_STORAGE_BACKEND", "images.backends.CloudinaryBackend"),
+    "OPTIONS": {},
+}
+if IMAGE_STORAGE["BACKEND"] == "images.backends.LocalBackend":
+    IMAGE_STORAGE["OPTIONS"] = {
+        "root": os.environ.get("IMAGE_STORAGE_ROOT", str(BASE_DIR / "local_images")),
+        "base_url": os.environ.get("IMAGE_STORAGE_BASE_URL", "localhost:8000/api/images/local"),
+        "latency": float(os.environ.get("IMAGE_STORAGE_LATENCY", 0)),  # giây mỗi lời gọi
+        "jitter": float(os.environ.get("IMAGE_STORAGE_JITTER", 0)),
+        "error_rate": float(os.environ.get("IMAGE_STORAGE_ERROR_RATE", 0)),  # 0..1
+        "rate_limit": os.environ.get("IMAGE_STORAGE_RATE_LIMIT") or None,  # vd: "500/hour"
+    }
+
+### upload ảnh thẳng lên Cloudinary (images/uploads/sign -> client upload -> images/uploads/finalize)
+IMAGE_UPLOAD = {
+    "TOKEN_MAX_AGE": int(os.environ.get("IMAGE_UPLOAD_TOKEN_MAX_AGE", 600)),  # giây
+}
+
+### chuẩn hoá file upload trước khi lên Cloudinary (images.normalize), cần Pillow
+IMAGE_NORMALIZATION = {
+    "ENABLED": os.environ.get("IMAGE_NORMALIZATION", "1") == "1",
+    "MAX_DIMENSION": int(os.environ.get("IMAGE_MAX_DIMENSION", 2048)),  # px, cạnh dài nhất
+    "FORMAT": os.environ.get("IMAGE_NORMALIZE_FORMAT", "WEBP"),  # WEBP | JPEG
+    "QUALITY": int(os.environ.get("IMAGE_NORMALIZE_QUALITY", 82)),
+    "MAX_PIXELS": 40_000_000,  # ảnh lớn hơn bị từ chối (decompression bomb)
+    "WORKERS": 2,
+}
+
+### ảnh phái sinh tạo sẵn khi upload (preset -> width / format / quality), API trả về image_srcset
+IMAGE_DERIVATIVES = {
+    "thumb": {"width": 160, "format": "webp", "quality": 70},
+    "card": {"width": 480, "format": "webp", "quality": "auto"},
+    "detail": {"width": 1200, "format": "webp", "quality": "auto"},
+}
+
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
@@ -125,6 +165,67 @@ DATABASES = {
 }
 
 
+# Cache
+# Mặc định local-memory (mỗi worker gunicorn một cache riêng, chỉ worker ghi mới bị
+# invalidate ngay, worker khác chờ hết TIMEOUT) -> production nhiều worker nên trỏ
+# CACHE_BACKEND/CACHE_LOCATION sang Redis/Memcached dùng chung.
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.environ.get("CACHE_LOCATION", "object-catalog"),
+    }
+}
+
+CATALOG_CACHE = {
+    "ALIAS": "default",
+    "TIMEOUT": int(os.environ.get("CATALOG_CACHE_TIMEOUT", 300)),  # giây
+    "FACET_TIMEOUT": int(os.environ.get("CATALOG_FACET_CACHE_TIMEOUT", 60)),  ### facet theo từng bộ lọc
+    ### version (ETag) của danh sách: process ghi xoá ngay, process khác thấy thay đổi sau tối đa LIST_STAMP_TIMEOUT
+    "LIST_STAMP_TIMEOUT": int(os.environ.get("CATALOG_LIST_STAMP_TIMEOUT", 5)),
+}
+
+# Phân trang API danh sách: limit lớn hơn MAX_LIMIT bị giảm về MAX_LIMIT
+CATALOG_PAGINATION = {
+    "DEFAULT_LIMIT": 10,
+    "MAX_LIMIT": int(os.environ.get("CATALOG_MAX_LIMIT", 100)),
+    ### total_items: exact (count()) | estimate (thống kê Postgres / EXPLAIN) | cached (count() cache ngắn hạn)
+    "COUNT_STRATEGY": os.environ.get("CATALOG_COUNT_STRATEGY", "exact"),
+    "ESTIMATE_EXACT_BELOW": 10000,  ### ước lượng nhỏ hơn ngưỡng này thì count() thật
+    "COUNT_CACHE_TIMEOUT": 60,  # giây
+}
+
+# Token bucket cho request tốn kém (search, trang sâu, export), theo user / IP.
+# Backend local: mỗi worker một bucket riêng.
+CATALOG_THROTTLE = {
+    "BACKEND": "utils.throttling.LocalTokenBucketBackend",
+    "OPTIONS": {},
+    "DEEP_PAGE_OFFSET": 1000,  ### offset (page - 1) * limit từ đây tính là trang sâu
+    "RATES": {
+        "search": os.environ.get("THROTTLE_SEARCH_RATE", "60/min"),
+        "deep_page": os.environ.get("THROTTLE_DEEP_PAGE_RATE", "30/min"),
+        "export": os.environ.get("THROTTLE_EXPORT_RATE", "10/hour"),
+    },
+}
+
+REST_FRAMEWORK = {
+    # Số proxy đứng trước app (nginx) -> lấy IP client từ X-Forwarded-For khi throttle.
+    # Mặc định 0 (dùng REMOTE_ADDR): không có proxy mà tin X-Forwarded-For thì client tự chọn được IP
+    "NUM_PROXIES": int(os.environ.get("NUM_PROXIES", 0)),
+    "DEFAULT_RENDERER_CLASSES": [
+        "utils.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "utils.renderers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
+}
+
+# Encoder / decoder JSON cho API, log và export: orjson (nhanh hơn) | stdlib
+JSON_BACKEND = os.environ.get("JSON_BACKEND", "orjson")
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -190,6 +291,11 @@ from utils.logging import JsonFormatter
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+### Log ghi qua queue (thread nền), xoay vòng theo kích thước / thời gian, segment cũ nén gzip
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_ROTATE_INTERVAL = int(os.environ.get("LOG_ROTATE_INTERVAL", 0))  ### giây, 0 = chỉ xoay theo kích thước
+LOG_BACKUP_COUNT = int(os.environ.get("LOG_BACKUP_COUNT", 5))
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -202,20 +308,38 @@ LOGGING = {
     'handlers': {
         'Product_file': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
+            'class': 'utils.logging.QueueFileHandler',
             'filename': os.path.join(BASE_DIR, 'logs', 'Product.jsonl'),
+            'maxBytes': LOG_MAX_BYTES,
+            'interval': LOG_ROTATE_INTERVAL,
+            'backupCount': LOG_BACKUP_COUNT,
             'formatter': 'json',
         },
         'Category_file':{
             'level': 'INFO',
-            'class': 'logging.FileHandler',
+            'class': 'utils.logging.QueueFileHandler',
             'filename': os.path.join(BASE_DIR, 'logs', 'Category.jsonl'),
+            'maxBytes': LOG_MAX_BYTES,
+            'interval': LOG_ROTATE_INTERVAL,
+            'backupCount': LOG_BACKUP_COUNT,
             'formatter': 'json',
         },
         'ProductVariant_file': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
+            'class': 'utils.logging.QueueFileHandler',
             'filename': os.path.join(BASE_DIR, 'logs', 'ProductVariant.jsonl'),
+            'maxBytes': LOG_MAX_BYTES,
+            'interval': LOG_ROTATE_INTERVAL,
+            'backupCount': LOG_BACKUP_COUNT,
+            'formatter': 'json',
+        },
+        'Images_file': {
+            'level': 'INFO',
+            'class': 'utils.logging.QueueFileHandler',
+            'filename': os.path.join(BASE_DIR, 'logs', 'Images.jsonl'),
+            'maxBytes': LOG_MAX_BYTES,
+            'interval': LOG_ROTATE_INTERVAL,
+            'backupCount': LOG_BACKUP_COUNT,
             'formatter': 'json',
         }
     },
@@ -240,6 +364,11 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        'Images': {   # logger này chỉ dành riêng cho worker xoá ảnh (app "images")
+            'handlers': ['Images_file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
 
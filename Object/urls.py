@@ -18,6 +18,7 @@ from django.contrib import admin
 admin.site.site_header = "OBJECT ADMIN"
 
 from django.urls import path,include
+from utils.cache import view_cache_stats
 urlpatterns = [
     ### admin site
     path('admin/', admin.site.urls),
@@ -25,4 +26,8 @@ urlpatterns = [
     path('api/product/', include('product.urls')),
     ### api category
     path('api/category/', include('category.urls')),
+    ### upload ảnh thẳng lên Cloudinary
+    path('api/images/', include('images.urls')),
+    ### thống kê hit/miss cache chi tiết
+    path('api/cache/stats', view_cache_stats, name='cache stats'),
 ]
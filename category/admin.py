@@ -1,11 +1,13 @@
 from django.contrib import admin
+from django.utils import timezone
 from .models import Category
+from utils.cache import invalidate as invalidate_cache
 # Register your models here.
 
 
 class CategoryAdmin(admin.ModelAdmin):
 
-    list_display = ('id','name','code','slug','image','active')
+    list_display = ('id','name','code','slug','parent','image','active','product_count','available_product_count')
     list_filter = ('active',)
     search_fields = ('name','code','slug',)
     prepopulated_fields = {'slug':('name',)}
@@ -18,19 +20,25 @@ class CategoryAdmin(admin.ModelAdmin):
         return ('name',)
 
     def set_default_description(self,request,queryset):
-        queryset.update(description="No description provided")
-        self.message_user(request,f"{queryset.count()} categories were updated with default description.")
+        pks = list(queryset.values_list("pk", flat=True))
+        updated = queryset.update(description="No description provided", updated_at=timezone.now())
+        invalidate_cache("category", pks)
+        self.message_user(request,f"{updated} categories were updated with default description.")
     set_default_description.short_description = 'Set default description for selected categories'
 
     def set_active_status(self,request,queryset):
-        queryset.update(active=True)
-        self.message_user(request,f"{queryset.count()} category were marked as active.")
-    set_default_description.short_description = 'Set active status for selected categories'
+        pks = list(queryset.values_list("pk", flat=True))
+        updated = queryset.update(active=True, updated_at=timezone.now())
+        invalidate_cache("category", pks)
+        self.message_user(request,f"{updated} category were marked as active.")
+    set_active_status.short_description = 'Set active status for selected categories'
 
     def set_inactive_status(self,request,queryset):
-        queryset.update(active=False)
-        self.message_user(request,f"{queryset.count()} category were marked as inactive.")
-    set_default_description.short_description = 'Set inactive status for selected categories'
+        pks = list(queryset.values_list("pk", flat=True))
+        updated = queryset.update(active=False, updated_at=timezone.now())
+        invalidate_cache("category", pks)
+        self.message_user(request,f"{updated} category were marked as inactive.")
+    set_inactive_status.short_description = 'Set inactive status for selected categories'
 
 
 
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from category.models import reconcile_product_counts
+
+
+class Command(BaseCommand):
+    help = "Đếm lại số sản phẩm (tổng / còn hàng) của danh mục và sửa các giá trị bị lệch"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--category", type=int, action="append", help="Chỉ kiểm tra danh mục này (có thể lặp lại)")
+        parser.add_argument("--dry-run", action="store_true", help="Chỉ báo cáo, không sửa")
+
+    def handle(self, *args, **options):
+        drifted = reconcile_product_counts(options["category"], dry_run=options["dry_run"])
+        for category in drifted:
+            self.stdout.write(
+                f"{category.code}: product_count {category.product_count} -> {category.actual_total}, "
+                f"available_product_count {category.available_product_count} -> {category.actual_available}"
+                if options["dry_run"] else
+                f"{category.code}: fixed to {category.actual_total} / {category.actual_available}"
+            )
+        self.stdout.write(f"{len(drifted)} categories {'drifted' if options['dry_run'] else 'reconciled'}")
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.20 on 2026-10-18 13:25
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def fill_product_counts(apps, schema_editor):
+    Category = apps.get_model("category", "Category")
+    categories = list(Category.objects.annotate(
+        actual_total=Count("products"),
+        actual_available=Count("products", filter=Q(products__available=True)),
+    ))
+    for category in categories:
+        category.product_count = category.actual_total
+        category.available_product_count = category.actual_available
+    Category.objects.bulk_update(categories, ["product_count", "available_product_count"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('category', '0004_category_search_indexes'),
+        ('product', '0008_product_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='available_product_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Số sản phẩm còn hàng'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='product_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Số sản phẩm'),
+        ),
+        migrations.RunPython(fill_product_counts, migrations.RunPython.noop),
+    ]
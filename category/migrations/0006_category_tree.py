@@ -0,0 +1,42 @@
+# Generated by Django 4.2.20 on 2026-10-18 13:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat
+
+
+def fill_paths(apps, schema_editor):
+    # Danh mục hiện có đều là gốc: path = "/<id>/"
+    Category = apps.get_model("category", "Category")
+    Category.objects.update(path=Concat(Value("/"), Cast("id", CharField()), Value("/")), depth=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('category', '0005_category_product_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Cấp'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='children', to='category.category', verbose_name='Danh mục cha'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=255, verbose_name='Đường dẫn cây'),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['path'], name='category_path_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
@@ -1,187 +1,214 @@
 from django.db import models
+from django.core.exceptions import ValidationError
+from django.db.models import Count, F, Q, Value
+from django.db.models.functions import Concat, Substr, Upper
+from django.utils import timezone
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector
 from cloudinary.models import CloudinaryField
-from cloudinary.uploader import destroy
 import logging
-# from django.db import transaction
-from django.core.files.uploadedfile import InMemoryUploadedFile, TemporaryUploadedFile
-import cloudinary
+from django.db import transaction
+from utils.cache import invalidate as invalidate_cache
+from images.models import ImageLifecycleMixin
 logger = logging.getLogger("Category")
+
+### tsvector dùng chung cho GIN index và truy vấn search_mode=fulltext (phải giống hệt nhau)
+CATEGORY_SEARCH_VECTOR = (
+    SearchVector("name", "code", weight="A", config="simple")
+    + SearchVector("description", weight="B", config="simple")
+)
+### cột do code khác quản lý (cây danh mục, bộ đếm sản phẩm cập nhật bằng F()):
+### save() của danh mục đã có không ghi đè bằng giá trị cũ trên instance
+MANAGED_FIELDS = ("path", "depth", "product_count", "available_product_count")
+
+
 def parse_path(url):
     public_id = url.split('/')[-1].rsplit('.', 1)[0]
     return public_id
 
 
-def is_new_upload(image_field):
-        """
-        Kiểm tra xem có phải là file mới upload không
-        (chưa có trên Cloudinary)
-        """
-        if not image_field:
-            return False
-        
-        # Kiểm tra xem có phải là uploaded file không
-        is_uploaded_file = isinstance(
-            image_field, 
-            (InMemoryUploadedFile, TemporaryUploadedFile)
-        )
-        
-        # Hoặc là CloudinaryResource nhưng chưa có public_id
-        if hasattr(image_field, 'public_id'):
-            return False  # Đã có trên Cloudinary
-        
-        return is_uploaded_file
-
-def get_public_id(image_field):
-    """
-    Lấy public_id an toàn
-    Trả về None nếu:
-    - image_field là None
-    - image_field là file mới upload (chưa có public_id)
-    """
-    if not image_field:
-        return None
-    
-    # Nếu là file mới upload, chưa có public_id
-    if is_new_upload(image_field):
-        return None
-    
-    # Nếu là CloudinaryResource có public_id
-    if hasattr(image_field, 'public_id'):
-        return image_field.public_id
-    
-    return None
-
-class Category(models.Model):
+class Category(ImageLifecycleMixin, models.Model):
     name = models.CharField(max_length=255, unique=True,verbose_name="Tên danh mục")
     slug = models.SlugField(max_length=255, unique=True,verbose_name="Đường dẫn")
     description = models.TextField(blank=True, null=True,verbose_name="Mô tả")
     code = models.CharField(max_length=100, unique=True,verbose_name="Mã danh mục")
     image = CloudinaryField(blank=True, null=True,verbose_name="Hình ảnh")
     active = models.BooleanField(default=True,verbose_name='Trạng thái')
+    ### cây danh mục (vd: Nam > Giày > Sneaker) lưu dạng materialized path "/1/5/12/":
+    ### cả cây con = path LIKE '/1/5/%' (1 query dùng index), tổ tiên = các id trong path
+    parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.PROTECT, related_name='children', verbose_name="Danh mục cha")
+    path = models.CharField(max_length=255, default="", editable=False, verbose_name="Đường dẫn cây")
+    depth = models.PositiveSmallIntegerField(default=0, editable=False, verbose_name="Cấp")
+    ### số sản phẩm (denormalized): cập nhật cùng transaction với thay đổi của sản phẩm,
+    ### sửa lệch bằng `manage.py reconcile_category_counts`
+    product_count = models.IntegerField(default=0, editable=False, verbose_name="Số sản phẩm")
+    available_product_count = models.IntegerField(default=0, editable=False, verbose_name="Số sản phẩm còn hàng")
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    image_label = "Category"
+    image_logger = logger
+
     def __str__(self):
         return self.name
-    
-    def save(self, *args, **kwargs):
 
-        old_image_public_id = None
-        
-        if self.pk:
-            try:
-                # Lấy instance gốc từ DB
-                original = Category.objects.select_for_update().get(pk=self.pk)
-                
-                # Lấy public_id của ảnh cũ (từ DB)
-                original_public_id = get_public_id(original.image)
-                
-                # Kiểm tra xem có thay đổi image field không
-                # Trường hợp 1: Xóa ảnh (self.image = None hoặc '')
-                if original.image and not self.image:
-                    old_image_public_id = original_public_id
-                    logger.info(
-                        f"Image removed for Category {self.pk}. "
-                        f"Will delete: {old_image_public_id}"
-                    )
-                
-                # Trường hợp 2: Upload ảnh mới
-                elif is_new_upload(self.image):
-                    # Đây là file mới upload, chưa có public_id
-                    # Sau khi save, Django-Cloudinary sẽ tự động upload lên Cloudinary
-                    if original_public_id:
-                        old_image_public_id = original_public_id
-                        logger.info(
-                            f"New image uploaded for Category {self.pk}. "
-                            f"Will delete old: {old_image_public_id}"
-                        )
-                
-                # Trường hợp 3: Thay đổi từ ảnh này sang ảnh khác (cả 2 đều đã có trên Cloudinary)
-                else:
-                    current_public_id = get_public_id(self.image)
-                    
-                    if original_public_id and current_public_id:
-                        if original_public_id != current_public_id:
-                            old_image_public_id = original_public_id
-                            logger.info(
-                                f"Image changed for Category {self.pk}. "
-                                f"Old: {original_public_id}, New: {current_public_id}"
-                            )
-            
-            except Category.DoesNotExist:
-                logger.warning(f"Category {self.pk} not found in database")
-        
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Ghi nhớ vị trí trong cây + tên để save() biết có phải di chuyển / đổi breadcrumb không
+        if all(name in instance.__dict__ for name in ("parent_id", "path", "name", "slug")):
+            instance._loaded_tree_state = (instance.parent_id, instance.path, instance.name, instance.slug)
+        return instance
 
-        super().save(*args, **kwargs)
+    def ancestor_ids(self):
+        return [int(pk) for pk in self.path.strip("/").split("/")[:-1]] if self.path else []
 
-        if old_image_public_id:
-            try:
-                result = Category.uploader.destroy(
-                    old_image_public_id,
-                    invalidate=True,
-                    resource_type='image'
-                )
-                logger.info(
-                    f"Deleted old image {old_image_public_id} "
-                    f"for Category {self.pk}: {result}"
-                )
-            except Exception as e:
-                # Chỉ log lỗi, không raise exception
-                logger.error(
-                    f"Failed to delete old image {old_image_public_id} "
-                    f"for Category {self.pk}: {e}"
-                )
-        
-        # Log ảnh hiện tại
-        if self.image:
-            current_id = get_public_id(self.image)
-            if current_id:
-                logger.info(
-                    f"Current image for Product {self.pk}: "
-                    f"{current_id} - {self.image.url}"
-                )
-            else:
-                logger.info(
-                    f"New image uploaded for Product {self.pk}, "
-                    f"will have public_id after save"
-                )
+    def ancestors(self):
+        return Category.objects.filter(pk__in=self.ancestor_ids()).order_by("depth")
 
-    def delete(self, *args, **kwargs):
+    def descendants(self):
+        return Category.objects.filter(path__startswith=self.path).exclude(pk=self.pk)
+
+    def breadcrumbs(self):
         """
-        Xóa sản phẩm và ảnh trên Cloudinary
+        [{id, name, slug}] từ gốc tới danh mục này (1 query, danh mục gốc không cần query)
         """
-        image_public_id = get_public_id(self.image)
-        
-        if image_public_id:
-            logger.info(
-                f"Preparing to delete image for Product {self.pk}: {image_public_id}"
+        current = {"id": self.pk, "name": self.name, "slug": self.slug}
+        ancestor_ids = self.ancestor_ids()
+        if not ancestor_ids:
+            return [current]
+        return list(Category.objects.filter(pk__in=ancestor_ids).order_by("depth").values("id", "name", "slug")) + [current]
+
+    def _tree_state(self):
+        state = self.__dict__.get("_loaded_tree_state")
+        if state is None and self.pk is not None:
+            state = Category._base_manager.filter(pk=self.pk).values_list("parent_id", "path", "name", "slug").first()
+        return state
+
+    def clean(self):
+        super().clean()
+        if self.parent_id and self.pk and self.path and self.parent.path.startswith(self.path):
+            raise ValidationError({"parent": "Không thể chuyển danh mục vào chính nó hoặc danh mục con của nó."})
+
+    @transaction.atomic(savepoint=False)
+    def save(self, *args, **kwargs):
+        state = None if self._state.adding else self._tree_state()
+        parent = Category._base_manager.get(pk=self.parent_id) if self.parent_id else None
+        if state and parent and state[1] and parent.path.startswith(state[1]):
+            raise ValueError("Cannot move a category into its own subtree.")
+        if not self._state.adding and kwargs.get("update_fields") is None and not args:
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in MANAGED_FIELDS
+            ]
+
+        super().save(*args, **kwargs)
+
+        new_path = f"{parent.path if parent else '/'}{self.pk}/"
+        new_depth = parent.depth + 1 if parent else 0
+        now = timezone.now()
+        subtree_changed = False
+        if state is None or not state[1]:
+            # Danh mục mới: path cần id nên ghi sau khi INSERT
+            Category.objects.filter(pk=self.pk).update(path=new_path, depth=new_depth)
+        elif new_path != state[1]:
+            # Di chuyển cả cây con bằng 1 UPDATE: thay prefix path cũ bằng path mới
+            old_path = state[1]
+            Category.objects.filter(path__startswith=old_path).update(
+                path=Concat(Value(new_path), Substr("path", len(old_path) + 1), output_field=models.CharField()),
+                depth=F("depth") + (new_depth - (old_path.count("/") - 2)),
+                updated_at=now,
             )
-        
-        # Xóa record trước
+            subtree_changed = True
+        elif (state[2], state[3]) != (self.name, self.slug):
+            # Đổi tên / slug -> breadcrumb của các danh mục con thay đổi
+            subtree_changed = Category.objects.filter(path__startswith=new_path).exclude(pk=self.pk).update(updated_at=now) > 0
+        self.path, self.depth = new_path, new_depth
+        self._loaded_tree_state = (self.parent_id, self.path, self.name, self.slug)
+
+        invalidate_cache("category", [self.pk])
+        if subtree_changed:
+            invalidate_cache("category", self.descendants().values_list("pk", flat=True))
+        # Chi tiết sản phẩm có hiển thị tên danh mục
+        invalidate_cache("product", self.products.values_list("pk", flat=True))
+
+    def delete(self, *args, **kwargs):
+        pk = self.pk
+        # Lấy trước khi xoá (category của sản phẩm sẽ bị SET_NULL)
+        product_pks = list(self.products.values_list("pk", flat=True))
         result = super().delete(*args, **kwargs)
-        
-        # Sau đó xóa ảnh trên Cloudinary
-        if image_public_id:
-            try:
-                destroy_result = cloudinary.uploader.destroy(
-                    image_public_id,
-                    invalidate=True,
-                    resource_type='image'
-                )
-                logger.info(
-                    f"Deleted image {image_public_id} "
-                    f"for Category {self.pk}: {destroy_result}"
-                )
-            except Exception as e:
-                logger.error(
-                    f"Failed to delete image {image_public_id} "
-                    f"for Category {self.pk}: {e}"
-                )
-        
+        invalidate_cache("category", [pk])
+        invalidate_cache("product", product_pks)
         return result
 
     class Meta:
         verbose_name = "Danh mục"
         verbose_name_plural = "Danh mục"
-        ordering = ['-image','name']
\ No newline at end of file
+        ordering = ['-image','name']
+        indexes = [
+            ### ILIKE '%keyword%' / trigram search trên tên và mã danh mục
+            GinIndex(OpClass(Upper("name"), name="gin_trgm_ops"), name="category_name_trgm_idx"),
+            GinIndex(OpClass(Upper("code"), name="gin_trgm_ops"), name="category_code_trgm_idx"),
+            GinIndex(CATEGORY_SEARCH_VECTOR, name="category_search_vector_idx"),
+            ### path LIKE 'prefix%' (varchar_pattern_ops để dùng được index với mọi collation)
+            models.Index(fields=["path"], name="category_path_idx", opclasses=["varchar_pattern_ops"]),
+        ]
+
+
+def apply_product_count_deltas(deltas):
+    """
+    Cộng dồn thay đổi số sản phẩm vào danh mục: deltas = {category_id: [total, available]}.
+    Gọi trong transaction của thay đổi sản phẩm (UPDATE ... = col + delta nên không mất cập nhật
+    khi nhiều transaction chạy song song).
+    """
+    changed = sorted(pk for pk, (total, available) in deltas.items() if pk is not None and (total or available))
+    now = timezone.now()
+    # Cập nhật theo thứ tự id để tránh deadlock giữa các transaction
+    for pk in changed:
+        total, available = deltas[pk]
+        Category.objects.filter(pk=pk).update(
+            product_count=F("product_count") + total,
+            available_product_count=F("available_product_count") + available,
+            updated_at=now,
+        )
+    invalidate_cache("category", changed)
+
+
+@transaction.atomic
+def reconcile_product_counts(category_ids=None, dry_run=False):
+    """
+    Đếm lại số sản phẩm thực tế, sửa các danh mục bị lệch.
+    Trả về danh sách danh mục lệch (kèm actual_total / actual_available).
+    """
+    categories = Category.objects.all()
+    if category_ids is not None:
+        categories = categories.filter(pk__in=category_ids)
+    # Khoá trước khi đếm: thay đổi sản phẩm đang chạy sẽ cộng delta sau khi sửa xong
+    list(categories.select_for_update().values_list("pk", flat=True))
+
+    counted = categories.order_by("pk").annotate(
+        actual_total=Count("products"),
+        actual_available=Count("products", filter=Q(products__available=True)),
+    )
+    drifted = [
+        category for category in counted
+        if (category.product_count, category.available_product_count) != (category.actual_total, category.actual_available)
+    ]
+    if drifted and not dry_run:
+        now = timezone.now()
+        for category in drifted:
+            category.product_count = category.actual_total
+            category.available_product_count = category.actual_available
+            category.updated_at = now
+        Category.objects.bulk_update(drifted, ["product_count", "available_product_count", "updated_at"])
+        invalidate_cache("category", [category.pk for category in drifted])
+    return drifted
+
+
+def subtree_path(pk):
+    """
+    path của danh mục pk để lọc cả cây con: filter(category__path__startswith=path).
+    None nếu danh mục không tồn tại.
+    """
+    return Category.objects.filter(pk=pk).values_list("path", flat=True).first()
@@ -2,6 +2,7 @@ from rest_framework import serializers
 from django.db.models import Q
 
 from .models import *
+from utils.serialization import ValuesSerializer
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -11,13 +12,26 @@ class CategorySerializer(serializers.ModelSerializer):
 
 class CategoryMenuSerializer(serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
     class Meta:
         model = Category
-        fields = ["id", "name", "slug", "image_url"]
+        fields = ["id", "name", "slug", "image_url", "image_srcset", "product_count", "available_product_count"]
 
     def get_image_url(self,obj):
         return obj.image.url if obj.image else None
 
+    def get_image_srcset(self,obj):
+        return obj.image_srcset()
+
+class CategoryMenuValues(ValuesSerializer):
+    """
+    Đường nhanh của CategoryMenuSerializer cho API danh sách (cùng output)
+    """
+    model = Category
+    fields = ("id", "name", "slug", "image_url", "image_srcset", "product_count", "available_product_count")
+    image_fields = {"image_url": "image"}
+    srcset_fields = {"image_srcset": "image"}
+
 class UpdateCategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
@@ -1,3 +1,53 @@
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from product.models import Product
+from .models import Category
+
+
+class CategoryTreeTest(TestCase):
+    def setUp(self):
+        self.men = Category.objects.create(name="Nam", slug="nam", code="NAM")
+        self.shoes = Category.objects.create(name="Giày", slug="giay", code="GIAY", parent=self.men)
+        self.sneakers = Category.objects.create(name="Sneaker", slug="sneaker", code="SNK", parent=self.shoes)
+        self.women = Category.objects.create(name="Nữ", slug="nu", code="NU")
+
+    def reload(self, category):
+        return Category.objects.get(pk=category.pk)
+
+    def test_paths_and_breadcrumbs(self):
+        sneakers = self.reload(self.sneakers)
+        self.assertEqual(sneakers.path, f"/{self.men.pk}/{self.shoes.pk}/{self.sneakers.pk}/")
+        self.assertEqual(sneakers.depth, 2)
+        with self.assertNumQueries(1):
+            self.assertEqual([c["name"] for c in sneakers.breadcrumbs()], ["Nam", "Giày", "Sneaker"])
+
+    def test_moving_a_subtree_updates_descendants(self):
+        shoes = self.reload(self.shoes)
+        shoes.parent = self.women
+        shoes.save()
+        sneakers = self.reload(self.sneakers)
+        self.assertEqual(sneakers.path, f"/{self.women.pk}/{self.shoes.pk}/{self.sneakers.pk}/")
+        self.assertEqual(sneakers.depth, 2)
+        self.assertEqual(list(self.reload(self.men).descendants()), [])
+
+        men = self.reload(self.men)
+        men.parent = self.sneakers
+        men.save()  # không phải con của Nam nữa -> hợp lệ
+        women = self.reload(self.women)
+        women.parent = self.sneakers
+        with self.assertRaises(ValueError):
+            women.save()
+
+    def test_product_filter_includes_descendants(self):
+        Product.objects.create(name="Giày A", slug="giay-a", code="GA", category=self.shoes)
+        Product.objects.create(name="Sneaker B", slug="sneaker-b", code="SB", category=self.sneakers)
+        Product.objects.create(name="Váy C", slug="vay-c", code="VC", category=self.women)
+        url = reverse("products:list product")
+        names = [p["name"] for p in self.client.get(url, {"category": self.men.pk}).data["results"]]
+        self.assertEqual(names, ["Giày A", "Sneaker B"])
+        self.assertEqual(self.client.get(url, {"category": "x"}).status_code, 400)
+
+    def test_detail_has_breadcrumbs(self):
+        response = self.client.get(reverse("categories:detail category", args=[self.sneakers.pk]))
+        self.assertEqual([c["slug"] for c in response.data["breadcrumbs"]], ["nam", "giay", "sneaker"])
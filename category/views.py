@@ -11,8 +11,37 @@ from django.http import Http404
 
 
 from category.models import *
-from django.db.models import Q
+from django.db.models import Q, Max, Count
 from .serializers import *
+from utils.pagination import CursorPaginator, InvalidCursor, page_params, paginate_page, wants_cursor
+from utils.counting import count_params
+from utils.throttling import CatalogThrottle
+from utils.search import DEFAULT_SEARCH_MODE, apply_keyword_search
+from utils.cache import get_or_build, list_stamp
+from utils.conditional import catalog_condition, request_stamp
+from images.normalize import ImageRejected
+
+
+def category_table_stamp():
+    stamp = Category.objects.aggregate(last_modified=Max("updated_at"), total=Count("id"))
+    return f"{stamp['total']}:{stamp['last_modified']}", stamp["last_modified"]
+
+
+def category_list_stamp(request):
+    """
+    Version của danh sách giữ trong cache, đổi mỗi lần ghi (utils.cache.invalidate),
+    cache trống -> updated_at mới nhất + số danh mục (bắt được cả xoá).
+    Kèm query string để mỗi trang / bộ lọc có ETag riêng.
+    """
+    version, last_modified = list_stamp("category", category_table_stamp)
+    return f"categories:{request.get_full_path()}:{version}", last_modified
+
+
+def category_detail_stamp(request, pk):
+    updated_at = Category.objects.filter(pk=pk).values_list("updated_at", flat=True).first()
+    if updated_at is None:
+        return None
+    return f"category:{pk}:{updated_at}", updated_at
 
 
 class CategoryView(APIView):
@@ -20,45 +49,53 @@ class CategoryView(APIView):
     API để xử lý danh sách danh mục (GET) và tạo danh mục (POST).
     """
 
+    throttle_classes = [CatalogThrottle]
+
 
+    @method_decorator(catalog_condition(category_list_stamp))
     def get(self, request):
         try:
-            page = request.query_params.get("page", 1)
-            limit = request.query_params.get("limit", 10)
             keyword = request.query_params.get("keyword", None)
+            search_mode = request.query_params.get("search_mode", DEFAULT_SEARCH_MODE)
             try:
-                page = int(page)
-                limit = int(limit)
-            except ValueError:
-                return Response(
-                    {"error": "Page and limit must be integers."},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
+                page, limit = page_params(request.query_params)
+            except ValueError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
             categories = Category.objects.all().order_by('name')
             # Lọc theo keyword nếu có
-            print(categories)
             if keyword:
-                categories = categories.filter(Q(name__icontains=keyword) |Q(code__icontains=keyword))
-
-            # Tính toán phân trang
-            total_items = categories.count()
-            total_pages = ceil(total_items / limit)
-            start = (page - 1) * limit
-            end = start + limit
-            paginated_category = categories[start:end]
-
-            serializer = CategoryMenuSerializer(paginated_category,many=True)   
-            return Response(
-                {
-                    "total_items": total_items,
-                    "total_pages": total_pages,
-                    "current_page": page,
-                    "page_size": limit,
-                    "results": serializer.data,
-                },
-                status=status.HTTP_200_OK,
-            )
+                try:
+                    categories = apply_keyword_search(
+                        categories, keyword, search_mode, ("name", "code"), CATEGORY_SEARCH_VECTOR
+                    )
+                except ValueError as e:
+                    return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+            # Chỉ đọc các cột của menu (dict, không tạo model instance)
+            categories = CategoryMenuValues.queryset(categories)
+
+            # Phân trang cursor (opt-in): seek theo (name, id), không OFFSET / count()
+            # (search_mode xếp theo độ liên quan chỉ áp dụng cho phân trang page/limit)
+            if wants_cursor(request):
+                try:
+                    page_data = CursorPaginator(("name", "id"), limit).paginate(
+                        request, categories, request.query_params.get("cursor")
+                    )
+                except InvalidCursor as e:
+                    return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+                page_data["results"] = CategoryMenuValues.rows(page_data["results"])
+                return Response(page_data, status=status.HTTP_200_OK)
+
+            # Phân trang page/limit, total_items theo count_strategy
+            # (include_total=false -> bỏ qua count, chỉ trả has_next)
+            try:
+                include_total, count_strategy = count_params(request.query_params)
+            except ValueError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            page_data = paginate_page(categories, page, limit, include_total, count_strategy)
+            page_data["results"] = CategoryMenuValues.rows(page_data["results"])
+            return Response(page_data, status=status.HTTP_200_OK)
         except Exception as e:
             return Response(
                 {"error": f"An unexpected error occurred: {str(e)}"},
@@ -80,12 +117,28 @@ class CategoryView(APIView):
                 serializer.save()
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        except ImageRejected as e:
+            return Response(e.message_dict, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response(
                 {"error": f"An unexpected error occurred: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
+def category_detail_data(pk):
+    """
+    Dữ liệu chi tiết danh mục (dùng cho cache). None nếu danh mục không active.
+    """
+    category = get_object_or_404(Category, pk=pk)
+    if category.active == False:
+        return None
+    data = dict(CategorySerializer(category).data)
+    data.pop("image_derivatives", None)
+    data["image_srcset"] = category.image_srcset()
+    data["breadcrumbs"] = category.breadcrumbs()
+    return data
+
+
 class CategoryDetailView(APIView):
     """
     API để xử lý chi tiết, cập nhật và xóa danh mục.
@@ -95,17 +148,17 @@ class CategoryDetailView(APIView):
     parser_classes = [MultiPartParser, FormParser]
 
 
+    @method_decorator(catalog_condition(category_detail_stamp))
     def get(self, request, pk):
-        category = get_object_or_404(Category, pk=pk)
-        if category.active == False:
+        stamp = request_stamp(request)
+        # Không có stamp -> không có bản ghi
+        data = stamp and get_or_build("category", pk, lambda: category_detail_data(pk), version=stamp[0])
+        if data is None:
             return Response(
                 {"error": "Category not found."},
                 status=status.HTTP_404_NOT_FOUND,
             )
-        serializer = CategorySerializer(
-            category
-        )
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(data, status=status.HTTP_200_OK)
 
     def put(self, request, pk):
         try:
@@ -118,6 +171,8 @@ class CategoryDetailView(APIView):
                 return Response(serializer.data, status=status.HTTP_200_OK)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+        except ImageRejected as e:
+            return Response(e.message_dict, status=status.HTTP_400_BAD_REQUEST)
         except Http404:
             return Response(
                 {"error": "Category not found."},
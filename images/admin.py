@@ -0,0 +1,20 @@
+from django.contrib import admin
+from django.utils import timezone
+from .models import ImageDeletion
+# Register your models here.
+
+
+class ImageDeletionAdmin(admin.ModelAdmin):
+
+    list_display = ('id','public_id','source','attempts','next_attempt_at','last_error','created_at')
+    search_fields = ('public_id','source',)
+    list_per_page = 50
+    actions = ['retry_now']
+
+    def retry_now(self,request,queryset):
+        updated = queryset.update(attempts=0, next_attempt_at=timezone.now(), last_error="")
+        self.message_user(request,f"{updated} image deletions were scheduled for retry.")
+    retry_now.short_description = 'Retry selected image deletions now'
+
+
+admin.site.register(ImageDeletion,ImageDeletionAdmin)
@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+
+
+class ImagesConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'images'
+
+    def ready(self):
+        from .backends import get_backend
+
+        # LocalBackend đổi cấu hình URL của Cloudinary khi khởi tạo -> tạo ngay lúc start
+        # để image.url trỏ về server local cả trước lần upload đầu tiên
+        get_backend()
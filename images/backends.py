@@ -0,0 +1,283 @@
+import datetime
+import os
+import random
+import secrets
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+from django.utils.module_loading import import_string
+
+import cloudinary
+import cloudinary.api
+import cloudinary.exceptions
+import cloudinary.uploader
+from cloudinary import CloudinaryResource
+
+from utils.throttling import LocalTokenBucketBackend, parse_rate
+
+### Cloudinary Admin API cho phép xoá tối đa 100 public_id mỗi lần
+MAX_DELETE_BATCH = 100
+### và trả về tối đa 500 ảnh mỗi trang khi liệt kê
+MAX_LIST_PAGE = 500
+### các key cấu hình URL của Cloudinary mà LocalBackend thay đổi
+URL_CONFIG_KEYS = ("cloud_name", "cname", "secure", "secure_distribution", "private_cdn", "cdn_subdomain", "secure_cdn_subdomain")
+
+_url_defaults = None
+
+
+def _file_format(uploaded):
+    name = getattr(uploaded, "name", None) or ""
+    return os.path.splitext(name)[1].lstrip(".").lower() or None
+
+
+def restore_delivery_url():
+    """
+    Trả cấu hình URL của Cloudinary về như trước khi LocalBackend đổi
+    """
+    global _url_defaults
+    if _url_defaults is not None:
+        cloudinary.config(**_url_defaults)
+        _url_defaults = None
+
+
+class CloudinaryBackend:
+    """
+    Backend mặc định: gọi Cloudinary thật.
+    """
+
+    def __init__(self, **options):
+        self.options = options
+        restore_delivery_url()
+
+    def upload(self, file, **options):
+        """
+        Upload file lên Cloudinary -> CloudinaryResource
+        (giống CloudinaryField.pre_save, options gồm type / resource_type / options của field)
+        """
+        return cloudinary.uploader.upload_resource(file, **options)
+
+    def delete_resources(self, public_ids, resource_type="image"):
+        """
+        Xoá nhiều ảnh trong 1 request. Trả về {public_id: status},
+        status "deleted" / "not_found" nghĩa là đã xong.
+        """
+        result = cloudinary.api.delete_resources(
+            list(public_ids), resource_type=resource_type, invalidate=True
+        )
+        return result.get("deleted", {})
+
+    def generate_derivatives(self, public_id, transformations, resource_type="image"):
+        """
+        Tạo sẵn các ảnh phái sinh (eager) cho ảnh đã upload
+        """
+        cloudinary.uploader.explicit(public_id, type="upload", resource_type=resource_type, eager=transformations)
+
+    def iter_resources(self, resource_type="image", page_size=MAX_LIST_PAGE):
+        """
+        Duyệt toàn bộ ảnh đã upload theo trang (next_cursor) -> (public_id, created_at).
+        Mỗi trang là 1 lời gọi Admin API (bị tính vào rate limit theo giờ).
+        """
+        cursor = None
+        while True:
+            params = {"type": "upload", "resource_type": resource_type, "max_results": min(page_size, MAX_LIST_PAGE)}
+            if cursor:
+                params["next_cursor"] = cursor
+            page = cloudinary.api.resources(**params)
+            for resource in page.get("resources", []):
+                yield resource["public_id"], parse_datetime(resource["created_at"])
+            cursor = page.get("next_cursor")
+            if not cursor:
+                return
+
+
+class StubBackend:
+    """
+    Backend giả lập trong bộ nhớ (dùng cho test): ghi lại các public_id
+    đã xoá / đã tạo ảnh phái sinh (explicit hoặc eager lúc upload),
+    có thể cho lỗi `fail_times` lần đầu để test retry.
+    """
+
+    def __init__(self, fail_times=0, **options):
+        self.options = options
+        self.fail_times = fail_times
+        self.calls = []
+        self.deleted = []
+        self.generated = []
+        self.uploaded = []
+        self.eager = []
+        restore_delivery_url()
+
+    def upload(self, file, public_id=None, resource_type="image", type="upload", **options):
+        # public_id mặc định = tên file (không có đuôi), version luôn là 1
+        public_id = public_id or os.path.splitext(os.path.basename(file.name or "upload"))[0]
+        self.uploaded.append(public_id)
+        if options.get("eager"):
+            self.eager.append((public_id, [dict(t) for t in options["eager"]], options.get("eager_async", False)))
+        return CloudinaryResource(public_id, version="1", format=_file_format(file), type=type, resource_type=resource_type)
+
+    def delete_resources(self, public_ids, resource_type="image"):
+        public_ids = list(public_ids)
+        self.calls.append(public_ids)
+        if self.fail_times > 0:
+            self.fail_times -= 1
+            raise ConnectionError("Stub storage unavailable")
+        self.deleted.extend(public_ids)
+        return {public_id: "deleted" for public_id in public_ids}
+
+    def generate_derivatives(self, public_id, transformations, resource_type="image"):
+        self.generated.append((public_id, [dict(t) for t in transformations]))
+
+
+class LocalBackend:
+    """
+    Backend thay Cloudinary khi chạy offline (benchmark, load test, CI): file được lưu
+    trên đĩa tại root/<resource_type>/<public_id>.<format>, URL do thư viện Cloudinary
+    build như bình thường nhưng trỏ về base_url (view images:local image phục vụ file).
+    Giả lập được độ trễ / lỗi / rate limit của dịch vụ thật:
+    - latency (+ jitter ngẫu nhiên) giây cho mỗi lời gọi
+    - error_rate: tỉ lệ lời gọi bị lỗi (cloudinary.exceptions.GeneralError)
+    - rate_limit: vd "500/hour", vượt quá -> cloudinary.exceptions.RateLimited
+    """
+
+    def __init__(self, root=None, base_url="localhost:8000/api/images/local", latency=0, jitter=0,
+                 error_rate=0, rate_limit=None, seed=None, **options):
+        self.options = options
+        self.root = Path(root or Path(settings.BASE_DIR) / "local_images")
+        self.base_url = base_url
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate = parse_rate(rate_limit) if rate_limit else None
+        self.bucket = LocalTokenBucketBackend()
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"upload": 0, "delete": 0, "generate": 0, "list": 0, "errors": 0, "rate_limited": 0}
+        self.use_delivery_url()
+
+    def use_delivery_url(self):
+        """
+        Đổi cấu hình URL của Cloudinary để image.url, ảnh phái sinh và images.delivery
+        trỏ về base_url: http://<base_url>/<cloud_name>/<resource_type>/upload/...
+        """
+        global _url_defaults
+        config = cloudinary.config()
+        if _url_defaults is None:
+            _url_defaults = {key: getattr(config, key, None) for key in URL_CONFIG_KEYS}
+        cloudinary.config(
+            cloud_name=config.cloud_name or "local", cname=self.base_url, secure=False,
+            secure_distribution=None, private_cdn=False, cdn_subdomain=False, secure_cdn_subdomain=False,
+        )
+
+    def _call(self, operation, cost=1):
+        """
+        Độ trễ, lỗi ngẫu nhiên và rate limit cho 1 lời gọi API
+        """
+        with self.lock:
+            self.stats[operation] += 1
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+            failed = self.error_rate and self.random.random() < self.error_rate
+        if self.rate:
+            allowed, wait = self.bucket.consume("api", *self.rate, cost=cost)
+            if not allowed:
+                with self.lock:
+                    self.stats["rate_limited"] += 1
+                raise cloudinary.exceptions.RateLimited(f"Rate Limit Exceeded, retry in {wait:.1f}s")
+        if delay:
+            time.sleep(delay)
+        if failed:
+            with self.lock:
+                self.stats["errors"] += 1
+            raise cloudinary.exceptions.GeneralError(f"Injected {operation} error")
+
+    def path(self, public_id, resource_type="image"):
+        """
+        File đang lưu của public_id (bất kể format), None nếu không có
+        """
+        folder = (self.root / resource_type / public_id).parent
+        name = Path(public_id).name
+        if not folder.is_dir():
+            return None
+        for candidate in folder.iterdir():
+            if candidate.is_file() and candidate.stem == name:
+                return candidate
+        return None
+
+    def upload(self, file, public_id=None, folder=None, resource_type="image", type="upload", **options):
+        self._call("upload")
+        public_id = public_id or secrets.token_hex(10)
+        if folder:
+            public_id = f"{folder.strip('/')}/{public_id}"
+        image_format = _file_format(file)
+        target = (self.root / resource_type / public_id).resolve()
+        if not target.is_relative_to(self.root.resolve()):
+            raise cloudinary.exceptions.BadRequest(f"Invalid public_id: {public_id}")
+
+        existing = self.path(public_id, resource_type)
+        if existing:
+            existing.unlink()
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target = target.with_name(f"{target.name}.{image_format}" if image_format else target.name)
+        size = 0
+        with open(target, "wb") as out:
+            for chunk in file.chunks() if hasattr(file, "chunks") else iter(lambda: file.read(65536), b""):
+                out.write(chunk)
+                size += len(chunk)
+        version = str(int(time.time()))
+        metadata = {"public_id": public_id, "version": version, "format": image_format, "bytes": size,
+                    "type": type, "resource_type": resource_type}
+        return CloudinaryResource(public_id, version=version, format=image_format, type=type,
+                                  resource_type=resource_type, metadata=metadata)
+
+    def delete_resources(self, public_ids, resource_type="image"):
+        public_ids = list(public_ids)
+        self._call("delete", cost=len(public_ids))
+        result = {}
+        for public_id in public_ids:
+            existing = self.path(public_id, resource_type)
+            if existing:
+                existing.unlink()
+            result[public_id] = "deleted" if existing else "not_found"
+        return result
+
+    def generate_derivatives(self, public_id, transformations, resource_type="image"):
+        # Ảnh phái sinh được phục vụ bằng file gốc -> chỉ giả lập lời gọi API
+        self._call("generate")
+        if not self.path(public_id, resource_type):
+            raise cloudinary.exceptions.NotFound(f"Resource not found - {public_id}")
+
+    def iter_resources(self, resource_type="image", page_size=MAX_LIST_PAGE):
+        # Mỗi page_size file tính là 1 lời gọi API như Cloudinary, created_at = mtime
+        folder = self.root / resource_type
+        if not folder.is_dir():
+            self._call("list")
+            return
+        listed = 0
+        for path in sorted(folder.rglob("*")):
+            if not path.is_file():
+                continue
+            if listed % page_size == 0:
+                self._call("list")
+            listed += 1
+            public_id = path.relative_to(folder).with_suffix("").as_posix()
+            yield public_id, datetime.datetime.fromtimestamp(path.stat().st_mtime, tz=datetime.timezone.utc)
+
+
+_backend = None
+_backend_config = None
+
+
+def get_backend():
+    """
+    Backend lưu ảnh theo settings.IMAGE_STORAGE = {"BACKEND": ..., "OPTIONS": {...}}
+    (khởi tạo lại nếu settings thay đổi, vd: override_settings trong test)
+    """
+    global _backend, _backend_config
+    config = getattr(settings, "IMAGE_STORAGE", {})
+    if _backend is None or config != _backend_config:
+        backend_class = import_string(config.get("BACKEND", "images.backends.CloudinaryBackend"))
+        _backend = backend_class(**config.get("OPTIONS", {}))
+        _backend_config = config
+    return _backend
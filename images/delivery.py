@@ -0,0 +1,121 @@
+import logging
+import re
+
+import cloudinary
+from cloudinary import CloudinaryResource
+from django.conf import settings
+
+logger = logging.getLogger("Images")
+
+### giá trị CloudinaryField lưu trong DB dạng <resource_type>/upload/v<version>/<public_id>.<format>
+### -> URL chỉ là prefix + giá trị (không cần ký, không phải quote)
+FAST_PATH_RE = re.compile(r"(?P<resource_type>image|video|raw)/upload/v\d+/[\w\-./]+$", re.ASCII)
+RESOURCE_TYPES = ("image", "video", "raw")
+
+_prefixes = None
+_prefix_config = None
+
+
+def _url_prefixes():
+    """
+    {resource_type: "http://res.cloudinary.com/<cloud>/"} theo cấu hình Cloudinary hiện tại,
+    tính bằng chính thư viện Cloudinary trên 1 ảnh mẫu. Cấu hình làm URL phụ thuộc
+    public_id (cdn_subdomain, url_suffix, ...) -> không có prefix, dùng đường chậm.
+    """
+    from .backends import get_backend
+
+    global _prefixes, _prefix_config
+    # Backend theo IMAGE_STORAGE hiện tại (LocalBackend đổi cấu hình URL khi khởi tạo)
+    get_backend()
+    config = cloudinary.config()
+    key = tuple(sorted((k, repr(v)) for k, v in vars(config).items()))
+    if _prefixes is None or key != _prefix_config:
+        _prefixes = {}
+        if not (getattr(config, "cdn_subdomain", None) or getattr(config, "secure_cdn_subdomain", None)):
+            for resource_type in RESOURCE_TYPES:
+                tail = f"{resource_type}/upload/v1/_"
+                url = CloudinaryResource(public_id="_", version="1", type="upload", resource_type=resource_type).url
+                if url and url.endswith(tail):
+                    _prefixes[resource_type] = url[: -len(tail)]
+        _prefix_config = key
+    return _prefixes
+
+
+def image_url_builder(field=None):
+    """
+    Trả về hàm value -> URL ảnh từ giá trị thô trong DB (values() / Cast), không tạo
+    CloudinaryResource cho trường hợp thường gặp. Giá trị khác (không có version,
+    ký tự đặc biệt, ...) đi qua field.to_python() để giống hệt image.url.
+    Cấu hình Cloudinary chỉ được đọc 1 lần -> tạo builder 1 lần cho cả trang kết quả.
+    """
+    if field is None:
+        from cloudinary.models import CloudinaryField
+
+        field = CloudinaryField()
+    prefixes = _url_prefixes()
+
+    def build(value):
+        if not value:
+            return None
+        match = FAST_PATH_RE.match(value)
+        if match and match.group("resource_type") in prefixes:
+            return prefixes[match.group("resource_type")] + value
+        resource = field.to_python(value)
+        return resource.url if resource else None
+
+    return build
+
+
+def image_url(value, field=None):
+    return image_url_builder(field)(value)
+
+
+def derivative_transformation(preset):
+    """
+    Preset trong settings.IMAGE_DERIVATIVES -> transformation của Cloudinary
+    (giữ tỉ lệ, không phóng to ảnh nhỏ hơn width)
+    """
+    transformation = {"width": preset["width"], "crop": preset.get("crop", "limit"), "quality": preset.get("quality", "auto")}
+    if preset.get("format"):
+        transformation["format"] = preset["format"]
+    return transformation
+
+
+def derivative_transformations():
+    """
+    Transformation của tất cả preset trong IMAGE_DERIVATIVES (tham số eager khi upload / explicit)
+    """
+    return [derivative_transformation(preset) for preset in getattr(settings, "IMAGE_DERIVATIVES", {}).values()]
+
+
+def build_derivatives(resource):
+    """
+    CloudinaryResource -> {preset: URL} theo IMAGE_DERIVATIVES.
+    Chỉ build URL (không gọi API), kết quả được lưu vào image_derivatives của bản ghi.
+    """
+    derivatives = {}
+    for name, preset in getattr(settings, "IMAGE_DERIVATIVES", {}).items():
+        transformation = derivative_transformation(preset)
+        image_format = transformation.pop("format", None) or resource.format
+        options = {"format": image_format} if image_format else {}
+        derivatives[name] = resource.build_url(transformation=[transformation], **options)
+    return derivatives
+
+
+def generate_derivatives(resources, backend=None):
+    """
+    Yêu cầu backend tạo sẵn (eager) các ảnh phái sinh để request đầu tiên
+    không phải chờ Cloudinary resize. Lỗi chỉ được log: URL vẫn dùng được,
+    Cloudinary sẽ tạo ảnh khi có request.
+    """
+    from .backends import get_backend
+
+    backend = backend or get_backend()
+    transformations = derivative_transformations()
+    if not transformations:
+        return
+    for resource in resources:
+        try:
+            backend.generate_derivatives(resource.public_id, transformations, resource_type=resource.resource_type or "image")
+        except Exception as e:
+            logger.error(f"Failed to generate derivatives for {resource.public_id}: {e}")
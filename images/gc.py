@@ -0,0 +1,163 @@
+import heapq
+import logging
+import os
+import re
+import tempfile
+from datetime import timedelta
+from itertools import islice
+
+from cloudinary.models import CLOUDINARY_FIELD_DB_RE
+from django.apps import apps
+from django.db.models import CharField
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .backends import MAX_DELETE_BATCH, get_backend
+from .models import ImageLifecycleMixin
+from .outbox import DONE_STATUSES
+
+logger = logging.getLogger("Images")
+
+### giá trị CloudinaryField trong DB, cùng regex với CloudinaryField.to_python
+DB_VALUE_RE = re.compile(CLOUDINARY_FIELD_DB_RE)
+### số phần tử tối đa giữ trong bộ nhớ khi sort, nhiều hơn -> ghi ra file tạm rồi merge
+DEFAULT_RUN_SIZE = 200_000
+
+
+def iter_referenced_public_ids(resource_type="image", chunk_size=2000):
+    """
+    public_id đang được dùng bởi mọi model có ImageLifecycleMixin, đọc giá trị thô
+    của cột ảnh bằng iterator() (không tạo model instance / CloudinaryResource)
+    """
+    for model in apps.get_models():
+        if not issubclass(model, ImageLifecycleMixin):
+            continue
+        for name in model.image_fields:
+            rows = (
+                model._base_manager.filter(**{f"{name}__isnull": False}).exclude(**{name: ""})
+                # Cast -> chuỗi thô, bỏ qua from_db_value của CloudinaryField
+                .order_by().values_list(Cast(name, output_field=CharField()), flat=True)
+            )
+            for value in rows.iterator(chunk_size=chunk_size):
+                match = DB_VALUE_RE.match(value)
+                if match and (match.group("resource_type") or "image") == resource_type and match.group("public_id"):
+                    yield match.group("public_id")
+
+
+def _spill(run, directory):
+    fd, path = tempfile.mkstemp(dir=directory, suffix=".run")
+    with os.fdopen(fd, "w", encoding="utf-8") as out:
+        for line in run:
+            out.write(line + "\n")
+    return path
+
+
+def _read_run(path):
+    with open(path, encoding="utf-8") as run:
+        for line in run:
+            yield line[:-1]
+
+
+def sort_runs(lines, directory, run_size=DEFAULT_RUN_SIZE):
+    """
+    Bước 1 của external sort, đọc hết lines ngay khi gọi: mỗi run_size phần tử được
+    sort rồi ghi ra file tạm trong directory (ít hơn run_size thì giữ trong bộ nhớ).
+    Trả về danh sách run cho merge_runs().
+    """
+    runs = []
+    while True:
+        run = sorted(islice(lines, run_size))
+        if not run:
+            return runs
+        if len(run) < run_size and not runs:
+            return [run]
+        runs.append(_spill(run, directory))
+
+
+def merge_runs(runs):
+    """
+    Merge các run đã sort (heapq.merge, mỗi run chỉ giữ 1 dòng trong bộ nhớ) và bỏ trùng
+    """
+    previous = None
+    for line in heapq.merge(*(run if isinstance(run, list) else _read_run(run) for run in runs)):
+        if line != previous:
+            yield line
+            previous = line
+
+
+def find_orphans(stored, referenced):
+    """
+    Sorted-merge 2 stream đã sort: stored = "public_id\\tcreated_at", referenced = public_id
+    ("\\t" nhỏ hơn mọi ký tự của public_id nên thứ tự dòng trùng với thứ tự public_id).
+    Trả về (public_id, created_at) có trong stored nhưng không được tham chiếu.
+    """
+    current = next(referenced, None)
+    for line in stored:
+        public_id, _, created_at = line.partition("\t")
+        while current is not None and current < public_id:
+            current = next(referenced, None)
+        if current != public_id:
+            yield public_id, created_at
+
+
+def collect_garbage(dry_run=False, grace=timedelta(hours=24), resource_type="image",
+                    batch_size=MAX_DELETE_BATCH, run_size=DEFAULT_RUN_SIZE, chunk_size=2000, backend=None):
+    """
+    Xoá ảnh trên backend không còn được bản ghi nào tham chiếu:
+    1. liệt kê ảnh trên backend (theo trang), ảnh mới hơn grace được bỏ qua (upload đang
+       dở, vd: upload thẳng chưa finalize)
+    2. đọc public_id trong DB sau bước 1 -> ảnh được gắn vào bản ghi trong lúc chạy
+       không bị coi là rác
+    3. external sort 2 phía (sort_runs / merge_runs) rồi sorted-merge, xoá theo lô batch_size
+    Bộ nhớ chỉ phụ thuộc run_size / batch_size, không phụ thuộc số ảnh.
+    Trả về {"stored", "referenced", "orphans", "skipped", "deleted", "failed"}.
+    """
+    backend = backend or get_backend()
+    batch_size = min(batch_size, MAX_DELETE_BATCH)
+    cutoff = timezone.now() - grace
+    stats = {"stored": 0, "referenced": 0, "orphans": 0, "skipped": 0, "deleted": 0, "failed": 0}
+
+    def stored_lines():
+        for public_id, created_at in backend.iter_resources(resource_type=resource_type):
+            stats["stored"] += 1
+            if created_at is not None and created_at > cutoff:
+                stats["skipped"] += 1
+                continue
+            yield f"{public_id}\t{created_at.isoformat() if created_at else ''}"
+
+    def referenced_lines():
+        for public_id in iter_referenced_public_ids(resource_type, chunk_size):
+            stats["referenced"] += 1
+            yield public_id
+
+    def delete(batch):
+        if dry_run:
+            return
+        try:
+            result = backend.delete_resources(batch, resource_type=resource_type)
+        except Exception as e:
+            logger.error(f"Failed to delete {len(batch)} orphaned images: {e}")
+            stats["failed"] += len(batch)
+            return
+        done = [public_id for public_id in batch if result.get(public_id) in DONE_STATUSES]
+        stats["deleted"] += len(done)
+        stats["failed"] += len(batch) - len(done)
+        if done:
+            logger.info(f"Deleted orphaned images: {', '.join(done)}")
+
+    with tempfile.TemporaryDirectory(prefix="gc_images") as directory:
+        # Liệt kê hết ảnh trên backend (ghi ra file tạm) trước khi đọc DB
+        stored = sort_runs(stored_lines(), directory, run_size)
+        referenced = sort_runs(referenced_lines(), directory, run_size)
+
+        batch = []
+        for public_id, created_at in find_orphans(merge_runs(stored), merge_runs(referenced)):
+            stats["orphans"] += 1
+            logger.info(f"{'Would delete' if dry_run else 'Deleting'} orphaned image {public_id} (created {created_at})")
+            batch.append(public_id)
+            if len(batch) >= batch_size:
+                delete(batch)
+                batch = []
+        if batch:
+            delete(batch)
+    return stats
@@ -0,0 +1,89 @@
+import io
+import tempfile
+import time
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+
+from images.backends import get_backend
+from images.outbox import drain_outbox
+from product.models import Product
+
+
+def _sample_jpeg(width, height):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (120, 90, 60)).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+class Command(BaseCommand):
+    help = (
+        "Đo thời gian save() của Product có ảnh (tạo mới, thay ảnh, xoá ảnh cũ qua outbox) "
+        "với LocalBackend ở các mức độ trễ lưu trữ khác nhau. Dữ liệu được rollback."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--latency", type=float, nargs="+", default=[0, 0.05, 0.2], help="Độ trễ mỗi lời gọi (giây)")
+        parser.add_argument("--error-rate", type=float, default=0)
+        parser.add_argument("--saves", type=int, default=10, help="Số sản phẩm mỗi mức độ trễ")
+        parser.add_argument("--size", type=int, nargs=2, default=[1600, 1200], metavar=("WIDTH", "HEIGHT"))
+
+    def handle(self, *args, **options):
+        if options["saves"] <= 0:
+            raise CommandError("--saves must be positive.")
+        content = _sample_jpeg(*options["size"])
+
+        for latency in options["latency"]:
+            with tempfile.TemporaryDirectory() as root:
+                storage = {
+                    "BACKEND": "images.backends.LocalBackend",
+                    "OPTIONS": {"root": root, "latency": latency, "error_rate": options["error_rate"], "seed": 0},
+                }
+                with override_settings(IMAGE_STORAGE=storage):
+                    timings, drained = self.run_case(content, options["saves"])
+                    stats = get_backend().stats
+
+            saves = options["saves"]
+            self.stdout.write(
+                f"latency {latency * 1000:.0f} ms: create {timings['create'] * 1000 / saves:.1f} ms, "
+                f"replace {timings['replace'] * 1000 / saves:.1f} ms, drain {timings['drain'] * 1000:.1f} ms "
+                f"({drained['deleted']} deleted, {drained['failed']} failed, {stats['errors']} injected errors)"
+            )
+        # Trả cấu hình URL của Cloudinary về backend đang dùng
+        get_backend()
+
+    def run_case(self, content, saves):
+        timings = {"create": 0.0, "replace": 0.0, "drain": 0.0}
+        with transaction.atomic():
+            products = []
+            for i in range(saves):
+                upload = SimpleUploadedFile(f"bench-{i}.jpg", content, content_type="image/jpeg")
+                start = time.perf_counter()
+                try:
+                    with transaction.atomic():
+                        products.append(
+                            Product.objects.create(name=f"Storage bench {i}", slug=f"storage-bench-{i}", code=f"SB{i}", image=upload)
+                        )
+                except Exception as e:
+                    self.stderr.write(f"create failed: {e}")
+                timings["create"] += time.perf_counter() - start
+
+            for product in products:
+                product.image = SimpleUploadedFile(f"bench-{product.pk}-2.jpg", content, content_type="image/jpeg")
+                start = time.perf_counter()
+                try:
+                    with transaction.atomic():
+                        product.save()
+                except Exception as e:
+                    self.stderr.write(f"replace failed: {e}")
+                timings["replace"] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            drained = drain_outbox(base_delay=0)
+            timings["drain"] = time.perf_counter() - start
+            transaction.set_rollback(True)
+        return timings, drained
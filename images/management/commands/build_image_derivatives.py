@@ -0,0 +1,49 @@
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from images.delivery import generate_derivatives
+from images.models import ImageLifecycleMixin
+
+
+class Command(BaseCommand):
+    help = (
+        "Build URL ảnh phái sinh (IMAGE_DERIVATIVES) cho các bản ghi chưa có / "
+        "khác preset hiện tại, vd: dữ liệu cũ hoặc sau khi đổi preset"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Build lại tất cả")
+        parser.add_argument("--eager", action="store_true", help="Yêu cầu backend tạo sẵn ảnh phái sinh")
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        presets = set(getattr(settings, "IMAGE_DERIVATIVES", {}))
+        models = [model for model in apps.get_models() if issubclass(model, ImageLifecycleMixin)]
+        for model in models:
+            has_image = Q()
+            for name in model.image_fields:
+                has_image |= Q(**{f"{name}__isnull": False}) & ~Q(**{name: ""})
+            queryset = model._base_manager.filter(has_image).order_by("pk")
+
+            changed, built_total = [], 0
+            for obj in queryset.iterator(chunk_size=options["chunk_size"]):
+                derivatives = dict(obj.image_derivatives or {})
+                # Bỏ phái sinh cũ (khác preset hiện tại) -> refresh build lại
+                obj.image_derivatives = {
+                    name: urls for name, urls in derivatives.items()
+                    if not options["force"] and set(urls) == presets
+                }
+                built = obj.refresh_image_derivatives()
+                if obj.image_derivatives != derivatives:
+                    changed.append(obj)
+                if built and options["eager"]:
+                    generate_derivatives(built)
+                built_total += len(built)
+                if len(changed) >= options["chunk_size"]:
+                    model._base_manager.bulk_update(changed, ["image_derivatives"])
+                    changed = []
+            if changed:
+                model._base_manager.bulk_update(changed, ["image_derivatives"])
+            self.stdout.write(f"{model._meta.label}: {built_total} images built")
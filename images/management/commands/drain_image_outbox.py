@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from images.outbox import drain_outbox
+
+
+class Command(BaseCommand):
+    help = "Xoá các ảnh trong outbox trên Cloudinary (theo lô, có retry + backoff)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--max-attempts", type=int, default=8)
+        parser.add_argument("--base-delay", type=int, default=30, help="Giây chờ trước lần retry đầu")
+        parser.add_argument("--max-delay", type=int, default=3600, help="Giây chờ tối đa giữa các lần retry")
+        parser.add_argument("--lease", type=int, default=300, help="Giây giữ 1 lô đã nhận trước khi worker khác được lấy lại")
+        parser.add_argument("--loop", action="store_true", help="Chạy liên tục như một worker")
+        parser.add_argument("--interval", type=float, default=5, help="Giây nghỉ giữa các vòng khi --loop")
+
+    def handle(self, *args, **options):
+        while True:
+            stats = drain_outbox(
+                batch_size=options["batch_size"],
+                max_attempts=options["max_attempts"],
+                base_delay=options["base_delay"],
+                max_delay=options["max_delay"],
+                lease=options["lease"],
+            )
+            if stats["deleted"] or stats["failed"] or not options["loop"]:
+                self.stdout.write(f"Deleted {stats['deleted']} images, {stats['failed']} failed")
+            if not options["loop"]:
+                return
+            time.sleep(options["interval"])
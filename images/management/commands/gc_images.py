@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from images.backends import MAX_DELETE_BATCH
+from images.gc import DEFAULT_RUN_SIZE, collect_garbage
+
+
+class Command(BaseCommand):
+    help = (
+        "Xoá ảnh trên backend lưu ảnh không còn bản ghi nào tham chiếu "
+        "(Product / ProductVariant / Category), bộ nhớ giới hạn theo --run-size"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Chỉ liệt kê ảnh rác, không xoá")
+        parser.add_argument("--grace-hours", type=float, default=24, help="Bỏ qua ảnh upload trong khoảng thời gian này")
+        parser.add_argument("--resource-type", default="image")
+        parser.add_argument("--batch-size", type=int, default=MAX_DELETE_BATCH)
+        parser.add_argument("--run-size", type=int, default=DEFAULT_RUN_SIZE, help="Số public_id sort trong bộ nhớ mỗi lần")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if options["grace_hours"] < 0:
+            raise CommandError("--grace-hours must not be negative.")
+        if min(options["batch_size"], options["run_size"], options["chunk_size"]) <= 0:
+            raise CommandError("--batch-size, --run-size and --chunk-size must be positive.")
+
+        stats = collect_garbage(
+            dry_run=options["dry_run"],
+            grace=timedelta(hours=options["grace_hours"]),
+            resource_type=options["resource_type"],
+            batch_size=options["batch_size"],
+            run_size=options["run_size"],
+            chunk_size=options["chunk_size"],
+        )
+        self.stdout.write(
+            f"{stats['stored']} stored, {stats['referenced']} referenced, {stats['skipped']} within grace period, "
+            f"{stats['orphans']} orphaned"
+        )
+        if options["dry_run"]:
+            self.stdout.write("Dry run: nothing deleted")
+        else:
+            self.stdout.write(f"Deleted {stats['deleted']} images, {stats['failed']} failed")
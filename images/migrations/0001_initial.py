@@ -0,0 +1,33 @@
+# Generated by Django 4.2.20 on 2026-10-18 13:10
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageDeletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('public_id', models.CharField(max_length=255, verbose_name='Public ID')),
+                ('resource_type', models.CharField(default='image', max_length=20, verbose_name='Loại tài nguyên')),
+                ('source', models.CharField(blank=True, max_length=255, verbose_name='Nguồn')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Số lần thử')),
+                ('next_attempt_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Lần thử kế tiếp')),
+                ('last_error', models.TextField(blank=True, verbose_name='Lỗi gần nhất')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Ảnh chờ xoá',
+                'verbose_name_plural': 'Ảnh chờ xoá',
+                'ordering': ['next_attempt_at', 'id'],
+            },
+        ),
+    ]
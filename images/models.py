@@ -0,0 +1,352 @@
+import logging
+
+from django.core.files.uploadedfile import InMemoryUploadedFile, TemporaryUploadedFile
+from django.db import models, transaction
+from django.utils import timezone
+
+from .backends import get_backend
+from .delivery import build_derivatives, derivative_transformations
+from .normalize import normalize_uploads
+
+logger = logging.getLogger("Images")
+
+
+def is_new_upload(image_field):
+    """
+    Kiểm tra xem có phải là file mới upload không
+    (chưa có trên Cloudinary)
+    """
+    if not image_field:
+        return False
+
+    # Kiểm tra xem có phải là uploaded file không
+    is_uploaded_file = isinstance(
+        image_field,
+        (InMemoryUploadedFile, TemporaryUploadedFile)
+    )
+
+    # Hoặc là CloudinaryResource nhưng chưa có public_id
+    if hasattr(image_field, 'public_id'):
+        return False  # Đã có trên Cloudinary
+
+    return is_uploaded_file
+
+
+def get_public_id(image_field):
+    """
+    Lấy public_id an toàn
+    Trả về None nếu:
+    - image_field là None
+    - image_field là file mới upload (chưa có public_id)
+    """
+    if not image_field:
+        return None
+
+    # Nếu là file mới upload, chưa có public_id
+    if is_new_upload(image_field):
+        return None
+
+    # Nếu là CloudinaryResource có public_id
+    if hasattr(image_field, 'public_id'):
+        return image_field.public_id
+
+    return None
+
+
+class ImageDeletion(models.Model):
+    """
+    Outbox các ảnh cần xoá trên Cloudinary.
+    Được ghi cùng transaction với thay đổi của model, worker
+    `manage.py drain_image_outbox` sẽ xoá theo lô và retry khi lỗi.
+    """
+    public_id = models.CharField(max_length=255, verbose_name="Public ID")
+    resource_type = models.CharField(max_length=20, default="image", verbose_name="Loại tài nguyên")
+    source = models.CharField(max_length=255, blank=True, verbose_name="Nguồn")### vd: "Product 12"
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Số lần thử")
+    next_attempt_at = models.DateTimeField(default=timezone.now, db_index=True, verbose_name="Lần thử kế tiếp")
+    last_error = models.TextField(blank=True, verbose_name="Lỗi gần nhất")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.public_id} ({self.source})"
+
+    class Meta:
+        verbose_name = "Ảnh chờ xoá"
+        verbose_name_plural = "Ảnh chờ xoá"
+        ordering = ['next_attempt_at', 'id']
+
+
+def enqueue_image_deletion(public_id, source="", resource_type="image"):
+    """
+    Đưa ảnh vào outbox. Gọi trong transaction của model để ảnh chỉ bị xoá
+    khi thay đổi đã commit.
+    """
+    if not public_id:
+        return None
+    return ImageDeletion.objects.create(public_id=public_id, source=source, resource_type=resource_type)
+
+
+class ImageLifecycleQuerySet(models.QuerySet):
+
+    def bulk_create(self, objs, *args, **kwargs):
+        # URL ảnh phái sinh build sẵn trong bộ nhớ (không gọi API, không thêm query)
+        objs = list(objs)
+        for obj in objs:
+            obj.refresh_image_derivatives()
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        """
+        bulk_update không gọi save() -> tự so public_id đã load với giá trị mới
+        và đưa ảnh cũ vào outbox trong cùng transaction
+        """
+        objs = list(objs)
+        image_fields = [name for name in fields if name in self.model.image_fields]
+        deletions = []
+        if image_fields:
+            self.model.load_image_snapshots(objs, image_fields)
+            fields = list(fields) + ["image_derivatives"]
+            for obj in objs:
+                obj.refresh_image_derivatives(image_fields)
+                for public_id in obj.replaced_public_ids(image_fields):
+                    deletions.append(
+                        ImageDeletion(public_id=public_id, source=f"{obj.image_label} {obj.pk}")
+                    )
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            rows = super().bulk_update(objs, fields, batch_size=batch_size)
+            if deletions:
+                ImageDeletion.objects.bulk_create(deletions)
+
+        for obj in objs:
+            obj.remember_public_ids(image_fields)
+        return rows
+
+
+class ImageLifecycleMixin(models.Model):
+    """
+    Quản lý vòng đời ảnh Cloudinary cho model có CloudinaryField:
+    - ghi nhớ public_id lúc load (from_db) nên save() không cần SELECT lại
+      bản ghi gốc, ảnh không đổi thì không làm gì thêm
+    - ảnh bị xoá / thay thế -> đưa ảnh cũ vào outbox (ImageDeletion)
+    - delete() -> đưa ảnh hiện tại vào outbox
+    - file mới upload -> chuẩn hoá (thu nhỏ, bỏ metadata, encode lại) trong
+      thread pool rồi upload qua backend lưu ảnh (settings.IMAGE_STORAGE)
+    - ảnh mới -> lưu sẵn URL các ảnh phái sinh (IMAGE_DERIVATIVES) vào
+      image_derivatives = {field: {preset: URL}}, API đọc thẳng URL đã lưu.
+      Ảnh phái sinh được backend tạo sẵn ngay lúc upload (eager, bất đồng bộ),
+      save() không gọi thêm API nào
+    """
+    ### {tên field ảnh: {preset: URL}}
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Ảnh phái sinh")
+
+    image_fields = ("image",)
+    image_label = None  ### tên hiển thị trong log / outbox, vd: "Product"
+    image_logger = logger
+
+    objects = ImageLifecycleQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_public_ids()
+        return instance
+
+    @classmethod
+    def load_image_snapshots(cls, objs, fields=None):
+        """
+        Field chưa có public_id gốc (object không đi qua from_db, vd: tự khởi tạo
+        với pk, hoặc field bị defer bởi only() / defer()) -> lấy public_id gốc của
+        tất cả trong 1 query
+        """
+        fields = list(fields or cls.image_fields)
+        missing = {}
+        for obj in objs:
+            if obj.pk and not obj._state.adding:
+                loaded = obj.__dict__.get("_loaded_public_ids", {})
+                names = [name for name in fields if name not in loaded]
+                if names:
+                    missing[obj.pk] = (obj, names)
+        if not missing:
+            return
+        columns = sorted({name for _, names in missing.values() for name in names})
+        for row in cls._base_manager.filter(pk__in=missing).values("pk", *columns):
+            obj, names = missing[row["pk"]]
+            loaded = obj.__dict__.setdefault("_loaded_public_ids", {})
+            for name in names:
+                loaded[name] = get_public_id(cls._meta.get_field(name).to_python(row[name]))
+
+    def remember_public_ids(self, fields=None):
+        loaded = self.__dict__.setdefault("_loaded_public_ids", {})
+        for name in fields or self.image_fields:
+            # field bị defer (only()/defer()) -> không biết giá trị gốc
+            if name in self.__dict__:
+                loaded[name] = get_public_id(self.__dict__[name])
+
+    def refresh_image_derivatives(self, fields=None, loaded=None):
+        """
+        Build lại image_derivatives cho field có ảnh khác với lúc load (hoặc chưa có
+        phái sinh), xoá phái sinh của field không còn ảnh.
+        Trả về các CloudinaryResource vừa build (cần tạo sẵn trên backend).
+        """
+        if loaded is None:
+            loaded = getattr(self, "_loaded_public_ids", {})
+        derivatives = dict(self.image_derivatives or {})
+        built = []
+        for name in fields or self.image_fields:
+            resource = getattr(self, name)
+            public_id = get_public_id(resource)
+            if not public_id:
+                derivatives.pop(name, None)
+            elif public_id != loaded.get(name) or name not in derivatives:
+                derivatives[name] = build_derivatives(resource)
+                built.append(resource)
+        self.image_derivatives = derivatives
+        return built
+
+    def normalize_new_uploads(self, fields=None):
+        """
+        Thay file mới upload bằng bản đã chuẩn hoá, log dung lượng gốc / lưu trữ.
+        Raise ImageRejected (ValidationError theo field) nếu ảnh không hợp lệ / quá lớn.
+        """
+        uploads = {
+            name: getattr(self, name) for name in fields or self.image_fields
+            if is_new_upload(getattr(self, name)) and not getattr(getattr(self, name), "normalized", False)
+        }
+        for name, result in normalize_uploads(uploads).items():
+            setattr(self, name, result.file)
+            self.image_logger.info(
+                f"Normalized {name} for {self.image_label} {self.pk}: "
+                f"{result.original_bytes} -> {result.stored_bytes} bytes ({result.width}x{result.height})"
+            )
+
+    def upload_new_files(self, fields=None):
+        """
+        Upload file mới qua backend lưu ảnh (thay cho CloudinaryField.pre_save,
+        cùng options) -> field nhận CloudinaryResource.
+        Ảnh phái sinh được yêu cầu tạo sẵn trong cùng lời gọi upload (eager_async,
+        giống sign_upload) -> không gọi explicit() trong request
+        """
+        transformations = derivative_transformations()
+        for name in fields or self.image_fields:
+            value = getattr(self, name)
+            if not is_new_upload(value):
+                continue
+            field = self._meta.get_field(name)
+            options = {"type": field.type, "resource_type": field.resource_type}
+            options.update({key: val(self) if callable(val) else val for key, val in field.options.items()})
+            if transformations:
+                options.setdefault("eager", transformations)
+                options["eager_async"] = True
+            if hasattr(value, "seekable") and value.seekable():
+                value.seek(0)
+            setattr(self, name, get_backend().upload(value, **options))
+
+    def clean(self):
+        # Form (admin) gọi full_clean() -> ảnh bị từ chối hiện lỗi ngay trên field, save() không chuẩn hoá lại
+        super().clean()
+        self.normalize_new_uploads()
+
+    def image_srcset(self, name="image"):
+        return (self.image_derivatives or {}).get(name) or None
+
+    def replaced_public_ids(self, fields=None):
+        """
+        Danh sách public_id cũ cần xoá sau khi lưu giá trị hiện tại
+        """
+        loaded = getattr(self, "_loaded_public_ids", {})
+        replaced = []
+        for name in fields or self.image_fields:
+            original_public_id = loaded.get(name)
+            if not original_public_id:
+                continue
+            current = getattr(self, name)
+
+            # Trường hợp 1: Xóa ảnh (self.image = None hoặc '')
+            if not current:
+                self.image_logger.info(
+                    f"Image removed for {self.image_label} {self.pk}. "
+                    f"Will delete: {original_public_id}"
+                )
+                replaced.append(original_public_id)
+
+            # Trường hợp 2: Upload ảnh mới, sau khi save Django-Cloudinary mới upload lên Cloudinary
+            elif is_new_upload(current):
+                self.image_logger.info(
+                    f"New image uploaded for {self.image_label} {self.pk}. "
+                    f"Will delete old: {original_public_id}"
+                )
+                replaced.append(original_public_id)
+
+            # Trường hợp 3: Thay đổi từ ảnh này sang ảnh khác (cả 2 đều đã có trên Cloudinary)
+            else:
+                current_public_id = get_public_id(current)
+                if current_public_id and current_public_id != original_public_id:
+                    self.image_logger.info(
+                        f"Image changed for {self.image_label} {self.pk}. "
+                        f"Old: {original_public_id}, New: {current_public_id}"
+                    )
+                    replaced.append(original_public_id)
+        return replaced
+
+    @transaction.atomic(savepoint=False)
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        fields = [name for name in self.image_fields if update_fields is None or name in update_fields]
+        if fields:
+            type(self).load_image_snapshots([self], fields)
+        old_public_ids = self.replaced_public_ids(fields)
+        loaded = dict(getattr(self, "_loaded_public_ids", {}))
+        derivatives = self.image_derivatives
+        if fields:
+            self.normalize_new_uploads(fields)
+            self.upload_new_files(fields)
+
+        super().save(*args, **kwargs)
+
+        # public_id của file mới upload chỉ có sau khi save -> cập nhật phái sinh bằng 1 UPDATE
+        # (ảnh phái sinh đã được tạo lúc upload: upload_new_files / images.uploads)
+        if fields:
+            self.refresh_image_derivatives(fields, loaded)
+        if self.image_derivatives != derivatives:
+            type(self)._base_manager.filter(pk=self.pk).update(image_derivatives=self.image_derivatives)
+
+        for public_id in old_public_ids:
+            # Ghi vào outbox cùng transaction, worker drain_image_outbox sẽ xoá trên Cloudinary
+            enqueue_image_deletion(public_id, source=f"{self.image_label} {self.pk}")
+            self.image_logger.info(
+                f"Queued old image {public_id} "
+                f"for deletion ({self.image_label} {self.pk})"
+            )
+        self.remember_public_ids(fields)
+
+        # Log ảnh hiện tại
+        for name in fields:
+            current_id = get_public_id(getattr(self, name))
+            if current_id:
+                self.image_logger.info(f"Current image for {self.image_label} {self.pk}: {current_id}")
+
+    @transaction.atomic(savepoint=False)
+    def delete(self, *args, **kwargs):
+        """
+        Xóa bản ghi và đưa ảnh trên Cloudinary vào outbox
+        """
+        loaded = getattr(self, "_loaded_public_ids", {})
+        public_ids = [loaded.get(name) or get_public_id(getattr(self, name)) for name in self.image_fields]
+        pk = self.pk
+
+        # Xóa record trước
+        result = super().delete(*args, **kwargs)
+
+        # Sau đó đưa ảnh vào outbox để xóa trên Cloudinary
+        for public_id in filter(None, public_ids):
+            enqueue_image_deletion(public_id, source=f"{self.image_label} {pk}")
+            self.image_logger.info(
+                f"Queued image {public_id} "
+                f"for deletion ({self.image_label} {pk})"
+            )
+        return result
@@ -0,0 +1,168 @@
+import io
+import os
+import threading
+import warnings
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import InMemoryUploadedFile
+
+try:
+    from PIL import Image, ImageOps, UnidentifiedImageError
+except ImportError:  # pragma: no cover - Pillow là tuỳ chọn
+    Image = None
+
+NORMALIZATION_DEFAULTS = {
+    "ENABLED": True,
+    "MAX_DIMENSION": 2048,  ### cạnh dài nhất (px), ảnh lớn hơn được thu nhỏ giữ tỉ lệ
+    "FORMAT": "WEBP",  ### "WEBP" | "JPEG"
+    "QUALITY": 82,
+    "MAX_PIXELS": 40_000_000,  ### width * height (* số frame) lớn hơn -> từ chối (decompression bomb)
+    "WORKERS": 2,
+    "TIMEOUT": 30,  # giây
+}
+### định dạng được phép mở, file khác (SVG, PSD, ...) bị từ chối
+INPUT_FORMATS = ("JPEG", "PNG", "WEBP", "GIF", "BMP", "TIFF")
+OUTPUT_TYPES = {"WEBP": ("webp", "image/webp"), "JPEG": ("jpg", "image/jpeg")}
+
+NormalizedImage = namedtuple("NormalizedImage", ["file", "original_bytes", "stored_bytes", "width", "height"])
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class ImageRejected(ValidationError):
+    pass
+
+
+def normalization_options():
+    return {**NORMALIZATION_DEFAULTS, **getattr(settings, "IMAGE_NORMALIZATION", {})}
+
+
+def is_enabled():
+    if Image is None:
+        return False
+    return bool(normalization_options()["ENABLED"])
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=normalization_options()["WORKERS"], thread_name_prefix="image-normalize"
+            )
+    return _executor
+
+
+def _open(uploaded, options):
+    """
+    Mở ảnh (chỉ đọc header) và kiểm tra kích thước trước khi decode.
+    DecompressionBombWarning của Pillow cũng bị coi là lỗi.
+    """
+    uploaded.seek(0)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            image = Image.open(uploaded, formats=INPUT_FORMATS)
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning):
+        raise ImageRejected("Image dimensions are too large.")
+    except (UnidentifiedImageError, OSError):
+        raise ImageRejected("Upload a valid image (JPEG, PNG, WebP, GIF, BMP or TIFF).")
+
+    width, height = image.size
+    if width * height * getattr(image, "n_frames", 1) > options["MAX_PIXELS"]:
+        image.close()
+        raise ImageRejected(f"Image dimensions are too large ({width}x{height}).")
+    return image
+
+
+def normalize_image(uploaded, options=None):
+    """
+    File upload -> NormalizedImage:
+    - xoay theo EXIF rồi bỏ toàn bộ metadata (EXIF / GPS / XMP), giữ ICC profile
+    - thu nhỏ về MAX_DIMENSION, JPEG được decode sẵn ở kích thước nhỏ (draft)
+    - encode lại sang FORMAT / QUALITY
+    Raise ImageRejected nếu không phải ảnh hợp lệ hoặc quá lớn.
+    """
+    options = options or normalization_options()
+    max_dimension = options["MAX_DIMENSION"]
+    output_format = options["FORMAT"].upper()
+    extension, content_type = OUTPUT_TYPES[output_format]
+    original_bytes = uploaded.size
+
+    source = image = _open(uploaded, options)
+    try:
+        if image.format == "JPEG":
+            # Giảm kích thước ngay lúc decode (DCT scaling), nhanh và ít RAM hơn
+            image.draft("RGB", (max_dimension, max_dimension))
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("error", Image.DecompressionBombWarning)
+                image.load()
+        except OSError:
+            raise ImageRejected("Upload a valid image (the file is truncated or corrupt).")
+        icc_profile = image.info.get("icc_profile")
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS, reducing_gap=3.0)
+
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        if has_alpha and output_format == "WEBP":
+            image = image.convert("RGBA")
+        elif has_alpha:
+            # JPEG không có alpha -> nền trắng
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            rgba = image.convert("RGBA")
+            background.paste(rgba, mask=rgba)
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+
+        buffer = io.BytesIO()
+        save_options = {"quality": options["QUALITY"]}
+        if icc_profile:
+            save_options["icc_profile"] = icc_profile
+        if output_format == "JPEG":
+            save_options.update(optimize=True, progressive=True)
+        image.save(buffer, format=output_format, **save_options)
+        width, height = image.size
+    finally:
+        source.close()
+        uploaded.seek(0)
+
+    stored_bytes = buffer.tell()
+    buffer.seek(0)
+    name = f"{os.path.splitext(os.path.basename(uploaded.name or 'image'))[0]}.{extension}"
+    normalized = InMemoryUploadedFile(
+        buffer, getattr(uploaded, "field_name", None), name, content_type, stored_bytes, None
+    )
+    normalized.normalized = True
+    return NormalizedImage(normalized, original_bytes, stored_bytes, width, height)
+
+
+def normalize_uploads(uploads):
+    """
+    {field: file upload} -> {field: NormalizedImage}, chạy trong thread pool
+    (Pillow nhả GIL khi decode / resize / encode) trước khi upload lên Cloudinary.
+    Pillow chưa cài hoặc ENABLED=False -> {} (giữ nguyên file gốc).
+    """
+    if not uploads or not is_enabled():
+        return {}
+    options = normalization_options()
+    executor = _get_executor()
+    futures = {name: executor.submit(normalize_image, uploaded, options) for name, uploaded in uploads.items()}
+    results, errors = {}, {}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result(timeout=options["TIMEOUT"])
+        except ImageRejected as e:
+            errors[name] = e.messages
+        except TimeoutError:
+            # Chưa chạy thì huỷ, đang chạy thì để thread tự kết thúc (kết quả bị bỏ)
+            future.cancel()
+            errors[name] = ["Image processing timed out."]
+    if errors:
+        raise ImageRejected(errors)
+    return results
@@ -0,0 +1,101 @@
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .backends import MAX_DELETE_BATCH, get_backend
+from .models import ImageDeletion
+
+logger = logging.getLogger("Images")
+
+DONE_STATUSES = ("deleted", "not_found")
+
+
+def retry_delay(attempts, base_delay=30, max_delay=3600):
+    """
+    Exponential backoff: base_delay * 2^(attempts-1), tối đa max_delay (giây)
+    """
+    return min(max_delay, base_delay * (2 ** max(attempts - 1, 0)))
+
+
+def claim_batch(batch_size, max_attempts, lease):
+    """
+    Nhận 1 lô đến hạn trong transaction ngắn: next_attempt_at được đẩy tới now + lease
+    (worker khác bỏ qua) rồi commit ngay, khoá không bị giữ trong lúc gọi Cloudinary.
+    Worker chết giữa chừng -> hết lease thì bản ghi lại đến hạn.
+    """
+    with transaction.atomic():
+        now = timezone.now()
+        batch = list(
+            ImageDeletion.objects.select_for_update(skip_locked=True)
+            .filter(attempts__lt=max_attempts, next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "id")[:batch_size]
+        )
+        if batch:
+            ImageDeletion.objects.filter(pk__in=[row.pk for row in batch]).update(
+                next_attempt_at=now + timedelta(seconds=lease)
+            )
+    return batch
+
+
+def drain_outbox(batch_size=MAX_DELETE_BATCH, max_attempts=8, base_delay=30, max_delay=3600, lease=300, backend=None):
+    """
+    Xoá các ảnh đến hạn trong outbox theo lô (multi-id delete).
+    Nhiều worker chạy song song được: mỗi lô được nhận trước (claim_batch, giữ trong
+    lease giây) rồi mới gọi backend, ngoài transaction.
+    Bản ghi lỗi quá max_attempts lần được giữ lại để xem trong admin.
+    Trả về {"deleted": n, "failed": n}.
+    """
+    backend = backend or get_backend()
+    batch_size = min(batch_size, MAX_DELETE_BATCH)
+    stats = {"deleted": 0, "failed": 0}
+
+    while True:
+        batch = claim_batch(batch_size, max_attempts, lease)
+        if not batch:
+            return stats
+
+        done, failed = [], []
+        by_type = {}
+        for row in batch:
+            by_type.setdefault(row.resource_type, []).append(row)
+
+        for resource_type, rows in by_type.items():
+            public_ids = list({row.public_id for row in rows})
+            try:
+                result = backend.delete_resources(public_ids, resource_type=resource_type)
+            except Exception as e:
+                logger.error(f"Failed to delete {len(public_ids)} images: {e}")
+                for row in rows:
+                    row.last_error = str(e)
+                failed.extend(rows)
+                continue
+
+            for row in rows:
+                status = result.get(row.public_id)
+                if status in DONE_STATUSES:
+                    done.append(row)
+                else:
+                    row.last_error = f"Unexpected delete status: {status}"
+                    failed.append(row)
+
+        if done:
+            ImageDeletion.objects.filter(pk__in=[row.pk for row in done]).delete()
+            logger.info(f"Deleted images: {', '.join(row.public_id for row in done)}")
+
+        now = timezone.now()
+        for row in failed:
+            row.attempts += 1
+            row.next_attempt_at = now + timedelta(
+                seconds=retry_delay(row.attempts, base_delay, max_delay)
+            )
+        if failed:
+            ImageDeletion.objects.bulk_update(failed, ["attempts", "next_attempt_at", "last_error"])
+
+        stats["deleted"] += len(done)
+        stats["failed"] += len(failed)
+
+        # Lô cuối chưa đầy -> đã hết việc đến hạn
+        if len(batch) < batch_size:
+            return stats
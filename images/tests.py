@@ -0,0 +1,351 @@
+import io
+import os
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
+
+import cloudinary
+import cloudinary.exceptions
+import cloudinary.utils
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.urls import reverse
+from django.utils import timezone
+from cloudinary import CloudinaryResource
+
+from product.models import Product
+from .backends import LocalBackend, StubBackend, get_backend, restore_delivery_url
+from .delivery import image_url
+from .models import ImageDeletion
+from .normalize import ImageRejected, normalize_uploads
+from .outbox import drain_outbox
+
+STUB_STORAGE = {"BACKEND": "images.backends.StubBackend", "OPTIONS": {}}
+
+
+def uploaded(public_id, version=1):
+    return CloudinaryResource(public_id, version=version, format="jpg", type="upload", resource_type="image")
+
+
+def jpeg_upload(name="ao.jpg", size=(64, 48), exif=None):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (200, 30, 30)).save(buffer, format="JPEG", exif=exif or b"")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/jpeg")
+
+
+@override_settings(IMAGE_STORAGE=STUB_STORAGE)
+class ImageOutboxTest(TestCase):
+    def test_replaced_image_is_queued_not_deleted_inline(self):
+        product = Product.objects.create(
+            name="Áo", slug="ao", code="AO", image=uploaded("old")
+        )
+        product.image = uploaded("new", version=2)
+        product.save()
+
+        self.assertEqual(list(ImageDeletion.objects.values_list("public_id", flat=True)), ["old"])
+        self.assertEqual(get_backend().calls, [])
+
+    def test_drain_retries_with_backoff(self):
+        ImageDeletion.objects.create(public_id="a")
+        ImageDeletion.objects.create(public_id="b")
+        backend = StubBackend(fail_times=1)
+
+        self.assertEqual(drain_outbox(backend=backend), {"deleted": 0, "failed": 2})
+        row = ImageDeletion.objects.get(public_id="a")
+        self.assertEqual(row.attempts, 1)
+        self.assertGreater(row.next_attempt_at, timezone.now())
+        # chưa đến hạn retry
+        self.assertEqual(drain_outbox(backend=backend), {"deleted": 0, "failed": 0})
+
+        ImageDeletion.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(drain_outbox(backend=backend), {"deleted": 2, "failed": 0})
+        self.assertEqual(sorted(backend.deleted), ["a", "b"])
+        self.assertFalse(ImageDeletion.objects.exists())
+
+    def test_rows_are_claimed_before_the_backend_call(self):
+        ImageDeletion.objects.create(public_id="a")
+        backend = StubBackend()
+        seen = []
+
+        def delete_resources(public_ids, resource_type="image"):
+            # Lô đã được nhận: worker khác không lấy được, kể cả khi không còn khoá
+            row = ImageDeletion.objects.get(public_id="a")
+            seen.append(row.next_attempt_at > timezone.now() + timedelta(seconds=250))
+            self.assertEqual(drain_outbox(backend=StubBackend()), {"deleted": 0, "failed": 0})
+            return StubBackend.delete_resources(backend, public_ids, resource_type)
+
+        backend.delete_resources = delete_resources
+        self.assertEqual(drain_outbox(backend=backend), {"deleted": 1, "failed": 0})
+        self.assertEqual(seen, [True])
+        self.assertFalse(ImageDeletion.objects.exists())
+
+
+@override_settings(IMAGE_STORAGE=STUB_STORAGE)
+class ImageLifecycleMixinTest(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name="Mũ", slug="mu", code="MU", image=uploaded("mu-1"))
+
+    def test_save_without_image_change_skips_original_lookup(self):
+        product = Product.objects.get(pk=self.product.pk)
+        product.name = "Mũ lưỡi trai"
+        # chỉ UPDATE: không SELECT lại bản ghi gốc, không savepoint
+        with self.assertNumQueries(1):
+            product.save()
+        self.assertFalse(ImageDeletion.objects.exists())
+
+    def test_delete_queues_current_image(self):
+        Product.objects.get(pk=self.product.pk).delete()
+        self.assertEqual(list(ImageDeletion.objects.values_list("public_id", flat=True)), ["mu-1"])
+
+    def test_bulk_update_queues_replaced_images(self):
+        other = Product.objects.create(name="Khăn", slug="khan", code="KH", image=uploaded("khan-1"))
+        products = list(Product.objects.filter(pk__in=[self.product.pk, other.pk]).order_by("pk"))
+        products[0].image = uploaded("mu-2", version=2)
+        products[1].name = "Khăn len"
+        Product.objects.bulk_update(products, ["name", "image"])
+
+        self.assertEqual(list(ImageDeletion.objects.values_list("public_id", flat=True)), ["mu-1"])
+        self.assertEqual(Product.objects.get(pk=self.product.pk).image.public_id, "mu-2")
+
+    def test_replacing_a_deferred_image_queues_the_old_one(self):
+        product = Product.objects.only("pk", "name").get(pk=self.product.pk)
+        product.image = uploaded("mu-2", version=2)
+        product.save()
+        self.assertEqual(list(ImageDeletion.objects.values_list("public_id", flat=True)), ["mu-1"])
+
+        products = list(Product.objects.defer("image").filter(pk=self.product.pk))
+        products[0].image = uploaded("mu-3", version=3)
+        Product.objects.bulk_update(products, ["image"])
+        self.assertEqual(sorted(ImageDeletion.objects.values_list("public_id", flat=True)), ["mu-1", "mu-2"])
+
+
+@override_settings(IMAGE_STORAGE=STUB_STORAGE)
+class ImageDerivativeTest(TestCase):
+    def setUp(self):
+        get_backend().generated.clear()
+        get_backend().uploaded.clear()
+        get_backend().eager.clear()
+
+    def test_upload_stores_derivatives_and_requests_eager_generation(self):
+        upload = jpeg_upload("ao-moi.jpg")
+        # Upload qua StubBackend: public_id = tên file, version 1
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(name="Áo", slug="ao", code="AO", image=upload)
+
+        srcset = Product.objects.get(pk=product.pk).image_derivatives["image"]
+        self.assertEqual(set(srcset), {"thumb", "card", "detail"})
+        self.assertEqual(srcset["thumb"], "http://res.cloudinary.com/demo/image/upload/c_limit,q_70,w_160/v1/ao-moi.webp")
+        self.assertEqual(get_backend().uploaded, ["ao-moi"])
+        # Phái sinh được tạo bất đồng bộ trong lời gọi upload, không gọi explicit() sau commit
+        [(public_id, transformations, eager_async)] = get_backend().eager
+        self.assertEqual((public_id, eager_async), ("ao-moi", True))
+        self.assertIn({"width": 160, "crop": "limit", "quality": 70, "format": "webp"}, transformations)
+        self.assertEqual(get_backend().generated, [])
+
+        response = self.client.get(reverse("products:list product"))
+        self.assertEqual(response.data["results"][0]["image_srcset"], srcset)
+
+        product.image = None
+        product.save()
+        self.assertEqual(Product.objects.get(pk=product.pk).image_derivatives, {})
+
+    def test_backfill_command(self):
+        Product.objects.create(name="Mũ", slug="mu", code="MU", image=uploaded("mu-1"))
+        Product.objects.update(image_derivatives={})
+        out = io.StringIO()
+        call_command("build_image_derivatives", "--eager", stdout=out)
+        self.assertIn("product.Product: 1 images built", out.getvalue())
+        self.assertIn("card", Product.objects.get().image_derivatives["image"])
+        self.assertEqual(len(get_backend().generated), 1)
+
+
+class ImageNormalizationTest(TestCase):
+    def test_upload_is_downscaled_stripped_and_reencoded(self):
+        from PIL import Image
+
+        exif = Image.Exif()
+        exif[0x010F] = "Camera"  # Make
+        upload = jpeg_upload(size=(3000, 1500), exif=exif.tobytes())
+        original_bytes = upload.size
+        with mock.patch("cloudinary.uploader.upload_resource", return_value=uploaded("ao-1")) as upload_resource:
+            with self.assertLogs("Product", level="INFO") as logs:
+                Product.objects.create(name="Áo", slug="ao", code="AO", image=upload)
+
+        stored = upload_resource.call_args.args[0]
+        self.assertEqual(stored.name, "ao.webp")
+        with Image.open(stored) as image:
+            self.assertEqual((image.format, image.size), ("WEBP", (2048, 1024)))
+            self.assertNotIn("exif", image.info)
+        self.assertTrue(any(f"{original_bytes} -> {stored.size} bytes" in line for line in logs.output))
+
+    @override_settings(IMAGE_NORMALIZATION={"MAX_PIXELS": 1000})
+    def test_oversized_or_invalid_image_is_rejected_before_upload(self):
+        for upload in (jpeg_upload(size=(100, 100)), SimpleUploadedFile("x.jpg", b"fake", content_type="image/jpeg")):
+            with mock.patch("cloudinary.uploader.upload_resource") as upload_resource:
+                with self.assertRaises(ImageRejected) as ctx, transaction.atomic():
+                    Product.objects.create(name="Áo", slug="ao", code="AO", image=upload)
+            self.assertIn("image", ctx.exception.message_dict)
+            upload_resource.assert_not_called()
+        self.assertFalse(Product.objects.exists())
+
+    @override_settings(IMAGE_NORMALIZATION={"MAX_PIXELS": 1000})
+    def test_rejected_upload_through_put(self):
+        product = Product.objects.create(name="Áo", slug="ao", code="AO")
+        url = reverse("products:detail product", args=[product.pk])
+        response = self.client.put(url, encode_multipart(BOUNDARY, {"name": "Áo mới"}), content_type=MULTIPART_CONTENT)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Product.objects.get(pk=product.pk).name, "Áo mới")
+
+        with mock.patch("cloudinary.uploader.upload_resource") as upload_resource:
+            response = self.client.put(
+                url, encode_multipart(BOUNDARY, {"image": jpeg_upload(size=(100, 100))}), content_type=MULTIPART_CONTENT
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("image", response.json())
+        upload_resource.assert_not_called()
+
+    @override_settings(IMAGE_NORMALIZATION={"TIMEOUT": 0.01})
+    def test_slow_normalization_is_rejected(self):
+        def slow(uploaded, options):
+            time.sleep(0.2)
+
+        with mock.patch("images.normalize.normalize_image", side_effect=slow):
+            with self.assertRaises(ImageRejected) as ctx:
+                normalize_uploads({"image": jpeg_upload()})
+        self.assertEqual(ctx.exception.message_dict, {"image": ["Image processing timed out."]})
+
+
+@override_settings(IMAGE_STORAGE=STUB_STORAGE)
+class DirectUploadTest(TestCase):
+    def setUp(self):
+        get_backend().generated.clear()
+        self.product = Product.objects.create(name="Áo", slug="ao", code="AO", image=uploaded("ao-cu"))
+        self.admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.client.force_login(self.admin)
+
+    def sign(self):
+        response = self.client.post(
+            reverse("images:sign upload"), {"target": "product", "id": self.product.pk}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def cloudinary_response(self, public_id, version=42):
+        # Response upload của Cloudinary ký (public_id, version) bằng api_secret
+        signature = cloudinary.utils.api_sign_request({"public_id": public_id, "version": version}, cloudinary.config().api_secret)
+        return {"public_id": public_id, "version": version, "signature": signature, "format": "jpg"}
+
+    def test_sign_then_finalize_replaces_image(self):
+        data = self.sign()
+        params = dict(data["params"])
+        signature, api_key = params.pop("signature"), params.pop("api_key")
+        self.assertEqual(signature, cloudinary.utils.api_sign_request(params, cloudinary.config().api_secret))
+        self.assertTrue(params["public_id"].startswith(f"product/{self.product.pk}-"))
+
+        body = {"token": data["token"], **self.cloudinary_response(params["public_id"])}
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("images:finalize upload"), body, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("w_160", response.data["image_srcset"]["thumb"])
+
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual((product.image.public_id, product.image.version), (params["public_id"], "42"))
+        self.assertEqual(list(ImageDeletion.objects.values_list("public_id", flat=True)), ["ao-cu"])
+        # Phái sinh đã được tạo lúc upload (eager) -> không gọi backend trong request
+        self.assertEqual(get_backend().generated, [])
+
+    def test_finalize_rejects_tampered_requests(self):
+        data = self.sign()
+        public_id = data["params"]["public_id"]
+        url = reverse("images:finalize upload")
+        bad_signature = {**self.cloudinary_response(public_id), "signature": "x"}
+        other_public_id = self.cloudinary_response("product/khac")
+        for body in ({"token": data["token"], **bad_signature}, {"token": data["token"], **other_public_id},
+                     {"token": data["token"] + "x", **self.cloudinary_response(public_id)}):
+            self.assertEqual(self.client.post(url, body, content_type="application/json").status_code, 400)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).image.public_id, "ao-cu")
+
+        self.client.logout()
+        self.assertEqual(self.client.post(reverse("images:sign upload"), {"target": "product", "id": 1}).status_code, 403)
+
+
+class LocalBackendTest(TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        self.addCleanup(restore_delivery_url)
+        self.storage = {"BACKEND": "images.backends.LocalBackend", "OPTIONS": {"root": self.root.name}}
+
+    def test_upload_serve_replace_and_drain(self):
+        with override_settings(IMAGE_STORAGE=self.storage):
+            product = Product.objects.create(name="Áo", slug="ao", code="AO", image=jpeg_upload())
+            backend = get_backend()
+            first = backend.path(product.image.public_id)
+            self.assertTrue(first.is_file())
+
+            url = Product.objects.get(pk=product.pk).image.url
+            self.assertTrue(url.startswith("http://localhost:8000/api/images/local/demo/image/upload/v"))
+            response = self.client.get(url.removeprefix("http://localhost:8000"))
+            self.assertEqual(b"".join(response.streaming_content), first.read_bytes())
+            # URL ảnh phái sinh cũng được phục vụ (bằng file gốc)
+            response = self.client.get(product.image_srcset()["thumb"].removeprefix("http://localhost:8000"))
+            self.assertEqual(response.status_code, 200)
+
+            product.image = jpeg_upload("ao-2.jpg")
+            product.save()
+            self.assertEqual(drain_outbox(), {"deleted": 1, "failed": 0})
+            self.assertFalse(first.exists())
+            self.assertEqual(backend.stats["upload"], 2)
+
+    def test_urls_are_local_before_any_upload(self):
+        with override_settings(IMAGE_STORAGE=self.storage):
+            self.assertEqual(
+                image_url("image/upload/v1/foo.jpg"), "http://localhost:8000/api/images/local/demo/image/upload/v1/foo.jpg"
+            )
+        restore_delivery_url()
+        with override_settings(IMAGE_STORAGE={**self.storage, "OPTIONS": {**self.storage["OPTIONS"], "base_url": "cdn.local"}}):
+            # Lúc start: backend được tạo trong ImagesConfig.ready()
+            apps.get_app_config("images").ready()
+            resource = Product._meta.get_field("image").to_python("image/upload/v1/foo.jpg")
+            self.assertEqual(resource.url, "http://cdn.local/demo/image/upload/v1/foo.jpg")
+
+    def test_injected_errors_and_rate_limit(self):
+        failing = LocalBackend(root=self.root.name, error_rate=1)
+        with self.assertRaises(cloudinary.exceptions.GeneralError):
+            failing.upload(jpeg_upload())
+
+        limited = LocalBackend(root=self.root.name, rate_limit="2/hour")
+        self.assertEqual(limited.delete_resources(["a", "b"]), {"a": "not_found", "b": "not_found"})
+        with self.assertRaises(cloudinary.exceptions.RateLimited):
+            limited.delete_resources(["c"])
+        self.assertEqual(limited.stats["rate_limited"], 1)
+
+    def test_gc_deletes_only_old_unreferenced_images(self):
+        with override_settings(IMAGE_STORAGE=self.storage):
+            backend = get_backend()
+            product = Product.objects.create(name="Áo", slug="ao", code="AO", image=jpeg_upload())
+            backend.upload(jpeg_upload(), public_id="orphans/old")
+            backend.upload(jpeg_upload(), public_id="orphans/new")
+            two_days_ago = time.time() - 2 * 86400
+            for public_id in (product.image.public_id, "orphans/old"):
+                os.utime(backend.path(public_id), (two_days_ago, two_days_ago))
+
+            out = io.StringIO()
+            # run-size 1 -> mỗi public_id 1 file tạm, kiểm tra luôn phần merge
+            call_command("gc_images", "--dry-run", "--run-size", "1", stdout=out)
+            self.assertIn("3 stored, 1 referenced, 1 within grace period, 1 orphaned", out.getvalue())
+            self.assertIsNotNone(backend.path("orphans/old"))
+
+            call_command("gc_images", "--run-size", "1", stdout=out)
+            self.assertIn("Deleted 1 images, 0 failed", out.getvalue())
+            self.assertIsNone(backend.path("orphans/old"))
+            self.assertIsNotNone(backend.path("orphans/new"))
+            self.assertIsNotNone(backend.path(product.image.public_id))
@@ -0,0 +1,100 @@
+import secrets
+import time
+
+import cloudinary
+import cloudinary.utils
+from cloudinary import CloudinaryResource
+from django.apps import apps
+from django.conf import settings
+from django.core import signing
+
+from .delivery import derivative_transformations
+
+### target của API upload -> model (đều dùng ImageLifecycleMixin)
+UPLOAD_TARGETS = {
+    "product": "product.Product",
+    "product_variant": "product.ProductVariant",
+    "category": "category.Category",
+}
+UPLOAD_TOKEN_SALT = "images.direct-upload"
+
+
+class UploadError(ValueError):
+    pass
+
+
+def _token_max_age():
+    return getattr(settings, "IMAGE_UPLOAD", {}).get("TOKEN_MAX_AGE", 600)
+
+
+def resolve_target(target, pk, field="image"):
+    """
+    (target, pk, field) -> model instance. Raise UploadError nếu target / field không hợp lệ,
+    DoesNotExist nếu không có bản ghi.
+    """
+    if target not in UPLOAD_TARGETS:
+        raise UploadError(f"target must be one of: {', '.join(UPLOAD_TARGETS)}.")
+    model = apps.get_model(UPLOAD_TARGETS[target])
+    if field not in model.image_fields:
+        raise UploadError(f"field must be one of: {', '.join(model.image_fields)}.")
+    return model._default_manager.get(pk=pk)
+
+
+def sign_upload(target, pk, field="image"):
+    """
+    Tham số upload có chữ ký (sống TOKEN_MAX_AGE giây) để client upload thẳng lên
+    Cloudinary. public_id do server chọn và nằm trong chữ ký, ảnh phái sinh được
+    Cloudinary tạo sẵn (eager) ngay lúc upload.
+    token dùng cho bước finalize (ràng buộc target / bản ghi / field / public_id).
+    """
+    instance = resolve_target(target, pk, field)
+    config = cloudinary.config()
+    public_id = f"{target}/{instance.pk}-{secrets.token_hex(8)}"
+    params = {"timestamp": int(time.time()), "public_id": public_id}
+    transformations = derivative_transformations()
+    if transformations:
+        params["eager"] = cloudinary.utils.build_eager(transformations)
+        params["eager_async"] = "true"
+    params["signature"] = cloudinary.utils.api_sign_request(params, config.api_secret)
+    params["api_key"] = config.api_key
+
+    token = signing.TimestampSigner(salt=UPLOAD_TOKEN_SALT).sign_object(
+        {"target": target, "id": instance.pk, "field": field, "public_id": public_id}
+    )
+    return {
+        "upload_url": cloudinary.utils.cloudinary_api_url("upload", resource_type="image"),
+        "params": params,
+        "token": token,
+        "expires_in": _token_max_age(),
+    }
+
+
+def finalize_upload(token, public_id, version, signature, image_format=None):
+    """
+    Gắn ảnh client vừa upload vào bản ghi sau khi kiểm tra:
+    - token còn hạn và đúng public_id đã cấp
+    - chữ ký trong response của Cloudinary (public_id + version)
+    Ảnh cũ được xử lý như khi save() (outbox), không gọi API Cloudinary trong request.
+    """
+    try:
+        data = signing.TimestampSigner(salt=UPLOAD_TOKEN_SALT).unsign_object(token, max_age=_token_max_age())
+    except signing.SignatureExpired:
+        raise UploadError("Upload token has expired.")
+    except signing.BadSignature:
+        raise UploadError("Invalid upload token.")
+    if public_id != data["public_id"]:
+        raise UploadError("public_id does not match the upload token.")
+    if not version or not signature or not cloudinary.utils.verify_api_response_signature(public_id, version, signature):
+        raise UploadError("Invalid upload signature.")
+
+    instance = resolve_target(data["target"], data["id"], data["field"])
+    setattr(
+        instance,
+        data["field"],
+        CloudinaryResource(public_id, version=str(version), format=image_format, type="upload", resource_type="image"),
+    )
+    update_fields = [data["field"]]
+    if any(field.name == "updated_at" for field in instance._meta.concrete_fields):
+        update_fields.append("updated_at")
+    instance.save(update_fields=update_fields)
+    return instance
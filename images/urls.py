@@ -0,0 +1,10 @@
+from django.urls import path
+from .views import *
+
+app_name = "images"
+
+urlpatterns = [
+    path("uploads/sign", ImageUploadSignView.as_view(), name="sign upload"),
+    path("uploads/finalize", ImageUploadFinalizeView.as_view(), name="finalize upload"),
+    path("local/<path:path>", local_image, name="local image"),
+]
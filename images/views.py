@@ -0,0 +1,99 @@
+import re
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.http import FileResponse, Http404, HttpResponseForbidden
+from django.views.decorators.http import require_GET
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .backends import LocalBackend, get_backend
+from .uploads import UploadError, finalize_upload, sign_upload
+
+### <cloud_name>/<resource_type>/upload/[transformation/...]v<version>/<public_id>.<format>
+LOCAL_URL_RE = re.compile(
+    r"^[^/]+/(?P<resource_type>image|video|raw)/upload/(?:[^/]+/)*?v\d+/(?P<public_id>[^.]+?)(?:\.\w+)?$"
+)
+
+
+class ImageUploadSignView(APIView):
+    """
+    Cấp tham số upload có chữ ký để client upload ảnh thẳng lên Cloudinary
+    (không đi qua worker Django).
+    Body: {"target": "product" | "product_variant" | "category", "id": ..., "field": "image"}
+    """
+
+    def post(self, request):
+
+        ### check if super user
+        if not request.user.is_superuser:
+            return HttpResponseForbidden(content="You do not have permission to upload images")
+
+        try:
+            data = sign_upload(request.data.get("target"), request.data.get("id"), request.data.get("field") or "image")
+            return Response(data, status=status.HTTP_200_OK)
+        except UploadError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except (ObjectDoesNotExist, ValueError, TypeError):
+            return Response({"error": "Object not found."}, status=status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            return Response(
+                {"error": f"An unexpected error occurred: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+class ImageUploadFinalizeView(APIView):
+    """
+    Gắn ảnh đã upload vào bản ghi.
+    Body: {"token": (từ bước sign), "public_id", "version", "signature", "format"}
+    lấy từ response upload của Cloudinary.
+    """
+
+    def post(self, request):
+
+        ### check if super user
+        if not request.user.is_superuser:
+            return HttpResponseForbidden(content="You do not have permission to upload images")
+
+        try:
+            instance = finalize_upload(
+                request.data.get("token") or "",
+                request.data.get("public_id"),
+                request.data.get("version"),
+                request.data.get("signature"),
+                request.data.get("format"),
+            )
+            return Response(
+                {
+                    "id": instance.pk,
+                    "image": instance.image.url if instance.image else None,
+                    "image_srcset": instance.image_srcset(),
+                },
+                status=status.HTTP_200_OK,
+            )
+        except UploadError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except ObjectDoesNotExist:
+            return Response({"error": "Object not found."}, status=status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            return Response(
+                {"error": f"An unexpected error occurred: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+@require_GET
+def local_image(request, path):
+    """
+    Phục vụ file của LocalBackend theo URL dạng Cloudinary. Transformation
+    (ảnh phái sinh) bị bỏ qua: luôn trả về file gốc.
+    """
+    backend = get_backend()
+    match = LOCAL_URL_RE.match(path)
+    if not isinstance(backend, LocalBackend) or not match:
+        raise Http404("Image not found.")
+    file_path = backend.path(match.group("public_id"), match.group("resource_type"))
+    if file_path is None:
+        raise Http404("Image not found.")
+    return FileResponse(open(file_path, "rb"))
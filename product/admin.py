@@ -9,7 +9,7 @@ class ProductVariantTabularInline(admin.TabularInline):
 
 class ProductAdmin(admin.ModelAdmin):
 
-    list_display = ('id','name','code','slug','description','origin_price','image','available')
+    list_display = ('id','name','code','slug','description','origin_price','min_price','max_price','image','available')
     list_filter = ('available','category',)
     search_fields = ('name','code','slug',)
     prepopulated_fields = {'slug':('name',)}
@@ -23,18 +23,19 @@ class ProductAdmin(admin.ModelAdmin):
         return ('name',)
 
     def set_default_description(self,request,queryset):
-        queryset.update(description="No description provided")
-        self.message_user(request,f"{queryset.count()} products were updated with default description.")
+        # ProductQuerySet.update tự cập nhật updated_at và invalidate cache
+        updated = queryset.update(description="No description provided")
+        self.message_user(request,f"{updated} products were updated with default description.")
     set_default_description.short_description = 'Set default description for selected products'
 
     def set_active_status(self,request,queryset):
-        queryset.update(active=True)
-        self.message_user(request,f"{queryset.count()} product were marked as active.")
+        updated = queryset.update(available=True)
+        self.message_user(request,f"{updated} product were marked as active.")
     set_active_status.short_description = 'Set active status for selected products'
 
     def set_inactive_status(self,request,queryset):
-        queryset.update(active=False)
-        self.message_user(request,f"{queryset.count()} product were marked as inactive.")
+        updated = queryset.update(available=False)
+        self.message_user(request,f"{updated} product were marked as inactive.")
     set_inactive_status.short_description = 'Set inactive status for selected products'
 
 
@@ -46,13 +47,14 @@ class ProductVariantAdmin(admin.ModelAdmin):
     actions = ['set_active_status','set_inactive_status']
 
     def set_active_status(self,request,queryset):
-        queryset.update(active=True)
-        self.message_user(request,f"{queryset.count()} product variant were marked as active.")
+        # ProductVariantQuerySet.update tính lại giá và cập nhật sản phẩm cha
+        updated = queryset.update(available=True)
+        self.message_user(request,f"{updated} product variant were marked as active.")
     set_active_status.short_description = 'Set active status for selected product variants'
 
     def set_inactive_status(self,request,queryset):
-        queryset.update(active=False)
-        self.message_user(request,f"{queryset.count()} product variant were marked as inactive.")
+        updated = queryset.update(available=False)
+        self.message_user(request,f"{updated} product variant were marked as inactive.")
     set_inactive_status.short_description = 'Set inactive status for selected product variants'
 
 admin.site.register(Product,ProductAdmin)
@@ -0,0 +1,129 @@
+import csv
+import io
+
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from category.models import subtree_path
+from utils.fastjson import dumps_str
+from .importer import CSV_COLUMNS, IMPORT_FORMATS, PRODUCT_COLUMNS, VARIANT_COLUMNS, ImportFormatError
+from .models import Product, ProductVariant
+
+EXPORT_FORMATS = IMPORT_FORMATS
+EXPORT_CHUNK_SIZE = 500
+EXPORT_CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson; charset=utf-8",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def _image_value(image):
+    """
+    Giá trị lưu trong DB (vd: image/upload/v123/abc.jpg) -> import lại được
+    """
+    return Product._meta.get_field("image").get_prep_value(image) or None
+
+
+def parse_updated_since(value):
+    """
+    ISO 8601 -> datetime (không có múi giờ thì hiểu theo TIME_ZONE). Raise ValueError nếu sai định dạng.
+    """
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError("updated_since must be an ISO 8601 datetime.")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def export_queryset(updated_since=None, category=None):
+    """
+    Sản phẩm theo id tăng dần, kèm danh mục và biến thể.
+    Prefetch được Django chạy theo từng chunk của iterator().
+    """
+    products = (
+        Product.objects.select_related("category")
+        .prefetch_related(
+            Prefetch(
+                "productvariant_product",
+                queryset=ProductVariant.objects.select_related("variant__v_type").order_by("id"),
+            )
+        )
+        .order_by("id")
+    )
+    if updated_since:
+        products = products.filter(updated_at__gte=updated_since)
+    if category:
+        # Gồm cả các danh mục con
+        path = subtree_path(category)
+        products = products.filter(category__path__startswith=path) if path else products.none()
+    return products
+
+
+def iter_export_records(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield từng sản phẩm ở đúng định dạng của importer (NDJSON), bộ nhớ
+    chỉ giữ 1 chunk sản phẩm + biến thể tại một thời điểm.
+    """
+    for product in queryset.iterator(chunk_size=chunk_size):
+        yield {
+            "code": product.code,
+            "name": product.name,
+            "slug": product.slug,
+            "description": product.description,
+            "origin_price": product.origin_price,
+            "available": product.available,
+            "category": product.category.code if product.category else None,
+            "image": _image_value(product.image),
+            "variants": [
+                {
+                    "type": pv.variant.v_type.name,
+                    "name": pv.variant.name,
+                    "price_diff": pv.price_diff,
+                    "available": pv.available,
+                    "image": _image_value(pv.image),
+                }
+                for pv in product.productvariant_product.all()
+            ],
+        }
+
+
+def iter_ndjson_lines(records):
+    for record in records:
+        yield dumps_str(record) + "\n"
+
+
+def iter_csv_lines(records):
+    """
+    1 dòng / biến thể (cột sản phẩm lặp lại), sản phẩm không có biến thể -> 1 dòng
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return value
+
+    writer.writerow(CSV_COLUMNS)
+    yield flush()
+    for record in records:
+        product = [record[column] for column in PRODUCT_COLUMNS]
+        for variant in record["variants"] or [None]:
+            if variant is None:
+                writer.writerow(product + [None] * len(VARIANT_COLUMNS))
+            else:
+                writer.writerow(product + [variant[key] for key in VARIANT_COLUMNS.values()])
+        yield flush()
+
+
+def iter_export_lines(file_format, records):
+    if file_format == "ndjson":
+        return iter_ndjson_lines(records)
+    if file_format == "csv":
+        return iter_csv_lines(records)
+    raise ImportFormatError(f"format must be one of: {', '.join(EXPORT_FORMATS)}.")
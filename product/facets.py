@@ -0,0 +1,102 @@
+import hashlib
+
+from django.conf import settings
+from django.db.models import Count, Exists, OuterRef, Q
+
+from utils.cache import catalog_cache
+from .models import ProductVariant, Variant
+
+
+def parse_variant_filter(params):
+    """
+    ?variant=<id>&variant=<id> -> {v_type_id: [variant_id, ...]}
+    Raise ValueError nếu id không hợp lệ / không tồn tại.
+    """
+    values = params.getlist("variant")
+    if not values:
+        return {}
+    try:
+        ids = {int(value) for value in values}
+    except ValueError:
+        raise ValueError("Variant must be an integer.")
+    groups = {}
+    for pk, v_type_id in Variant.objects.filter(pk__in=ids).values_list("id", "v_type_id"):
+        groups.setdefault(v_type_id, []).append(pk)
+    if sum(len(pks) for pks in groups.values()) != len(ids):
+        raise ValueError("Unknown variant.")
+    return {v_type_id: sorted(pks) for v_type_id, pks in sorted(groups.items())}
+
+
+def _has_variant(variant_ids, product="pk"):
+    return Exists(ProductVariant.objects.filter(product=OuterRef(product), variant_id__in=variant_ids))
+
+
+def apply_variant_filter(products, groups):
+    """
+    AND giữa các loại biến thể, OR trong cùng 1 loại:
+    (size S hoặc M) và (màu đỏ) -> mỗi loại 1 điều kiện EXISTS
+    """
+    for variant_ids in groups.values():
+        products = products.filter(_has_variant(variant_ids))
+    return products
+
+
+def facet_counts(products, groups):
+    """
+    Số sản phẩm theo từng biến thể trong 1 query GROUP BY variant.
+    products: queryset đã lọc (keyword, category, ...) nhưng CHƯA lọc biến thể.
+    Số của 1 biến thể tính theo bộ lọc biến thể của các loại KHÁC
+    (bỏ lọc của chính loại đó) -> chọn size S vẫn thấy số của size M, L.
+    """
+    matches = {v_type_id: _has_variant(variant_ids, "product_id") for v_type_id, variant_ids in groups.items()}
+
+    def others(excluded=None):
+        return Q(*[match for v_type_id, match in matches.items() if v_type_id != excluded])
+
+    condition = None
+    if matches:
+        condition = ~Q(variant__v_type_id__in=list(matches)) & others()
+        for v_type_id in matches:
+            condition |= Q(variant__v_type_id=v_type_id) & others(v_type_id)
+
+    # (product, variant) là unique_together -> không cần COUNT(DISTINCT)
+    rows = (
+        ProductVariant.objects.filter(product__in=products.order_by().values("pk"))
+        .values("variant__v_type_id", "variant__v_type__name", "variant_id", "variant__name")
+        .annotate(count=Count("id", filter=condition))
+        .order_by("variant__v_type__name", "variant__name", "variant_id")
+    )
+
+    facets = {}
+    for row in rows:
+        facet = facets.get(row["variant__v_type_id"])
+        if facet is None:
+            facet = facets[row["variant__v_type_id"]] = {
+                "id": row["variant__v_type_id"],
+                "name": row["variant__v_type__name"],
+                "variants": [],
+            }
+        facet["variants"].append(
+            {
+                "id": row["variant_id"],
+                "name": row["variant__name"],
+                "count": row["count"],
+                "selected": row["variant_id"] in groups.get(row["variant__v_type_id"], ()),
+            }
+        )
+    return list(facets.values())
+
+
+def cached_facet_counts(products, groups):
+    """
+    facet_counts() cache ngắn hạn theo bộ lọc (câu SQL của products + biến thể đã chọn)
+    """
+    sql, params = products.order_by().query.sql_with_params()
+    digest = hashlib.md5(f"{sql}:{params!r}:{groups!r}".encode("utf-8")).hexdigest()
+    key = f"catalog:facets:{digest}"
+    cache = catalog_cache()
+    facets = cache.get(key)
+    if facets is None:
+        facets = facet_counts(products, groups)
+        cache.set(key, facets, timeout=settings.CATALOG_CACHE.get("FACET_TIMEOUT", 60))
+    return facets
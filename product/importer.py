@@ -0,0 +1,369 @@
+import csv
+import logging
+from itertools import islice
+
+from django.db import DatabaseError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.text import slugify
+from rest_framework.exceptions import ValidationError
+
+from category.models import Category
+from utils.cache import invalidate as invalidate_cache
+from utils.fastjson import loads
+from .models import Product, ProductVariant, Variant, VariantType
+from .serializers import ProductImportSerializer
+
+logger = logging.getLogger("Product")
+
+IMPORT_FORMATS = ("ndjson", "csv")
+IMPORT_CHUNK_SIZE = 1000
+
+### CSV: 1 dòng / biến thể, các dòng liền nhau cùng code thuộc 1 sản phẩm
+PRODUCT_COLUMNS = ("code", "name", "slug", "description", "origin_price", "available", "category", "image")
+VARIANT_COLUMNS = {
+    "variant_type": "type",
+    "variant_name": "name",
+    "price_diff": "price_diff",
+    "variant_available": "available",
+    "variant_image": "image",
+}
+CSV_COLUMNS = PRODUCT_COLUMNS + tuple(VARIANT_COLUMNS)
+
+### field của Product được import (category -> category_id sau khi resolve)
+PRODUCT_FIELDS = ("name", "slug", "description", "origin_price", "available", "category_id", "image")
+VARIANT_FIELDS = ("price_diff", "available", "image")
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def iter_ndjson(stream):
+    """
+    Mỗi dòng 1 sản phẩm (JSON object), biến thể nằm trong "variants".
+    Yield (số dòng, dict | None, lỗi | None)
+    """
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = loads(line)
+        except ValueError as e:
+            yield line_number, None, {"non_field_errors": [f"Invalid JSON: {e}"]}
+            continue
+        if not isinstance(row, dict):
+            yield line_number, None, {"non_field_errors": ["Each line must be a JSON object."]}
+            continue
+        yield line_number, row, None
+
+
+def iter_csv(stream):
+    """
+    Gom các dòng CSV liền nhau cùng code thành 1 sản phẩm.
+    Ô trống = không có giá trị (giữ nguyên khi cập nhật / mặc định khi tạo mới).
+    """
+    reader = csv.DictReader(stream)
+    missing = {"code", "name"} - set(reader.fieldnames or ())
+    if missing:
+        raise ImportFormatError(f"Missing CSV columns: {', '.join(sorted(missing))}.")
+
+    current = None
+    for record in reader:
+        values = {key: value for key, value in record.items() if key and value not in ("", None)}
+        variant = {VARIANT_COLUMNS[key]: values[key] for key in VARIANT_COLUMNS if key in values}
+        if current and values.get("code") and values.get("code") == current[1].get("code"):
+            if variant:
+                current[1].setdefault("variants", []).append(variant)
+            continue
+        if current:
+            yield current[0], current[1], None
+        row = {key: values[key] for key in PRODUCT_COLUMNS if key in values}
+        if variant:
+            row["variants"] = [variant]
+        current = (reader.line_num, row)
+    if current:
+        yield current[0], current[1], None
+
+
+def iter_rows(stream, file_format):
+    if file_format == "ndjson":
+        return iter_ndjson(stream)
+    if file_format == "csv":
+        return iter_csv(stream)
+    raise ImportFormatError(f"format must be one of: {', '.join(IMPORT_FORMATS)}.")
+
+
+def guess_format(file_name):
+    if file_name and file_name.lower().endswith(".csv"):
+        return "csv"
+    return "ndjson"
+
+
+def _image_value(value):
+    """
+    public_id / đường dẫn đã lưu -> CloudinaryResource (không upload lại)
+    """
+    if not value:
+        return None
+    return Product._meta.get_field("image").to_python(value)
+
+
+def _new_variant(variant):
+    return ProductVariant(variant_id=variant["variant_id"], **{field: variant[field] for field in VARIANT_FIELDS if field in variant})
+
+
+def _same(field_name, old, new):
+    if field_name == "image":
+        field = Product._meta.get_field("image")
+        return field.get_prep_value(old) == field.get_prep_value(new)
+    return old == new
+
+
+class CatalogImporter:
+    """
+    Import sản phẩm + biến thể theo lô:
+    - đọc input dạng stream, validate từng lô chunk_size dòng
+    - Category / VariantType / Variant resolve qua map trong bộ nhớ
+      (VariantType / Variant chưa có sẽ được tạo)
+    - mỗi lô ghi bằng bulk_create / bulk_update trong 1 transaction,
+      sản phẩm được nhận diện theo code
+    - biến thể không có trong file được giữ nguyên
+
+    import_rows() yield lỗi của từng dòng: {"row", "code", "errors"},
+    kết quả tổng hợp nằm trong self.stats.
+    """
+
+    def __init__(self, chunk_size=IMPORT_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.categories = dict(Category.objects.values_list("code", "id"))
+        self.variant_types = dict(VariantType.objects.values_list("name", "id"))
+        self.variants = {
+            (v_type_id, name): pk for pk, name, v_type_id in Variant.objects.values_list("id", "name", "v_type_id")
+        }
+        self.seen_codes = set()
+        self.serializer = ProductImportSerializer()
+        self.stats = {"created": 0, "updated": 0, "unchanged": 0, "failed": 0}
+
+    def import_rows(self, rows):
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            yield from self.import_chunk(chunk)
+        logger.info(
+            f"Catalog import: {self.stats['created']} created, {self.stats['updated']} updated, "
+            f"{self.stats['unchanged']} unchanged, {self.stats['failed']} failed"
+        )
+
+    def _error(self, line_number, code, errors):
+        self.stats["failed"] += 1
+        return {"row": line_number, "code": code, "errors": errors}
+
+    def _validate(self, chunk):
+        """
+        Validate kiểu dữ liệu + trùng code trong file, resolve danh mục.
+        Trả về (các dòng hợp lệ, lỗi)
+        """
+        valid, errors = [], []
+        for line_number, row, parse_error in chunk:
+            if parse_error:
+                errors.append(self._error(line_number, None, parse_error))
+                continue
+            try:
+                data = self.serializer.run_validation(row)
+            except ValidationError as e:
+                errors.append(self._error(line_number, row.get("code"), e.detail))
+                continue
+
+            code = data["code"]
+            if code in self.seen_codes:
+                errors.append(self._error(line_number, code, {"code": ["Duplicate code in file."]}))
+                continue
+            self.seen_codes.add(code)
+
+            category = data.pop("category", None)
+            if "category" in row:
+                if category and category not in self.categories:
+                    errors.append(self._error(line_number, code, {"category": [f"Unknown category code '{category}'."]}))
+                    continue
+                data["category_id"] = self.categories.get(category) if category else None
+            if "image" in data:
+                data["image"] = _image_value(data["image"])
+
+            variants = data.get("variants", [])
+            if len({(variant["type"], variant["name"]) for variant in variants}) != len(variants):
+                errors.append(self._error(line_number, code, {"variants": ["Duplicate variant in product."]}))
+                continue
+            for variant in variants:
+                if "image" in variant:
+                    variant["image"] = _image_value(variant["image"])
+            valid.append((line_number, data))
+        return valid, errors
+
+    def _check_unique(self, valid):
+        """
+        name / slug phải duy nhất: so với DB (sản phẩm có code khác) và trong cùng lô.
+        Sản phẩm mới không có slug -> slug sinh từ name (code), trùng thì thêm hậu tố
+        -2, -3, ... (tên tiếng Việt khác nhau có thể cho cùng slug, vd: "Áo" / "Ao")
+        """
+        existing_codes = set(Product.objects.filter(code__in=[data["code"] for _, data in valid]).values_list("code", flat=True))
+        generated = {
+            data["code"]: slugify(data["name"])[:240] or slugify(data["code"])[:240]
+            for _, data in valid if not data.get("slug") and data["code"] not in existing_codes
+        }
+        names = {data["name"] for _, data in valid}
+        slugs = {data["slug"] for _, data in valid if data.get("slug")} | set(generated.values())
+        owners = {}
+        for code, name, slug in Product.objects.filter(Q(name__in=names) | Q(slug__in=slugs)).values_list("code", "name", "slug"):
+            owners[("name", name)] = code
+            owners[("slug", slug)] = code
+
+        # Slug có sẵn trong file được giữ trước, slug sinh tự động tránh các slug đó
+        checked, errors = [], []
+        for line_number, data in valid:
+            code = data["code"]
+            conflicts = {}
+            for field in ("name", "slug"):
+                value = data.get(field)
+                if value and owners.setdefault((field, value), code) != code:
+                    conflicts[field] = [f"Product with this {field} already exists."]
+            if conflicts:
+                errors.append(self._error(line_number, code, conflicts))
+            else:
+                checked.append((line_number, data))
+
+        result = []
+        for line_number, data in checked:
+            code = data["code"]
+            if code in generated:
+                slug = self._free_slug(generated[code], code, owners)
+                if not slug:
+                    errors.append(self._error(line_number, code, {"slug": ["Cannot generate a slug from name or code."]}))
+                    continue
+                data["slug"] = slug
+            result.append((line_number, data))
+        return result, errors
+
+    def _free_slug(self, base, code, owners):
+        if not base:
+            return None
+        if owners.setdefault(("slug", base), code) == code:
+            return base
+        taken = set(Product.objects.filter(slug__startswith=f"{base}-").values_list("slug", flat=True))
+        suffix = 2
+        while f"{base}-{suffix}" in taken or owners.get(("slug", f"{base}-{suffix}"), code) != code:
+            suffix += 1
+        owners[("slug", f"{base}-{suffix}")] = code
+        return f"{base}-{suffix}"
+
+    def import_chunk(self, chunk):
+        valid, errors = self._validate(chunk)
+        if valid:
+            valid, unique_errors = self._check_unique(valid)
+            errors += unique_errors
+        if valid:
+            try:
+                self._write(valid)
+            except DatabaseError as e:
+                # Lô bị rollback -> báo lỗi cho tất cả dòng trong lô
+                for line_number, data in valid:
+                    errors.append(self._error(line_number, data["code"], {"non_field_errors": [str(e)]}))
+        return sorted(errors, key=lambda error: error["row"])
+
+    def _resolve_variants(self, valid):
+        """
+        Gán variant_id cho biến thể, tạo VariantType / Variant còn thiếu.
+        Trả về map mới để cập nhật sau khi transaction commit.
+        """
+        type_names = {variant["type"] for _, data in valid for variant in data.get("variants", [])}
+        missing_types = [name for name in type_names if name not in self.variant_types]
+        variant_types = dict(self.variant_types)
+        if missing_types:
+            VariantType.objects.bulk_create([VariantType(name=name) for name in missing_types], ignore_conflicts=True)
+            variant_types.update(VariantType.objects.filter(name__in=missing_types).values_list("name", "id"))
+
+        variants = dict(self.variants)
+        missing = {}
+        for _, data in valid:
+            for variant in data.get("variants", []):
+                key = (variant_types[variant["type"]], variant["name"])
+                if key not in variants:
+                    missing.setdefault(key, Variant(v_type_id=key[0], name=key[1]))
+        for key, variant in zip(missing, Variant.objects.bulk_create(missing.values())):
+            variants[key] = variant.pk
+
+        for _, data in valid:
+            for variant in data.get("variants", []):
+                variant["variant_id"] = variants[(variant_types[variant["type"]], variant["name"])]
+        return variant_types, variants
+
+    @transaction.atomic
+    def _write_chunk(self, valid):
+        now = timezone.now()
+        variant_types, variants = self._resolve_variants(valid)
+        existing = {product.code: product for product in Product.objects.filter(code__in=[data["code"] for _, data in valid])}
+        product_variants = {
+            (pv.product_id, pv.variant_id): pv
+            for pv in ProductVariant.objects.filter(product__in=existing.values())
+        }
+
+        to_create, to_update, new_variants, changed_variants = [], [], [], []
+        unchanged = 0
+        update_fields, variant_fields = {"updated_at"}, set()
+        for _, data in valid:
+            product = existing.get(data["code"])
+            values = {field: data[field] for field in PRODUCT_FIELDS if field in data}
+            if product is None:
+                values.setdefault("slug", slugify(data["name"]) or slugify(data["code"]))
+                product = Product(code=data["code"], **values)
+                to_create.append(product)
+                new_variants += [(product, _new_variant(variant)) for variant in data.get("variants", [])]
+                continue
+
+            changed = False
+            for field, value in values.items():
+                if not _same(field, getattr(product, field), value):
+                    setattr(product, field, value)
+                    update_fields.add(field)
+                    changed = True
+            for variant in data.get("variants", []):
+                pv = product_variants.get((product.pk, variant["variant_id"]))
+                if pv is None:
+                    new_variants.append((product, _new_variant(variant)))
+                    changed = True
+                    continue
+                fields = [f for f in VARIANT_FIELDS if f in variant and not _same(f, getattr(pv, f), variant[f])]
+                if fields:
+                    for field in fields:
+                        setattr(pv, field, variant[field])
+                    variant_fields.update(fields)
+                    changed_variants.append(pv)
+                    changed = True
+            if changed:
+                # bulk_update không chạy auto_now -> tự cập nhật updated_at (ETag / cache)
+                product.updated_at = now
+                to_update.append(product)
+            else:
+                unchanged += 1
+
+        Product.objects.bulk_create(to_create)
+        if to_update:
+            Product.objects.bulk_update(to_update, sorted(update_fields))
+        for product, pv in new_variants:
+            pv.product_id = product.pk
+        ProductVariant.objects.bulk_create([pv for _, pv in new_variants])
+        if changed_variants:
+            ProductVariant.objects.bulk_update(changed_variants, sorted(variant_fields))
+        invalidate_cache("product", [product.pk for product in to_update + to_create])
+
+        self.stats["created"] += len(to_create)
+        self.stats["updated"] += len(to_update)
+        self.stats["unchanged"] += unchanged
+        return variant_types, variants
+
+    def _write(self, valid):
+        # Map chỉ được cập nhật khi lô commit thành công
+        self.variant_types, self.variants = self._write_chunk(valid)
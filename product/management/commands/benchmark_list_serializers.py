@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from category.models import Category
+from category.serializers import CategoryMenuSerializer, CategoryMenuValues
+from product.models import Product
+from product.serializers import ProductMenuSerializer, ProductMenuValues
+
+
+def _serializer_path(serializer_class, queryset, rows):
+    return serializer_class(list(queryset[:rows]), many=True).data
+
+
+def _values_path(values_class, queryset, rows):
+    return values_class.rows(list(values_class.queryset(queryset)[:rows]))
+
+
+class Command(BaseCommand):
+    help = (
+        "So sánh thời gian serialize 1 trang danh sách: serializer DRF (model instance) "
+        "với đường values() (dict), trên dữ liệu hiện có trong DB"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100, help="Số dòng mỗi trang")
+        parser.add_argument("--repeat", type=int, default=50, help="Số lần lặp mỗi đường")
+
+    def handle(self, *args, **options):
+        if options["rows"] <= 0 or options["repeat"] <= 0:
+            raise CommandError("--rows and --repeat must be positive.")
+
+        cases = (
+            ("products", Product.objects.order_by("name", "id"), ProductMenuSerializer, ProductMenuValues),
+            ("categories", Category.objects.order_by("name", "id"), CategoryMenuSerializer, CategoryMenuValues),
+        )
+        for name, queryset, serializer_class, values_class in cases:
+            # Hai đường phải cho cùng output
+            expected = [dict(row) for row in _serializer_path(serializer_class, queryset, options["rows"])]
+            actual = _values_path(values_class, queryset, options["rows"])
+            if expected != actual:
+                raise CommandError(f"{name}: values() output differs from {serializer_class.__name__}.")
+
+            timings = {}
+            for label, run, cls in (
+                ("serializer", _serializer_path, serializer_class),
+                ("values", _values_path, values_class),
+            ):
+                start = time.perf_counter()
+                for _ in range(options["repeat"]):
+                    run(cls, queryset, options["rows"])
+                timings[label] = (time.perf_counter() - start) * 1000 / options["repeat"]
+
+            self.stdout.write(
+                f"{name} ({len(actual)} rows): serializer {timings['serializer']:.2f} ms, "
+                f"values {timings['values']:.2f} ms, x{timings['serializer'] / timings['values']:.1f}"
+            )
@@ -0,0 +1,35 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from product.exporter import (
+    EXPORT_CHUNK_SIZE, EXPORT_FORMATS, export_queryset, iter_export_lines, iter_export_records, parse_updated_since,
+)
+
+
+class Command(BaseCommand):
+    help = "Xuất catalog (sản phẩm + danh mục + biến thể) ra NDJSON / CSV, cùng định dạng với import_catalog"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+        parser.add_argument("--output", default="-", help="Đường dẫn file, '-' để ghi ra stdout")
+        parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+        parser.add_argument("--updated-since", help="Chỉ xuất sản phẩm cập nhật từ thời điểm này (ISO 8601)")
+        parser.add_argument("--category", type=int, help="id danh mục (gồm cả danh mục con)")
+
+    def handle(self, *args, **options):
+        try:
+            updated_since = parse_updated_since(options["updated_since"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options["chunk_size"] <= 0:
+            raise CommandError("--chunk-size must be positive.")
+
+        records = iter_export_records(export_queryset(updated_since, options["category"]), options["chunk_size"])
+        output = sys.stdout if options["output"] == "-" else open(options["output"], "w", encoding="utf-8", newline="")
+        try:
+            for line in iter_export_lines(options["format"], records):
+                output.write(line)
+        finally:
+            if output is not sys.stdout:
+                output.close()
@@ -0,0 +1,42 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from product.importer import IMPORT_CHUNK_SIZE, IMPORT_FORMATS, CatalogImporter, ImportFormatError, guess_format, iter_rows
+
+
+class Command(BaseCommand):
+    help = "Import sản phẩm + biến thể hàng loạt từ file NDJSON / CSV (theo lô, báo lỗi từng dòng)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Đường dẫn file, '-' để đọc từ stdin")
+        parser.add_argument("--format", choices=IMPORT_FORMATS, help="Mặc định đoán theo đuôi file (.csv / còn lại là ndjson)")
+        parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+        parser.add_argument("--report", help="Ghi lỗi từng dòng ra file (NDJSON), mặc định in ra stderr")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or guess_format(path)
+        if options["chunk_size"] <= 0:
+            raise CommandError("--chunk-size must be positive.")
+
+        stream = sys.stdin if path == "-" else open(path, encoding="utf-8-sig", newline="")
+        report = open(options["report"], "w", encoding="utf-8") if options["report"] else self.stderr
+        try:
+            importer = CatalogImporter(chunk_size=options["chunk_size"])
+            for error in importer.import_rows(iter_rows(stream, file_format)):
+                report.write(json.dumps(error, ensure_ascii=False) + "\n")
+        except ImportFormatError as e:
+            raise CommandError(str(e))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            if options["report"]:
+                report.close()
+
+        stats = importer.stats
+        self.stdout.write(
+            f"Created {stats['created']}, updated {stats['updated']}, "
+            f"unchanged {stats['unchanged']}, failed {stats['failed']}"
+        )
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from product.models import Product, refresh_prices
+
+
+class Command(BaseCommand):
+    help = "Tính lại giá bán (effective_price của biến thể, min/max_price của sản phẩm) theo từng lô"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--product", type=int, action="append", help="Chỉ tính lại sản phẩm này (có thể lặp lại)")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        product_ids = options["product"] or list(Product.objects.order_by("id").values_list("id", flat=True))
+        chunk_size = options["chunk_size"]
+        for start in range(0, len(product_ids), chunk_size):
+            with transaction.atomic():
+                refresh_prices(product_ids[start:start + chunk_size])
+        self.stdout.write(f"{len(product_ids)} products refreshed")
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.20 on 2026-10-18 13:06
+
+from django.contrib.postgres.operations import TrigramExtension
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('category', '0004_category_search_indexes'),
+        ('product', '0007_productvariant_image'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AlterModelOptions(
+            name='product',
+            options={'ordering': ['-image'], 'verbose_name': 'Sản phẩm', 'verbose_name_plural': 'Sản phẩm'},
+        ),
+        migrations.AlterModelOptions(
+            name='productvariant',
+            options={'ordering': ['-image', 'product'], 'verbose_name': 'Biến thể SP', 'verbose_name_plural': 'Biến thể SP'},
+        ),
+        migrations.AlterModelOptions(
+            name='variant',
+            options={'ordering': ['name', 'v_type'], 'verbose_name': 'Biến thể', 'verbose_name_plural': 'Biến thể'},
+        ),
+        migrations.AlterModelOptions(
+            name='varianttype',
+            options={'ordering': ['name'], 'verbose_name': 'Loại biến thể', 'verbose_name_plural': 'Loại biến thể'},
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='products', to='category.category', verbose_name='Danh mục'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='product_name_trgm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('name', 'code', config='simple', weight='A'), '||', django.contrib.postgres.search.SearchVector('description', config='simple', weight='B'), django.contrib.postgres.search.SearchConfig('simple')), name='product_search_vector_idx'),
+        ),
+    ]
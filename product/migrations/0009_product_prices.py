@@ -0,0 +1,55 @@
+# Generated by Django 4.2.20 on 2026-10-18 13:30
+
+from django.db import migrations, models
+from django.db.models import F, Max, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_prices(apps, schema_editor):
+    Product = apps.get_model("product", "Product")
+    ProductVariant = apps.get_model("product", "ProductVariant")
+    origin_price = Product.objects.filter(pk=OuterRef("product_id")).order_by().values("origin_price")[:1]
+    ProductVariant.objects.update(effective_price=F("price_diff") + Subquery(origin_price))
+    prices = ProductVariant.objects.filter(product=OuterRef("pk"), available=True).order_by().values("product")
+    Product.objects.update(
+        min_price=Coalesce(Subquery(prices.annotate(price=Min("effective_price")).values("price")), F("origin_price")),
+        max_price=Coalesce(Subquery(prices.annotate(price=Max("effective_price")).values("price")), F("origin_price")),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0008_product_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='max_price',
+            field=models.FloatField(default=0, editable=False, verbose_name='Giá cao nhất'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='min_price',
+            field=models.FloatField(default=0, editable=False, verbose_name='Giá thấp nhất'),
+        ),
+        migrations.AddField(
+            model_name='productvariant',
+            name='effective_price',
+            field=models.FloatField(default=0, editable=False, verbose_name='Giá bán'),
+        ),
+        migrations.RunPython(fill_prices, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['min_price', 'id'], name='product_min_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['max_price'], name='product_max_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productvariant',
+            index=models.Index(fields=['effective_price'], name='productvariant_price_idx'),
+        ),
+    ]
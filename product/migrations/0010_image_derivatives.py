@@ -0,0 +1,23 @@
+# Generated by Django 4.2.20 on 2026-10-18 13:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0009_product_prices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='image_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Ảnh phái sinh'),
+        ),
+        migrations.AddField(
+            model_name='productvariant',
+            name='image_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Ảnh phái sinh'),
+        ),
+    ]
@@ -1,13 +1,25 @@
+from collections import Counter
 from django.db import models
-from django.core.files.uploadedfile import InMemoryUploadedFile, TemporaryUploadedFile
+from django.db.models import Count, F, Max, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Upper
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector
 from cloudinary.models import CloudinaryField
-from cloudinary.uploader import destroy
-import cloudinary
 import logging
 from django.db import transaction
+from django.utils import timezone
+from utils.cache import invalidate as invalidate_cache
+from images.models import ImageLifecycleMixin, ImageLifecycleQuerySet
+from category.models import apply_product_count_deltas, reconcile_product_counts
 loggerP = logging.getLogger('Product')
 loggerPV = logging.getLogger('ProductVariant')
 
+### tsvector dùng chung cho GIN index và truy vấn search_mode=fulltext (phải giống hệt nhau)
+PRODUCT_SEARCH_VECTOR = (
+    SearchVector("name", "code", weight="A", config="simple")
+    + SearchVector("description", weight="B", config="simple")
+)
+
 
 def parse_path(url):
     """
@@ -42,47 +54,135 @@ def parse_path(url):
         return None
     
 
-def is_new_upload(image_field):
-        """
-        Kiểm tra xem có phải là file mới upload không
-        (chưa có trên Cloudinary)
-        """
-        if not image_field:
-            return False
-        
-        # Kiểm tra xem có phải là uploaded file không
-        is_uploaded_file = isinstance(
-            image_field, 
-            (InMemoryUploadedFile, TemporaryUploadedFile)
+### field của Product ảnh hưởng tới Category.product_count / available_product_count
+COUNTER_FIELDS = {"category", "category_id", "available"}
+
+
+def product_count_deltas(before=(), after=()):
+    """
+    before / after: [((category_id, available), số sản phẩm)]
+    -> {category_id: [thay đổi tổng, thay đổi còn hàng]}
+    """
+    deltas = {}
+    for sign, groups in ((-1, before), (1, after)):
+        for (category_id, available), count in groups:
+            delta = deltas.setdefault(category_id, [0, 0])
+            delta[0] += sign * count
+            if available:
+                delta[1] += sign * count
+    return deltas
+
+
+### giá bán = origin_price + price_diff, được lưu sẵn (có index) để lọc / sắp xếp theo giá
+PRICE_FIELDS = ("min_price", "max_price")
+VARIANT_PRICE_FIELDS = {"product", "product_id", "price_diff", "available"}
+
+
+def refresh_prices(product_ids, variants=True):
+    """
+    Tính lại giá bán của các sản phẩm bằng UPDATE trên DB (không load object,
+    số query không phụ thuộc số biến thể):
+    - ProductVariant.effective_price = origin_price + price_diff
+    - Product.min_price / max_price theo các biến thể còn hàng,
+      không có biến thể còn hàng thì = origin_price
+    """
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+    if variants:
+        origin_price = Product.objects.filter(pk=OuterRef("product_id")).order_by().values("origin_price")[:1]
+        ProductVariant.objects.filter(product_id__in=product_ids).update(
+            effective_price=F("price_diff") + Subquery(origin_price)
         )
-        
-        # Hoặc là CloudinaryResource nhưng chưa có public_id
-        if hasattr(image_field, 'public_id'):
-            return False  # Đã có trên Cloudinary
-        
-        return is_uploaded_file
+    prices = ProductVariant.objects.filter(product=OuterRef("pk"), available=True).order_by().values("product")
+    Product.objects.update_pks(
+        product_ids,
+        min_price=Coalesce(Subquery(prices.annotate(price=Min("effective_price")).values("price")), F("origin_price")),
+        max_price=Coalesce(Subquery(prices.annotate(price=Max("effective_price")).values("price")), F("origin_price")),
+    )
 
-def get_public_id(image_field):
+
+def touch_products(product_ids):
     """
-    Lấy public_id an toàn
-    Trả về None nếu:
-    - image_field là None
-    - image_field là file mới upload (chưa có public_id)
+    Cập nhật updated_at (ETag / Last-Modified) và xoá cache chi tiết của các sản phẩm,
+    dùng khi dữ liệu hiển thị trong chi tiết sản phẩm đổi ở bảng khác (tên biến thể, ...)
     """
-    if not image_field:
-        return None
-    
-    # Nếu là file mới upload, chưa có public_id
-    if is_new_upload(image_field):
-        return None
-    
-    # Nếu là CloudinaryResource có public_id
-    if hasattr(image_field, 'public_id'):
-        return image_field.public_id
-    
-    return None
+    product_ids = list(product_ids)
+    if product_ids:
+        Product.objects.update_pks(product_ids, updated_at=timezone.now())
+
+
+class ProductQuerySet(ImageLifecycleQuerySet):
+    """
+    Giữ số sản phẩm của danh mục đúng với cả các thao tác hàng loạt
+    (update / bulk_create / delete không gọi save()), cập nhật updated_at
+    và invalidate cache chi tiết / danh sách.
+    bulk_update của Django chạy qua update() nên cũng được tính.
+    """
+
+    def counter_groups(self):
+        rows = self.order_by().values_list("category_id", "available").annotate(count=Count("id"))
+        return [((category_id, available), count) for category_id, available, count in rows]
 
-class Product(models.Model):
+    def _lock(self):
+        # FOR UPDATE không dùng được cùng GROUP BY -> khoá trước rồi mới đếm
+        return list(self.select_for_update().values_list("pk", flat=True))
+
+    def update(self, **kwargs):
+        # update() không chạy auto_now -> ETag / stamp danh sách ở các process khác đổi theo
+        kwargs.setdefault("updated_at", timezone.now())
+        counters = COUNTER_FIELDS & kwargs.keys()
+        with transaction.atomic(using=self.db, savepoint=False):
+            if counters or "origin_price" in kwargs:
+                pks = self._lock()
+            else:
+                pks = list(self.values_list("pk", flat=True))
+            scoped = self.model.objects.filter(pk__in=pks)
+            before = scoped.counter_groups() if counters else None
+            rows = super(ProductQuerySet, scoped).update(**kwargs)
+            if counters:
+                apply_product_count_deltas(product_count_deltas(before, scoped.counter_groups()))
+            if "origin_price" in kwargs:
+                refresh_prices(pks)
+            invalidate_cache("product", pks)
+        return rows
+
+    def update_pks(self, pks, **kwargs):
+        """
+        update() theo danh sách pk đã biết, cho field không ảnh hưởng số sản phẩm /
+        giá (refresh_prices, touch_products): không phải query lại pk
+        """
+        kwargs.setdefault("updated_at", timezone.now())
+        rows = super(ProductQuerySet, self.filter(pk__in=pks)).update(**kwargs)
+        invalidate_cache("product", pks)
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        for obj in objs:
+            # Sản phẩm mới chưa có biến thể
+            obj.min_price = obj.max_price = obj.origin_price
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            if kwargs.get("ignore_conflicts") or kwargs.get("update_conflicts"):
+                # Không biết dòng nào thực sự được thêm -> đếm lại các danh mục liên quan
+                reconcile_product_counts({obj.category_id for obj in objs if obj.category_id})
+            else:
+                created = Counter((obj.category_id, obj.available) for obj in objs)
+                apply_product_count_deltas(product_count_deltas(after=created.items()))
+            invalidate_cache("product", [obj.pk for obj in objs])
+        return objs
+
+    def delete(self):
+        with transaction.atomic(using=self.db, savepoint=False):
+            pks = self._lock()
+            before = self.counter_groups()
+            result = super().delete()
+            apply_product_count_deltas(product_count_deltas(before))
+            invalidate_cache("product", pks)
+        return result
+
+
+class Product(ImageLifecycleMixin, models.Model):
     name = models.CharField(max_length=255, unique=True,verbose_name="Tên sản phẩm")
     slug = models.SlugField(max_length=255, unique=True,verbose_name="Đường dẫn")
     description = models.TextField(blank=True, null=True,verbose_name="Mô tả")
@@ -91,141 +191,156 @@ class Product(models.Model):
     category = models.ForeignKey('category.Category',null=True,blank=True, on_delete=models.SET_NULL, related_name='products',verbose_name="Danh mục")
     available = models.BooleanField(default=True,verbose_name="Còn hàng")### tình trạng còn hàng hay không
     image = CloudinaryField(blank=True, null=True,verbose_name="Hình ảnh")
+    ### giá bán thấp nhất / cao nhất (refresh_prices cập nhật khi giá gốc / biến thể thay đổi)
+    min_price = models.FloatField(default=0, editable=False, verbose_name="Giá thấp nhất")
+    max_price = models.FloatField(default=0, editable=False, verbose_name="Giá cao nhất")
 
     ### df column
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    image_label = "Product"
+    image_logger = loggerP
+
+    objects = ProductQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
-    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # field bị defer -> không ghi nhớ, lúc save sẽ query lại
+        if "category_id" in instance.__dict__ and "available" in instance.__dict__:
+            instance._loaded_counter_state = (instance.category_id, instance.available)
+        if "origin_price" in instance.__dict__:
+            instance._loaded_origin_price = instance.origin_price
+        return instance
 
-    def save(self, *args, **kwargs):
+    def counter_state(self):
+        """
+        (category_id, available) đang lưu trong DB: lấy từ lúc load, không có thì query.
+        None nếu bản ghi chưa có trong DB.
+        """
+        state = self.__dict__.get("_loaded_counter_state")
+        if state is None and self.pk is not None:
+            state = type(self)._base_manager.filter(pk=self.pk).values_list("category_id", "available").first()
+        return state
 
-        old_image_public_id = None
-        
-        if self.pk:
-            try:
-                # Lấy instance gốc từ DB
-                original = Product.objects.select_for_update().get(pk=self.pk)
-                
-                # Lấy public_id của ảnh cũ (từ DB)
-                original_public_id = get_public_id(original.image)
-                
-                # Kiểm tra xem có thay đổi image field không
-                # Trường hợp 1: Xóa ảnh (self.image = None hoặc '')
-                if original.image and not self.image:
-                    old_image_public_id = original_public_id
-                    loggerP.info(
-                        f"Image removed for Product {self.pk}. "
-                        f"Will delete: {old_image_public_id}"
-                    )
-                
-                # Trường hợp 2: Upload ảnh mới
-                elif is_new_upload(self.image):
-                    # Đây là file mới upload, chưa có public_id
-                    # Sau khi save, Django-Cloudinary sẽ tự động upload lên Cloudinary
-                    if original_public_id:
-                        old_image_public_id = original_public_id
-                        loggerP.info(
-                            f"New image uploaded for Product {self.pk}. "
-                            f"Will delete old: {old_image_public_id}"
-                        )
-                
-                # Trường hợp 3: Thay đổi từ ảnh này sang ảnh khác (cả 2 đều đã có trên Cloudinary)
-                else:
-                    current_public_id = get_public_id(self.image)
-                    
-                    if original_public_id and current_public_id:
-                        if original_public_id != current_public_id:
-                            old_image_public_id = original_public_id
-                            loggerP.info(
-                                f"Image changed for Product {self.pk}. "
-                                f"Old: {original_public_id}, New: {current_public_id}"
-                            )
-            
-            except Product.DoesNotExist:
-                loggerP.warning(f"Product {self.pk} not found in database")
-        
+    @transaction.atomic(savepoint=False)
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        track = update_fields is None or bool(COUNTER_FIELDS & set(update_fields))
+        before = self.counter_state() if track and not self._state.adding else None
+        adding = self._state.adding
+        reprice = update_fields is None or "origin_price" in update_fields
+        reprice = reprice and not adding and self.__dict__.get("_loaded_origin_price") != self.origin_price
+        if adding:
+            self.min_price = self.max_price = self.origin_price
+        elif update_fields is None and not args:
+            # min/max_price do refresh_prices quản lý -> không ghi đè bằng giá trị cũ trên instance
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in PRICE_FIELDS
+            ]
 
         super().save(*args, **kwargs)
 
-        if old_image_public_id:
-            try:
-                result = cloudinary.uploader.destroy(
-                    old_image_public_id,
-                    invalidate=True,
-                    resource_type='image'
-                )
-                loggerP.info(
-                    f"Deleted old image {old_image_public_id} "
-                    f"for Product {self.pk}: {result}"
-                )
-            except Exception as e:
-                # Chỉ log lỗi, không raise exception
-                loggerP.error(
-                    f"Failed to delete old image {old_image_public_id} "
-                    f"for Product {self.pk}: {e}"
-                )
-        
-        # Log ảnh hiện tại
-        if self.image:
-            current_id = get_public_id(self.image)
-            if current_id:
-                loggerP.info(
-                    f"Current image for Product {self.pk}: "
-                    f"{current_id} - {self.image.url}"
-                )
-            else:
-                loggerP.info(
-                    f"New image uploaded for Product {self.pk}, "
-                    f"will have public_id after save"
-                )
+        if reprice:
+            refresh_prices([self.pk])
+            self.min_price, self.max_price = type(self)._base_manager.filter(pk=self.pk).values_list(*PRICE_FIELDS).get()
+        self._loaded_origin_price = self.origin_price
+        if track:
+            after = (self.category_id, self.available)
+            if before != after:
+                apply_product_count_deltas(product_count_deltas([(before, 1)] if before else [], [(after, 1)]))
+            self._loaded_counter_state = after
+        invalidate_cache("product", [self.pk])
 
+    @transaction.atomic(savepoint=False)
     def delete(self, *args, **kwargs):
-        """
-        Xóa sản phẩm và ảnh trên Cloudinary
-        """
-        image_public_id = get_public_id(self.image)
-        
-        if image_public_id:
-            loggerP.info(
-                f"Preparing to delete image for Product {self.pk}: {image_public_id}"
-            )
-        
-        # Xóa record trước
+        pk = self.pk
+        before = self.counter_state()
         result = super().delete(*args, **kwargs)
-        
-        # Sau đó xóa ảnh trên Cloudinary
-        if image_public_id:
-            try:
-                destroy_result = cloudinary.uploader.destroy(
-                    image_public_id,
-                    invalidate=True,
-                    resource_type='image'
-                )
-                loggerP.info(
-                    f"Deleted image {image_public_id} "
-                    f"for Product {self.pk}: {destroy_result}"
-                )
-            except Exception as e:
-                loggerP.error(
-                    f"Failed to delete image {image_public_id} "
-                    f"for Product {self.pk}: {e}"
-                )
-        
+        if before:
+            apply_product_count_deltas(product_count_deltas([(before, 1)]))
+        invalidate_cache("product", [pk])
         return result
 
     class Meta:
         verbose_name = "Sản phẩm"
         verbose_name_plural = "Sản phẩm"
         ordering = ['-image']
+        indexes = [
+            ### ILIKE '%keyword%' / trigram search trên tên sản phẩm
+            GinIndex(OpClass(Upper("name"), name="gin_trgm_ops"), name="product_name_trgm_idx"),
+            GinIndex(PRODUCT_SEARCH_VECTOR, name="product_search_vector_idx"),
+            ### lọc / sắp xếp theo giá (ordering=price seek theo (min_price, id))
+            models.Index(fields=["min_price", "id"], name="product_min_price_idx"),
+            models.Index(fields=["max_price"], name="product_max_price_idx"),
+        ]
     
 
-class VariantType(models.Model):
+class VariantQuerySet(models.QuerySet):
+    """
+    Tên biến thể / loại biến thể nằm trong chi tiết sản phẩm (cache, ETag)
+    -> update / delete hàng loạt (admin) cũng cập nhật các sản phẩm đang dùng.
+    """
+
+    ### lookup từ ProductVariant tới queryset này
+    product_lookup = "variant__in"
+
+    def _product_ids(self):
+        variants = ProductVariant.objects.filter(**{self.product_lookup: self.order_by().values("pk")})
+        return set(variants.order_by().values_list("product_id", flat=True).distinct())
+
+    def update(self, **kwargs):
+        with transaction.atomic(using=self.db, savepoint=False):
+            product_ids = self._product_ids()
+            rows = super().update(**kwargs)
+            touch_products(product_ids)
+        return rows
+
+    def delete(self):
+        with transaction.atomic(using=self.db, savepoint=False):
+            product_ids = self._product_ids()
+            result = super().delete()
+            # Biến thể SP bị xoá theo (CASCADE) -> tính lại giá
+            refresh_prices(product_ids, variants=False)
+            touch_products(product_ids)
+        return result
+
+
+class VariantTypeQuerySet(VariantQuerySet):
+    product_lookup = "variant__v_type__in"
+
+
+class VariantRenameMixin:
+    """
+    save() / delete() của Variant, VariantType: cập nhật các sản phẩm đang dùng
+    """
+
+    @transaction.atomic(savepoint=False)
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if not adding:
+            touch_products(type(self).objects.filter(pk=self.pk)._product_ids())
+
+    @transaction.atomic(savepoint=False)
+    def delete(self, *args, **kwargs):
+        product_ids = type(self).objects.filter(pk=self.pk)._product_ids()
+        result = super().delete(*args, **kwargs)
+        refresh_prices(product_ids, variants=False)
+        touch_products(product_ids)
+        return result
+
+
+class VariantType(VariantRenameMixin, models.Model):
     name = models.CharField(max_length=255, unique=True,verbose_name="Tên loại biến thể")
 
+    objects = VariantTypeQuerySet.as_manager()
+
     ### loại variant ví dụ như màu sắc,kích thước,chất liệu
     def __str__(self):
         return self.name
@@ -235,10 +350,12 @@ class VariantType(models.Model):
         verbose_name_plural = "Loại biến thể"
         ordering = ['name']
 
-class Variant(models.Model):
+class Variant(VariantRenameMixin, models.Model):
     name = models.CharField(max_length=255,verbose_name="Tên biến thể")
     v_type = models.ForeignKey(VariantType, on_delete=models.CASCADE, related_name='variants',verbose_name="Loại biến thể")
 
+    objects = VariantQuerySet.as_manager()
+
     ### biến thể cụ thể như size S,M chất liệu cotton,...
     def __str__(self):
         return f"{self.name} - {self.v_type.name}"
@@ -248,137 +365,97 @@ class Variant(models.Model):
         verbose_name_plural = "Biến thể"
         ordering = ['name','v_type']
     
-class ProductVariant(models.Model):
+class ProductVariantQuerySet(ImageLifecycleQuerySet):
+    """
+    Giữ giá bán của sản phẩm đúng với các thao tác hàng loạt trên biến thể
+    (bulk_update của Django chạy qua update()). Sản phẩm cha được cập nhật
+    updated_at + invalidate cache qua refresh_prices / touch_products.
+    """
+
+    def _product_ids(self):
+        return set(self.order_by().values_list("product_id", flat=True).distinct())
+
+    def update(self, **kwargs):
+        if kwargs.keys() <= {"effective_price"}:
+            # refresh_prices tự cập nhật sản phẩm ngay sau đó
+            return super().update(**kwargs)
+        if not VARIANT_PRICE_FIELDS & kwargs.keys():
+            with transaction.atomic(using=self.db, savepoint=False):
+                product_ids = self._product_ids()
+                rows = super().update(**kwargs)
+                touch_products(product_ids)
+            return rows
+        with transaction.atomic(using=self.db, savepoint=False):
+            scoped = self.model.objects.filter(pk__in=list(self.values_list("pk", flat=True)))
+            product_ids = scoped._product_ids()
+            rows = super(ProductVariantQuerySet, scoped).update(**kwargs)
+            refresh_prices(product_ids | scoped._product_ids())
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            refresh_prices({obj.product_id for obj in objs})
+        return objs
+
+    def delete(self):
+        with transaction.atomic(using=self.db, savepoint=False):
+            product_ids = self._product_ids()
+            result = super().delete()
+            refresh_prices(product_ids, variants=False)
+        return result
+
+
+class ProductVariant(ImageLifecycleMixin, models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='productvariant_product',verbose_name="Sản phẩm")
     variant = models.ForeignKey(Variant, on_delete=models.CASCADE, related_name='productvariant_variant',verbose_name="Biến thể")
     price_diff = models.FloatField(blank=True,verbose_name="Giá thay đổi",default=0)### thay đổi giá so với giá gốc
     available = models.BooleanField(default=True,verbose_name="Còn hàng")### tình trạng còn hàng để order hay không
     image = CloudinaryField(blank=True, null=True,verbose_name="Hình ảnh")
+    effective_price = models.FloatField(default=0, editable=False, verbose_name="Giá bán")### origin_price + price_diff
 
-    class Meta:
-        unique_together = ('product', 'variant')
+    image_label = "Product Variant"
+    image_logger = loggerPV
+
+    objects = ProductVariantQuerySet.as_manager()
+
+    def touch_product(self):
+        """
+        Cập nhật updated_at của sản phẩm cha để ETag / Last-Modified
+        của chi tiết sản phẩm đổi theo biến thể
+        """
+        Product.objects.filter(pk=self.product_id).update(updated_at=timezone.now())
 
     def __str__(self):
-        return f"{self.product.name} - {self.variant.name} - {self.variant.v_type.name} - {"Còn hàng" if self.available else "Hết hàng"}"
+        return f"{self.product.name} - {self.variant.name} - {self.variant.v_type.name} - {'Còn hàng' if self.available else 'Hết hàng'}"
     
 
+    @transaction.atomic(savepoint=False)
     def save(self, *args, **kwargs):
-
-        old_image_public_id = None
-        
-        if self.pk:
-            try:
-                # Lấy instance gốc từ DB
-                original = ProductVariant.objects.select_for_update().get(pk=self.pk)
-                
-                # Lấy public_id của ảnh cũ (từ DB)
-                original_public_id = get_public_id(original.image)
-                
-                # Kiểm tra xem có thay đổi image field không
-                # Trường hợp 1: Xóa ảnh (self.image = None hoặc '')
-                if original.image and not self.image:
-                    old_image_public_id = original_public_id
-                    loggerP.info(
-                        f"Image removed for Product Variant {self.pk}. "
-                        f"Will delete: {old_image_public_id}"
-                    )
-                
-                # Trường hợp 2: Upload ảnh mới
-                elif is_new_upload(self.image):
-                    # Đây là file mới upload, chưa có public_id
-                    # Sau khi save, Django-Cloudinary sẽ tự động upload lên Cloudinary
-                    if original_public_id:
-                        old_image_public_id = original_public_id
-                        loggerP.info(
-                            f"New image uploaded for Product Variant {self.pk}. "
-                            f"Will delete old: {old_image_public_id}"
-                        )
-                
-                # Trường hợp 3: Thay đổi từ ảnh này sang ảnh khác (cả 2 đều đã có trên Cloudinary)
-                else:
-                    current_public_id = get_public_id(self.image)
-                    
-                    if original_public_id and current_public_id:
-                        if original_public_id != current_public_id:
-                            old_image_public_id = original_public_id
-                            loggerP.info(
-                                f"Image changed for Product Variant {self.pk}. "
-                                f"Old: {original_public_id}, New: {current_public_id}"
-                            )
-            
-            except ProductVariant.DoesNotExist:
-                loggerP.warning(f"Product Variant {self.pk} not found in database")
-        
-
+        origin_price = Product.objects.filter(pk=self.product_id).values_list("origin_price", flat=True).first()
+        self.effective_price = (origin_price or 0) + (self.price_diff or 0)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"price_diff", "product", "product_id"} & set(update_fields):
+            # effective_price phải được ghi cùng, refresh_prices đọc min/max từ cột này
+            kwargs["update_fields"] = {*update_fields, "effective_price"}
         super().save(*args, **kwargs)
+        refresh_prices([self.product_id], variants=False)
+        self.touch_product()
+        invalidate_cache("product", [self.product_id])
 
-        if old_image_public_id:
-            try:
-                result = cloudinary.uploader.destroy(
-                    old_image_public_id,
-                    invalidate=True,
-                    resource_type='image'
-                )
-                loggerP.info(
-                    f"Deleted old image {old_image_public_id} "
-                    f"for Product Variant {self.pk}: {result}"
-                )
-            except Exception as e:
-                # Chỉ log lỗi, không raise exception
-                loggerP.error(
-                    f"Failed to delete old image {old_image_public_id} "
-                    f"for Product Variant {self.pk}: {e}"
-                )
-        
-        # Log ảnh hiện tại
-        if self.image:
-            current_id = get_public_id(self.image)
-            if current_id:
-                loggerP.info(
-                    f"Current image for Product {self.pk}: "
-                    f"{current_id} - {self.image.url}"
-                )
-            else:
-                loggerP.info(
-                    f"New image uploaded for Product {self.pk}, "
-                    f"will have public_id after save"
-                )
-
+    @transaction.atomic(savepoint=False)
     def delete(self, *args, **kwargs):
-        """
-        Xóa sản phẩm và ảnh trên Cloudinary
-        """
-        image_public_id = get_public_id(self.image)
-        
-        if image_public_id:
-            loggerP.info(
-                f"Preparing to delete image for Product {self.pk}: {image_public_id}"
-            )
-        
-        # Xóa record trước
         result = super().delete(*args, **kwargs)
-        
-        # Sau đó xóa ảnh trên Cloudinary
-        if image_public_id:
-            try:
-                destroy_result = cloudinary.uploader.destroy(
-                    image_public_id,
-                    invalidate=True,
-                    resource_type='image'
-                )
-                loggerP.info(
-                    f"Deleted image {image_public_id} "
-                    f"for Product Variant {self.pk}: {destroy_result}"
-                )
-            except Exception as e:
-                loggerP.error(
-                    f"Failed to delete image {image_public_id} "
-                    f"for Product Variant {self.pk}: {e}"
-                )
-        
+        refresh_prices([self.product_id], variants=False)
+        self.touch_product()
+        invalidate_cache("product", [self.product_id])
         return result
 
     class Meta:
         verbose_name = "Biến thể SP"
         verbose_name_plural = "Biến thể SP"
-        ordering = ['-image','product']
\ No newline at end of file
+        ordering = ['-image','product']
+        unique_together = ('product', 'variant')
+        indexes = [
+            models.Index(fields=["effective_price"], name="productvariant_price_idx"),
+        ]
\ No newline at end of file
@@ -2,6 +2,7 @@ from rest_framework import serializers
 from django.db.models import Q
 
 from .models import *
+from utils.serialization import ValuesSerializer
 
 
 class ProductVariantSerializer(serializers.ModelSerializer):
@@ -24,14 +25,49 @@ class ProductSerializer(serializers.ModelSerializer):
 
 class ProductMenuSerializer(serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
     class Meta:
         model = Product
-        fields = ["id", "name", "slug", "image_url"]
+        fields = ["id", "name", "slug", "image_url", "image_srcset", "min_price", "max_price"]
 
     def get_image_url(self,obj):
         return obj.image.url if obj.image else None
 
+    def get_image_srcset(self,obj):
+        return obj.image_srcset()
+
+class ProductMenuValues(ValuesSerializer):
+    """
+    Đường nhanh của ProductMenuSerializer cho API danh sách (cùng output)
+    """
+    model = Product
+    fields = ("id", "name", "slug", "image_url", "image_srcset", "min_price", "max_price")
+    image_fields = {"image_url": "image"}
+    srcset_fields = {"image_srcset": "image"}
+
 class UpdateProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
-        fields = ["name", "code", "image", "slug", "description"]
\ No newline at end of file
+        fields = ["name", "code", "image", "slug", "description"]
+
+class ProductVariantImportSerializer(serializers.Serializer):
+    type = serializers.CharField(max_length=255)
+    name = serializers.CharField(max_length=255)
+    price_diff = serializers.FloatField(required=False)
+    available = serializers.BooleanField(required=False)
+    image = serializers.CharField(max_length=255, required=False, allow_blank=True, allow_null=True)
+
+class ProductImportSerializer(serializers.Serializer):
+    """
+    Validate 1 sản phẩm khi import (chỉ kiểm tra kiểu dữ liệu, không query DB).
+    category là mã danh mục, image là Cloudinary public_id / đường dẫn đã lưu.
+    """
+    code = serializers.CharField(max_length=100)
+    name = serializers.CharField(max_length=255)
+    slug = serializers.SlugField(max_length=255, required=False)
+    description = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    origin_price = serializers.FloatField(required=False)
+    available = serializers.BooleanField(required=False)
+    category = serializers.CharField(max_length=100, required=False, allow_blank=True, allow_null=True)
+    image = serializers.CharField(max_length=255, required=False, allow_blank=True, allow_null=True)
+    variants = ProductVariantImportSerializer(many=True, required=False)
@@ -1,3 +1,990 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import logging
+import os
+import tempfile
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import skipUnless
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from category.models import Category, reconcile_product_counts
+from utils import fastjson
+from utils.cache import cache_stats, catalog_cache
+from utils.logging import (
+    INDEX_ENTRY, IndexedFileHandler, JsonFormatter, QueueFileHandler, clear_logs, index_path,
+    iter_indexed_records, iter_lines_reverse, iter_segment_records, log_segments, segment_path,
+    view_logs_base,
+)
+from utils.pagination import encode_cursor
+from utils.throttling import get_backend
+from .exporter import export_queryset, iter_export_records
+from .importer import CatalogImporter, iter_csv, iter_ndjson
+from .models import Product, ProductVariant, Variant, VariantType
+from .serializers import ProductMenuSerializer, ProductMenuValues
+
+
+class ProductDetailViewTest(TestCase):
+    def setUp(self):
+        catalog_cache().clear()
+        self.category = Category.objects.create(name="Áo", slug="ao", code="AO")
+        self.size = VariantType.objects.create(name="Size")
+        self.color = VariantType.objects.create(name="Màu sắc")
+
+    def create_product(self, code, variant_count):
+        product = Product.objects.create(
+            name=f"Áo {code}", slug=f"ao-{code}", code=code, category=self.category
+        )
+        for i in range(variant_count):
+            v_type = self.size if i % 2 else self.color
+            variant = Variant.objects.create(name=f"{code}-{i}", v_type=v_type)
+            ProductVariant.objects.create(product=product, variant=variant, price_diff=i)
+        return product
+
+    def test_query_count_does_not_depend_on_variant_count(self):
+        for code, variant_count in (("A1", 1), ("A40", 40)):
+            product = self.create_product(code, variant_count)
+            url = reverse("products:detail product", args=[product.pk])
+            # validator (updated_at) + product/category + variants
+            with self.assertNumQueries(3):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            variants = response.data["variants"]
+            self.assertEqual(sum(len(items) for items in variants.values()), variant_count)
+            self.assertEqual(response.data["category"], "Áo")
+
+    def test_variants_grouped_by_type(self):
+        product = self.create_product("B4", 4)
+        response = self.client.get(reverse("products:detail product", args=[product.pk]))
+        self.assertEqual(set(response.data["variants"]), {"Size", "Màu sắc"})
+        for v_type, items in response.data["variants"].items():
+            self.assertTrue(all(item["type"] == v_type for item in items))
+
+
+class ProductDetailCacheTest(TestCase):
+    def setUp(self):
+        catalog_cache().clear()
+        self.product = Product.objects.create(name="Quần jean", slug="quan-jean", code="QJ")
+        self.url = reverse("products:detail product", args=[self.product.pk])
+
+    def test_second_request_is_served_from_cache(self):
+        self.client.get(self.url)
+        # chỉ còn query lấy validator (updated_at)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data["name"], "Quần jean")
+        self.assertEqual(cache_stats()["product"]["hits"], 1)
+        self.assertEqual(cache_stats()["product"]["misses"], 1)
+
+    def test_save_and_variant_changes_invalidate(self):
+        self.client.get(self.url)
+        self.product.name = "Quần kaki"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        self.assertEqual(self.client.get(self.url).data["name"], "Quần kaki")
+
+        variant = Variant.objects.create(name="M", v_type=VariantType.objects.create(name="Size"))
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductVariant.objects.create(product=self.product, variant=variant)
+        self.assertIn("Size", self.client.get(self.url).data["variants"])
+
+    def test_writes_in_other_processes_miss_the_cache(self):
+        etag = self.client.get(self.url).headers["ETag"]
+        # on_commit không chạy -> cache của process này không bị xoá (giống ghi ở worker / import khác)
+        Product.objects.filter(pk=self.product.pk).update(name="Quần kaki")
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response.data["name"]), (200, "Quần kaki"))
+
+        variant = Variant.objects.create(name="M", v_type=VariantType.objects.create(name="Size"))
+        ProductVariant.objects.bulk_create([ProductVariant(product=self.product, variant=variant, price_diff=50)])
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response.headers["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item["name"] for item in response.data["variants"]["Size"]], ["M"])
+        self.assertEqual(response.data["max_price"], self.product.origin_price + 50)
+
+        Product.objects.filter(pk=self.product.pk).delete()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_variant_and_type_renames_invalidate(self):
+        size = VariantType.objects.create(name="Size")
+        variant = Variant.objects.create(name="M", v_type=size)
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductVariant.objects.create(product=self.product, variant=variant, price_diff=10)
+        etag = self.client.get(self.url).headers["ETag"]
+
+        size.name = "Kích thước"
+        with self.captureOnCommitCallbacks(execute=True):
+            size.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item["name"] for item in response.data["variants"]["Kích thước"]], ["M"])
+
+        # update() hàng loạt (admin) cũng invalidate
+        with self.captureOnCommitCallbacks(execute=True):
+            Variant.objects.filter(pk=variant.pk).update(name="L")
+        self.assertEqual([item["name"] for item in self.client.get(self.url).data["variants"]["Kích thước"]], ["L"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            size.delete()
+        self.assertEqual(self.client.get(self.url).data["variants"], {})
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.max_price, self.product.origin_price)
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        catalog_cache().clear()
+        self.product = Product.objects.create(name="Giày", slug="giay", code="G1")
+        self.url = reverse("products:detail product", args=[self.product.pk])
+
+    def test_detail_returns_304_until_a_variant_changes(self):
+        etag = self.client.get(self.url).headers["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        variant = Variant.objects.create(name="42", v_type=VariantType.objects.create(name="Size"))
+        ProductVariant.objects.create(product=self.product, variant=variant)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_list_etag_depends_on_query_string(self):
+        url = reverse("products:list product")
+        etag = self.client.get(url, {"page": 1}).headers["ETag"]
+        self.assertEqual(self.client.get(url, {"page": 1}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(url, {"page": 2}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_list_stamp_is_cached_until_a_write(self):
+        url = reverse("products:list product")
+        etag = self.client.get(url).headers["ETag"]
+        # Version lấy từ cache, không aggregate cả bảng
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.product.name = "Giày da"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response.headers["ETag"]).status_code, 304)
+
+    def test_bulk_writes_change_the_list_etag(self):
+        url = reverse("products:list product")
+        other = Product.objects.create(name="Dép", slug="dep", code="D1")
+        writes = [
+            lambda: Product.objects.filter(pk=self.product.pk).update(name="Giày da"),
+            lambda: ProductVariant.objects.bulk_create([
+                ProductVariant(product=self.product, variant=Variant.objects.create(name="42", v_type=VariantType.objects.create(name="Size")))
+            ]),
+            lambda: ProductVariant.objects.filter(product=self.product).update(image="image/upload/v1/x.jpg"),
+            lambda: Product.objects.filter(pk=other.pk).delete(),
+        ]
+        for write in writes:
+            etag = self.client.get(url).headers["ETag"]
+            with self.captureOnCommitCallbacks(execute=True):
+                write()
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_list_stamp_follows_writes_of_other_processes(self):
+        url = reverse("products:list product")
+        with self.settings(CATALOG_CACHE={**settings.CATALOG_CACHE, "LIST_STAMP_TIMEOUT": 0}):
+            etag = self.client.get(url).headers["ETag"]
+            # on_commit không chạy -> cache của process này không bị xoá (giống ghi ở process khác)
+            Product.objects.filter(pk=self.product.pk).update(name="Giày da")
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_missing_detail_has_no_etag(self):
+        response = self.client.get(reverse("products:detail product", args=[self.product.pk + 1]))
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn("ETag", response.headers)
+        self.assertNotIn("Last-Modified", response.headers)
+
+
+class CatalogImportTest(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Áo", slug="ao", code="AO")
+
+    def ndjson(self, *rows):
+        return iter_ndjson(io.StringIO("\n".join(json.dumps(row, ensure_ascii=False) for row in rows)))
+
+    def test_import_creates_and_updates_in_batches(self):
+        rows = [
+            {"code": f"P{i}", "name": f"Áo {i}", "category": "AO", "variants": [{"type": "Size", "name": "M", "price_diff": i}]}
+            for i in range(30)
+        ]
+        importer = CatalogImporter(chunk_size=10)
+        self.assertEqual(list(importer.import_rows(self.ndjson(*rows))), [])
+        self.assertEqual(importer.stats["created"], 30)
+        self.assertEqual(Variant.objects.count(), 1)
+        self.assertEqual(ProductVariant.objects.filter(product__category=self.category).count(), 30)
+
+        rows[0]["origin_price"] = 150000
+        rows[1]["variants"][0]["price_diff"] = 5
+        importer = CatalogImporter(chunk_size=10)
+        self.assertEqual(list(importer.import_rows(self.ndjson(*rows))), [])
+        self.assertEqual((importer.stats["updated"], importer.stats["unchanged"]), (2, 28))
+        self.assertEqual(Product.objects.get(code="P0").origin_price, 150000)
+        self.assertEqual(ProductVariant.objects.get(product__code="P1").price_diff, 5)
+
+    def test_errors_are_reported_per_row(self):
+        Product.objects.create(name="Áo cũ", slug="ao-cu", code="OLD")
+        rows = self.ndjson(
+            {"code": "A", "name": "Áo A"},
+            {"code": "B", "name": "Áo cũ"},
+            {"code": "C", "name": "Áo C", "category": "KHONG"},
+            {"code": "A", "name": "Áo A2"},
+            {"code": "D", "name": "Áo D", "origin_price": "abc"},
+        )
+        errors = list(CatalogImporter().import_rows(rows))
+        self.assertEqual([(error["row"], list(error["errors"])) for error in errors], [
+            (2, ["name"]), (3, ["category"]), (4, ["code"]), (5, ["origin_price"]),
+        ])
+        self.assertTrue(Product.objects.filter(code="A", name="Áo A").exists())
+
+    def test_generated_slugs_do_not_collide(self):
+        Product.objects.create(name="Áo thun", slug="ao-thun", code="OLD")
+        rows = self.ndjson(
+            {"code": "A", "name": "Ao thun"},
+            {"code": "B", "name": "Áo Thun"},
+            {"code": "C", "name": "Áo thun 2", "slug": "ao-thun-2"},
+            {"code": "D", "name": "Áo sơ mi", "slug": "ao-thun"},
+        )
+        errors = list(CatalogImporter().import_rows(rows))
+        # Chỉ dòng có slug trùng trong file bị lỗi, slug tự sinh được thêm hậu tố
+        self.assertEqual([(error["row"], list(error["errors"])) for error in errors], [(4, ["slug"])])
+        self.assertEqual(
+            dict(Product.objects.filter(code__in=["A", "B", "C"]).values_list("code", "slug")),
+            {"A": "ao-thun-3", "B": "ao-thun-4", "C": "ao-thun-2"},
+        )
+
+    def test_csv_rows_are_grouped_by_code(self):
+        csv_file = io.StringIO(
+            "code,name,category,variant_type,variant_name,price_diff\n"
+            "Q1,Quần 1,AO,Size,S,0\n"
+            "Q1,Quần 1,AO,Size,M,10000\n"
+            "Q2,Quần 2,,,,\n"
+        )
+        importer = CatalogImporter()
+        self.assertEqual(list(importer.import_rows(iter_csv(csv_file))), [])
+        self.assertEqual(importer.stats["created"], 2)
+        self.assertEqual(ProductVariant.objects.filter(product__code="Q1").count(), 2)
+        self.assertIsNone(Product.objects.get(code="Q2").category)
+
+    def test_import_endpoint_requires_superuser(self):
+        url = reverse("products:import product")
+        upload = SimpleUploadedFile("catalog.ndjson", '{"code": "E1", "name": "Áo E1"}\n'.encode("utf-8"))
+        self.assertEqual(self.client.post(url, {"file": upload}).status_code, 403)
+
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "pass"))
+        upload.seek(0)
+        response = self.client.post(url, {"file": upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["created"], 1)
+
+
+class CatalogExportTest(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Áo", slug="ao", code="AO")
+        size = VariantType.objects.create(name="Size")
+        for i in range(12):
+            product = Product.objects.create(name=f"Áo {i}", slug=f"ao-{i}", code=f"A{i}", category=category)
+            for name in ("S", "M"):
+                variant, _ = Variant.objects.get_or_create(name=name, v_type=size)
+                ProductVariant.objects.create(product=product, variant=variant, price_diff=i)
+
+    def test_queries_per_chunk_do_not_depend_on_variant_count(self):
+        # 1 server-side cursor sản phẩm + danh mục, mỗi chunk thêm 1 query biến thể
+        with self.assertNumQueries(1 + 3):
+            records = list(iter_export_records(export_queryset(), chunk_size=5))
+        self.assertEqual([record["code"] for record in records], [f"A{i}" for i in range(12)])
+        self.assertEqual(records[3]["category"], "AO")
+        self.assertEqual([v["name"] for v in records[3]["variants"]], ["S", "M"])
+
+    def test_export_can_be_imported_back(self):
+        response = self.client.get(reverse("products:export product"))
+        body = b"".join(response.streaming_content).decode("utf-8")
+        self.assertEqual(len(body.splitlines()), 12)
+
+        importer = CatalogImporter()
+        self.assertEqual(list(importer.import_rows(iter_ndjson(io.StringIO(body)))), [])
+        self.assertEqual(importer.stats["unchanged"], 12)
+
+    def test_csv_export_has_one_row_per_variant(self):
+        response = self.client.get(reverse("products:export product"), {"format": "csv"})
+        body = b"".join(response.streaming_content).decode("utf-8")
+        self.assertEqual(len(body.splitlines()), 1 + 24)
+
+        importer = CatalogImporter()
+        self.assertEqual(list(importer.import_rows(iter_csv(io.StringIO(body)))), [])
+        self.assertEqual(importer.stats["unchanged"], 12)
+
+
+class CursorPaginationTest(TestCase):
+    def setUp(self):
+        catalog_cache().clear()
+        for i, price in enumerate([30, 10, 50, 20, 40]):
+            Product.objects.create(name=f"Nón {i}", slug=f"non-{i}", code=f"N{i}", origin_price=price)
+        self.url = reverse("products:list product")
+
+    def get(self, **params):
+        response = self.client.get(self.url, {"pagination": "cursor", "limit": 2, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data
+
+    def cursor(self, link):
+        return parse_qs(urlsplit(link).query)["cursor"][0]
+
+    def test_next_and_previous_round_trip(self):
+        pages = [self.get()]
+        while pages[-1]["next"]:
+            pages.append(self.get(cursor=self.cursor(pages[-1]["next"])))
+        names = [[row["name"] for row in page["results"]] for page in pages]
+        self.assertEqual(names, [["Nón 0", "Nón 1"], ["Nón 2", "Nón 3"], ["Nón 4"]])
+        self.assertIsNone(pages[0]["previous"])
+        self.assertIsNone(pages[-1]["next"])
+
+        # Quay lại từ trang cuối bằng previous
+        previous = self.get(cursor=self.cursor(pages[-1]["previous"]))
+        self.assertEqual([row["name"] for row in previous["results"]], ["Nón 2", "Nón 3"])
+        first = self.get(cursor=self.cursor(previous["previous"]))
+        self.assertEqual([row["name"] for row in first["results"]], ["Nón 0", "Nón 1"])
+        self.assertIsNone(first["previous"])
+
+    def test_cursor_follows_price_ordering(self):
+        page = self.get(ordering="price")
+        page = self.get(ordering="price", cursor=self.cursor(page["next"]))
+        self.assertEqual([row["min_price"] for row in page["results"]], [30, 40])
+
+    def test_invalid_or_mismatched_cursor_is_rejected(self):
+        name_cursor = self.cursor(self.get()["next"])
+        tokens = [
+            "!!!",
+            encode_cursor(["a", "x"], ordering=("name", "id")),
+            encode_cursor([{"a": 1}, 1], ordering=("name", "id")),
+            encode_cursor([None, None], ordering=("name", "id")),
+            encode_cursor(["Nón 1"], ordering=("name", "id")),
+            encode_cursor(["Nón 1", 2]),
+        ]
+        for token in tokens:
+            response = self.client.get(self.url, {"cursor": token})
+            self.assertEqual(response.status_code, 400, token)
+        # cursor của ordering=name dùng cho ordering=price
+        self.assertEqual(self.client.get(self.url, {"cursor": name_cursor, "ordering": "price"}).status_code, 400)
+
+
+class ListLimitTest(TestCase):
+    def setUp(self):
+        catalog_cache().clear()
+        for i in range(3):
+            Product.objects.create(name=f"Mũ {i}", slug=f"mu-{i}", code=f"M{i}")
+        self.url = reverse("products:list product")
+
+    @override_settings(CATALOG_PAGINATION={"DEFAULT_LIMIT": 10, "MAX_LIMIT": 2})
+    def test_limit_is_capped(self):
+        response = self.client.get(self.url, {"limit": 1000000})
+        self.assertEqual(response.data["page_size"], 2)
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_include_total_false_skips_count(self):
+        with self.assertNumQueries(2):  # validator (cache trống) + 1 trang (limit + 1 dòng)
+            response = self.client.get(self.url, {"limit": 2, "include_total": "false"})
+        self.assertIsNone(response.data["total_items"])
+        self.assertTrue(response.data["has_next"])
+        self.assertEqual(len(response.data["results"]), 2)
+
+    @override_settings(CATALOG_PAGINATION={"DEFAULT_LIMIT": 10, "MAX_LIMIT": 100, "ESTIMATE_EXACT_BELOW": 0})
+    def test_estimated_count_is_flagged(self):
+        response = self.client.get(self.url, {"limit": 1, "count_strategy": "estimate"})
+        self.assertFalse(response.data["total_exact"])
+        self.assertGreaterEqual(response.data["total_items"], 2)
+
+    def test_cached_count(self):
+        catalog_cache().clear()
+        params = {"limit": 1, "count_strategy": "cached"}
+        self.assertTrue(self.client.get(self.url, params).data["total_exact"])
+        with self.assertNumQueries(1):  # validator và count lấy từ cache
+            response = self.client.get(self.url, params)
+        self.assertEqual((response.data["total_items"], response.data["total_exact"]), (3, False))
+        self.assertEqual(self.client.get(self.url, {"count_strategy": "x"}).status_code, 400)
+
+    def test_invalid_page_and_limit_are_rejected(self):
+        for params in ({"limit": 0}, {"limit": -5}, {"page": 0}, {"page": "x"}):
+            self.assertEqual(self.client.get(self.url, params).status_code, 400)
+
+
+class KeywordSearchTest(TestCase):
+    def setUp(self):
+        catalog_cache().clear()
+        get_backend().reset()
+        Product.objects.create(name="Áo len đỏ", slug="ao-len-do", code="AL1")
+        Product.objects.create(name="Khăn len", slug="khan-len", code="KL1")
+        Product.objects.create(name="Bao tay", slug="bao-tay", code="BT1", description="Cổ tay phối len")
+        Product.objects.create(name="Mũ lưỡi trai", slug="mu-luoi-trai", code="MLT")
+        self.url = reverse("products:list product")
+
+    def search(self, keyword, **params):
+        response = self.client.get(self.url, {"keyword": keyword, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [row["name"] for row in response.data["results"]]
+
+    def test_contains_matches_name_ignoring_case(self):
+        self.assertEqual(set(self.search("LEN", search_mode="contains")), {"Áo len đỏ", "Khăn len"})
+        # contains là chế độ mặc định
+        self.assertEqual(set(self.search("len")), {"Áo len đỏ", "Khăn len"})
+        self.assertEqual(self.search("bao"), ["Bao tay"])
+
+    def test_fulltext_matches_code_and_description_ranked_by_weight(self):
+        names = self.search("len", search_mode="fulltext")
+        # name (weight A) xếp trên description (weight B) dù "Bao tay" đứng trước theo tên
+        self.assertEqual(set(names[:2]), {"Áo len đỏ", "Khăn len"})
+        self.assertEqual(names[2:], ["Bao tay"])
+        self.assertEqual(self.search("mlt", search_mode="fulltext"), ["Mũ lưỡi trai"])
+        self.assertCountEqual(self.search("len -khăn", search_mode="fulltext"), ["Áo len đỏ", "Bao tay"])
+
+    def test_trigram_tolerates_typos_ranked_by_similarity(self):
+        names = self.search("khăn lem", search_mode="trigram")
+        self.assertEqual(names[0], "Khăn len")
+        self.assertNotIn("Mũ lưỡi trai", names)
+        # gõ thiếu dấu vẫn tìm được
+        self.assertEqual(self.search("mu luoi trai", search_mode="trigram"), ["Mũ lưỡi trai"])
+        self.assertEqual(self.search("len đỏ", search_mode="trigram"), ["Áo len đỏ", "Khăn len"])
+
+    def test_invalid_search_mode_is_rejected(self):
+        response = self.client.get(self.url, {"keyword": "len", "search_mode": "regex"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {"error": "search_mode must be one of: contains, fulltext, trigram."})
+
+
+@override_settings(CATALOG_THROTTLE={
+    "BACKEND": "utils.throttling.LocalTokenBucketBackend",
+    "OPTIONS": {"max_keys": 100},
+    "DEEP_PAGE_OFFSET": 1000,
+    "RATES": {"search": "2/min", "export": "1/hour"},
+})
+class ThrottleTest(TestCase):
+    def setUp(self):
+        get_backend().reset()
+
+    def test_search_is_throttled_with_retry_after(self):
+        url = reverse("products:list product")
+        for _ in range(2):
+            self.assertEqual(self.client.get(url, {"keyword": "áo"}).status_code, 200)
+        response = self.client.get(url, {"keyword": "áo"})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["Retry-After"], "30")
+        # Không có proxy -> X-Forwarded-For giả không đổi được bucket
+        self.assertEqual(self.client.get(url, {"keyword": "áo"}, HTTP_X_FORWARDED_FOR="10.9.9.9").status_code, 429)
+        # request không tốn kém không bị giới hạn
+        self.assertEqual(self.client.get(url).status_code, 200)
+        # client khác có bucket riêng
+        self.assertEqual(self.client.get(url, {"keyword": "áo"}, REMOTE_ADDR="10.0.0.2").status_code, 200)
+
+    def test_export_is_throttled(self):
+        url = reverse("products:export product")
+        self.assertEqual(self.client.get(url).status_code, 200)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["Retry-After"], "3600")
+
+
+class CategoryProductCountTest(TestCase):
+    def setUp(self):
+        self.ao = Category.objects.create(name="Áo", slug="ao", code="AO")
+        self.quan = Category.objects.create(name="Quần", slug="quan", code="QUAN")
+
+    def counts(self, category):
+        category.refresh_from_db()
+        return category.product_count, category.available_product_count
+
+    def test_save_and_delete_keep_counts(self):
+        product = Product.objects.create(name="Áo 1", slug="ao-1", code="A1", category=self.ao)
+        Product.objects.create(name="Áo 2", slug="ao-2", code="A2", category=self.ao, available=False)
+        self.assertEqual(self.counts(self.ao), (2, 1))
+
+        product.category = self.quan
+        product.save()
+        self.assertEqual((self.counts(self.ao), self.counts(self.quan)), ((1, 0), (1, 1)))
+
+        product.available = False
+        product.save()
+        self.assertEqual(self.counts(self.quan), (1, 0))
+        product.delete()
+        self.assertEqual(self.counts(self.quan), (0, 0))
+
+    def test_save_without_counter_change_does_not_touch_category(self):
+        product = Product.objects.create(name="Áo 1", slug="ao-1", code="A1", category=self.ao)
+        product = Product.objects.get(pk=product.pk)
+        product.description = "cotton"
+        with self.assertNumQueries(1):
+            product.save()
+
+    def test_bulk_paths_keep_counts(self):
+        Product.objects.bulk_create([
+            Product(name=f"Áo {i}", slug=f"ao-{i}", code=f"A{i}", category=self.ao) for i in range(4)
+        ])
+        self.assertEqual(self.counts(self.ao), (4, 4))
+
+        Product.objects.filter(code__in=["A0", "A1"]).update(available=False)
+        self.assertEqual(self.counts(self.ao), (4, 2))
+
+        products = list(Product.objects.filter(code__in=["A2", "A3"]))
+        for product in products:
+            product.category = self.quan
+        Product.objects.bulk_update(products, ["category"])
+        self.assertEqual((self.counts(self.ao), self.counts(self.quan)), ((2, 0), (2, 2)))
+
+        Product.objects.filter(category=self.quan).delete()
+        self.assertEqual(self.counts(self.quan), (0, 0))
+
+    def test_category_save_keeps_counts(self):
+        # Instance load trước khi có sản phẩm: bộ đếm trên instance đã cũ
+        category = Category.objects.get(pk=self.ao.pk)
+        Product.objects.create(name="Áo 1", slug="ao-1", code="A1", category=self.ao)
+        category.description = "Áo nam"
+        category.save()
+        self.assertEqual(self.counts(self.ao), (1, 1))
+        self.assertEqual(Category.objects.get(pk=self.ao.pk).description, "Áo nam")
+
+    def test_reconcile_repairs_drift(self):
+        Product.objects.create(name="Áo 1", slug="ao-1", code="A1", category=self.ao)
+        Category.objects.filter(pk=self.ao.pk).update(product_count=7)
+        self.assertEqual([c.pk for c in reconcile_product_counts()], [self.ao.pk])
+        self.assertEqual(self.counts(self.ao), (1, 1))
+        self.assertEqual(reconcile_product_counts(), [])
+
+    def test_category_list_exposes_counts(self):
+        Product.objects.create(name="Áo 1", slug="ao-1", code="A1", category=self.ao)
+        response = self.client.get(reverse("categories:list category"), {"keyword": "Áo"})
+        self.assertEqual(response.data["results"][0]["product_count"], 1)
+
+
+class VariantFacetTest(TestCase):
+    def setUp(self):
+        catalog_cache().clear()
+        size = VariantType.objects.create(name="Size")
+        color = VariantType.objects.create(name="Màu")
+        self.s, self.m = (Variant.objects.create(name=name, v_type=size) for name in ("S", "M"))
+        self.red, self.blue = (Variant.objects.create(name=name, v_type=color) for name in ("Đỏ", "Xanh"))
+        for code, variants in (("P1", [self.s, self.red]), ("P2", [self.m, self.red]), ("P3", [self.m, self.blue])):
+            product = Product.objects.create(name=f"Áo {code}", slug=code.lower(), code=code)
+            for variant in variants:
+                ProductVariant.objects.create(product=product, variant=variant)
+        self.list_url = reverse("products:list product")
+        self.facet_url = reverse("products:product facets")
+
+    def names(self, variants):
+        return [p["name"] for p in self.client.get(self.list_url, {"variant": variants}).data["results"]]
+
+    def test_or_within_type_and_across_types(self):
+        self.assertEqual(self.names([self.s.pk, self.m.pk]), ["Áo P1", "Áo P2", "Áo P3"])
+        self.assertEqual(self.names([self.m.pk, self.red.pk]), ["Áo P2"])
+        self.assertEqual(self.client.get(self.list_url, {"variant": "x"}).status_code, 400)
+
+    def counts(self, variants):
+        facets = self.client.get(self.facet_url, {"variant": variants}).data["facets"]
+        return {v["name"]: v["count"] for facet in facets for v in facet["variants"]}
+
+    def test_facet_counts_ignore_own_type(self):
+        with self.assertNumQueries(3):  # validator + variant đã chọn + 1 aggregate
+            counts = self.counts([self.red.pk])
+        # Size tính theo màu đỏ, màu tính theo toàn bộ (không bị lọc bởi chính nó)
+        self.assertEqual(counts, {"S": 1, "M": 1, "Đỏ": 2, "Xanh": 1})
+        self.assertEqual(self.counts([self.red.pk, self.m.pk]), {"S": 1, "M": 1, "Đỏ": 1, "Xanh": 1})
+
+    def test_facets_are_cached_per_filter(self):
+        self.counts([self.red.pk])
+        with self.assertNumQueries(1):  # variant đã chọn, validator và facet lấy từ cache
+            self.assertEqual(self.counts([self.red.pk])["Đỏ"], 2)
+
+
+class EffectivePriceTest(TestCase):
+    def setUp(self):
+        size = VariantType.objects.create(name="Size")
+        self.variants = [Variant.objects.create(name=f"S{i}", v_type=size) for i in range(30)]
+        self.product = Product.objects.create(name="Áo gió", slug="ao-gio", code="AG", origin_price=100)
+
+    def prices(self, product):
+        return Product.objects.values_list("min_price", "max_price").get(pk=product.pk)
+
+    def test_variant_writes_update_prices(self):
+        self.assertEqual(self.prices(self.product), (100, 100))
+        pv = ProductVariant.objects.create(product=self.product, variant=self.variants[0], price_diff=-20)
+        ProductVariant.objects.create(product=self.product, variant=self.variants[1], price_diff=50)
+        self.assertEqual(self.prices(self.product), (80, 150))
+        ProductVariant.objects.filter(pk=pv.pk).update(available=False)
+        self.assertEqual(self.prices(self.product), (150, 150))
+        ProductVariant.objects.filter(product=self.product).delete()
+        self.assertEqual(self.prices(self.product), (100, 100))
+
+    def test_save_with_update_fields_writes_effective_price(self):
+        variant = ProductVariant.objects.create(product=self.product, variant=self.variants[0], price_diff=10)
+        variant.price_diff = 50
+        variant.save(update_fields=["price_diff"])
+        self.assertEqual(ProductVariant.objects.get(pk=variant.pk).effective_price, self.product.origin_price + 50)
+        self.assertEqual(self.prices(self.product)[1], self.product.origin_price + 50)
+
+    def test_origin_price_change_with_many_variants(self):
+        ProductVariant.objects.bulk_create([
+            ProductVariant(product=self.product, variant=variant, price_diff=i) for i, variant in enumerate(self.variants)
+        ])
+        product = Product.objects.get(pk=self.product.pk)
+        product.origin_price = 200
+        with self.assertNumQueries(4):  # save + 2 UPDATE giá + đọc lại min/max
+            product.save()
+        self.assertEqual((product.min_price, product.max_price), (200, 229))
+        self.assertEqual(
+            sorted(ProductVariant.objects.values_list("effective_price", flat=True))[-1], 229
+        )
+        Product.objects.filter(pk=product.pk).update(origin_price=10)
+        self.assertEqual(self.prices(product), (10, 39))
+
+        # Instance cũ không ghi đè giá đã được tính lại
+        product.name = "Áo gió mới"
+        product.save()
+        self.assertEqual(self.prices(product), (10, 39))
+
+    def test_price_filter_and_ordering(self):
+        Product.objects.create(name="Áo rẻ", slug="ao-re", code="AR", origin_price=50)
+        Product.objects.create(name="Áo đắt", slug="ao-dat", code="AD", origin_price=500)
+        url = reverse("products:list product")
+        names = lambda params: [p["name"] for p in self.client.get(url, params).data["results"]]
+        self.assertEqual(names({"ordering": "price"}), ["Áo rẻ", "Áo gió", "Áo đắt"])
+        self.assertEqual(names({"ordering": "-price", "min_price": 60}), ["Áo đắt", "Áo gió"])
+        self.assertEqual(names({"ordering": "price", "max_price": 100, "limit": 1, "pagination": "cursor"}), ["Áo rẻ"])
+        self.assertEqual(self.client.get(url, {"ordering": "x"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"min_price": "x"}).status_code, 400)
+
+
+class ValuesSerializerTest(TestCase):
+    def setUp(self):
+        images = ["image/upload/v1712/products/ao.jpg", "products/khong-version", "image/upload/v3/ảnh lỗi.png", None]
+        for i, image in enumerate(images):
+            Product.objects.create(name=f"Áo {i}", slug=f"ao-{i}", code=f"A{i}", origin_price=i, image=image)
+
+    def test_values_path_matches_drf_serializer(self):
+        queryset = Product.objects.order_by("name", "id")
+        expected = [dict(row) for row in ProductMenuSerializer(queryset, many=True).data]
+        with self.assertNumQueries(1):
+            self.assertEqual(ProductMenuValues.rows(ProductMenuValues.queryset(queryset)), expected)
+        self.assertEqual(expected[0]["image_url"], "http://res.cloudinary.com/demo/image/upload/v1712/products/ao.jpg")
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+        call_command("benchmark_list_serializers", rows=10, repeat=1, stdout=out)
+        self.assertIn("products (4 rows)", out.getvalue())
+
+
+class FastJsonTest(TestCase):
+    payload = {
+        "name": "Áo dài lụa",
+        "price": Decimal("199000.50"),
+        "updated_at": datetime(2026, 1, 2, 3, 4, 5, 678, tzinfo=dt_timezone.utc),
+        "day": date(2026, 1, 2),
+        "tags": {"mới"},
+        1: None,
+    }
+
+    def test_backends_produce_the_same_json(self):
+        expected = '{"name":"Áo dài lụa","price":"199000.50","updated_at":"2026-01-02T03:04:05.000Z","day":"2026-01-02","tags":["mới"],"1":null}'
+        for backend in ("orjson", "stdlib"):
+            with self.settings(JSON_BACKEND=backend):
+                self.assertEqual(fastjson.dumps(self.payload).decode("utf-8"), expected)
+                self.assertEqual(fastjson.loads(expected)["name"], "Áo dài lụa")
+
+    def test_backends_agree_on_datetimes(self):
+        values = [
+            datetime(2026, 1, 2, 3, 4, 5, tzinfo=dt_timezone.utc),
+            datetime(2026, 1, 2, 3, 4, 5, 123456, tzinfo=dt_timezone(timedelta(hours=7))),
+            datetime(2026, 1, 2, 3, 4, 5, 999999),
+            time(3, 4, 5, 120000),
+            time(3, 4),
+        ]
+        outputs = {}
+        for backend in ("orjson", "stdlib"):
+            with self.settings(JSON_BACKEND=backend):
+                outputs[backend] = fastjson.dumps(values).decode("utf-8")
+        self.assertEqual(outputs["orjson"], outputs["stdlib"])
+        self.assertEqual(json.loads(outputs["stdlib"]), [
+            "2026-01-02T03:04:05Z", "2026-01-02T03:04:05.123+07:00", "2026-01-02T03:04:05.999",
+            "03:04:05.120", "03:04:00",
+        ])
+
+    def test_api_renders_and_parses_with_fast_renderer(self):
+        product = Product.objects.create(name="Nón lá", slug="non-la", code="NL")
+        response = self.client.get(reverse("products:detail product", args=[product.pk]))
+        self.assertIn("Nón lá".encode("utf-8"), response.content)
+        self.assertEqual(json.loads(response.content)["updated_at"][-1], "Z")
+        response = self.client.post(
+            reverse("products:list product"), data=b'{"name": "', content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+LOG_START = datetime(2026, 3, 1, 8, 0, 0)
+
+
+def log_line(minute, level, message):
+    return json.dumps({
+        "timestamp": (LOG_START + timedelta(minutes=minute)).isoformat(),
+        "level": level, "logger": "Product", "message": message,
+    }) + "\n"
+
+
+class LogViewerTest(TestCase):
+    """
+    Product.jsonl.1.gz: m0..m2 (cũ hơn), Product.jsonl: m3, m4
+    """
+
+    def setUp(self):
+        self.base_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.base_dir.cleanup)
+        os.mkdir(os.path.join(self.base_dir.name, "logs"))
+        self.log_path = os.path.join(self.base_dir.name, "logs", "Product.jsonl")
+        levels = ["INFO", "ERROR", "INFO", "ERROR", "INFO"]
+        lines = [log_line(i, level, f"m{i}") for i, level in enumerate(levels)]
+        with gzip.open(self.log_path + ".1.gz", "wt", encoding="utf-8") as f:
+            f.writelines(lines[:3])
+        with open(self.log_path, "w", encoding="utf-8") as f:
+            f.writelines(lines[3:])
+        self.admin = User(username="admin", is_superuser=True)
+
+    def view(self, **params):
+        request = RequestFactory().get("/logs", params)
+        request.user = self.admin
+        with self.settings(BASE_DIR=self.base_dir.name):
+            response = view_logs_base(request, "Product.jsonl")
+        data = json.loads(b"".join(response.streaming_content))
+        return [log["message"] for log in data["logs"]], data["next_before"]
+
+    def test_reverse_reader_across_blocks(self):
+        content = b"a\nbb\n\nccc\nd"
+        f = io.BytesIO(content)
+        # block nhỏ hơn dòng -> dòng bị cắt giữa 2 block vẫn được ghép lại đúng
+        self.assertEqual(list(iter_lines_reverse(f, len(content), block_size=2)), [(10, b"d"), (6, b"ccc"), (2, b"bb"), (0, b"a")])
+        self.assertEqual(list(iter_lines_reverse(f, 6, block_size=4)), [(2, b"bb"), (0, b"a")])
+
+    def test_paging_across_rotated_segment(self):
+        pages, cursor = [], None
+        while True:
+            messages, cursor = self.view(limit=2, **({"before": cursor} if cursor else {}))
+            pages.append(messages)
+            if cursor is None:
+                break
+        self.assertEqual(pages, [["m4", "m3"], ["m2", "m1"], ["m0"]])
+        self.assertEqual(self.view(limit=1, before="1:")[0], ["m2"])
+
+    def test_level_filter(self):
+        self.assertEqual(self.view(level="error"), (["m3", "m1"], None))
+        # m3 ở đầu file hiện tại -> cursor trỏ sang cuối segment 1
+        self.assertEqual(self.view(level="ERROR", limit=1), (["m3"], "1:"))
+
+    def test_since_and_until_filters(self):
+        since = (LOG_START + timedelta(minutes=1)).isoformat()
+        until = (LOG_START + timedelta(minutes=3)).isoformat()
+        self.assertEqual(self.view(since=since)[0], ["m4", "m3", "m2", "m1"])
+        self.assertEqual(self.view(until=until)[0], ["m3", "m2", "m1", "m0"])
+        self.assertEqual(self.view(since=since, until=until, level="INFO")[0], ["m2"])
+
+    def test_invalid_params(self):
+        request = RequestFactory().get("/logs", {"before": "x:1"})
+        request.user = self.admin
+        with self.settings(BASE_DIR=self.base_dir.name):
+            self.assertEqual(view_logs_base(request, "Product.jsonl").status_code, 400)
+            request = RequestFactory().get("/logs", {"since": "hôm qua"})
+            request.user = self.admin
+            self.assertEqual(view_logs_base(request, "Product.jsonl").status_code, 400)
+
+
+class LogIndexTest(TestCase):
+    def setUp(self):
+        self.base_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.base_dir.cleanup)
+        os.mkdir(os.path.join(self.base_dir.name, "logs"))
+        self.log_path = os.path.join(self.base_dir.name, "logs", "Product.jsonl")
+
+    def handler(self):
+        handler = IndexedFileHandler(self.log_path)
+        handler.setFormatter(JsonFormatter())
+        self.addCleanup(handler.close)
+        return handler
+
+    def emit(self, handler, seconds, message, level=logging.INFO):
+        record = logging.LogRecord("Product", level, __file__, 0, message, None, None)
+        record.created = (LOG_START + timedelta(seconds=seconds)).timestamp()
+        handler.handle(record)
+
+    def messages(self, **filters):
+        return [json.loads(line)["message"] for _, line in iter_indexed_records(self.log_path, **filters)]
+
+    def test_index_entries_point_at_records(self):
+        handler = self.handler()
+        for i in range(3):
+            self.emit(handler, i, f"m{i}", logging.ERROR if i == 1 else logging.INFO)
+        with open(index_path(self.log_path), "rb") as idx, open(self.log_path, "rb") as log:
+            entries = list(INDEX_ENTRY.iter_unpack(idx.read()))
+            self.assertEqual([entry[1] for entry in entries], [logging.INFO, logging.ERROR, logging.INFO])
+            for i, (timestamp, _, offset, length) in enumerate(entries):
+                self.assertEqual(timestamp, int((LOG_START + timedelta(seconds=i)).timestamp()))
+                log.seek(offset)
+                self.assertEqual(json.loads(log.read(length))["message"], f"m{i}")
+        self.assertEqual(self.messages(level="ERROR"), ["m1"])
+
+    def test_since_until_lookup_through_index(self):
+        handler = self.handler()
+        # "late" ghi sau nhưng timestamp sớm hơn (process khác) -> vẫn trong INDEX_TIME_SLACK
+        for seconds, message in [(0, "a"), (10, "b"), (20, "c"), (17, "late"), (30, "d"), (40, "e")]:
+            self.emit(handler, seconds, message)
+        since, until = LOG_START + timedelta(seconds=15), LOG_START + timedelta(seconds=25)
+        self.assertEqual(self.messages(since=since, until=until), ["late", "c"])
+        self.assertEqual(self.messages(since=LOG_START + timedelta(seconds=30)), ["e", "d"])
+        self.assertEqual(self.messages(until=LOG_START + timedelta(seconds=5)), ["a"])
+
+    def test_legacy_file_is_indexed_and_rebuilt_after_clear(self):
+        # File log cũ chưa có index
+        with open(self.log_path, "w", encoding="utf-8") as f:
+            f.writelines([log_line(0, "INFO", "old-0"), log_line(1, "ERROR", "old-1")])
+        self.assertEqual(self.messages(level="ERROR"), ["old-1"])
+        self.assertEqual(os.path.getsize(index_path(self.log_path)), 2 * INDEX_ENTRY.size)
+
+        handler = self.handler()
+        request = RequestFactory().post("/logs/del")
+        request.user = User(username="admin", is_superuser=True)
+        with self.settings(BASE_DIR=self.base_dir.name):
+            self.assertEqual(clear_logs(request, "Product.jsonl").status_code, 200)
+        self.assertEqual(os.path.getsize(index_path(self.log_path)), 0)
+
+        # Handler đang mở index (append) tiếp tục ghi từ đầu file đã truncate
+        self.emit(handler, 120, "new", logging.ERROR)
+        self.assertEqual(self.messages(level="ERROR"), ["new"])
+        self.assertEqual(self.messages(since=LOG_START), ["new"])
+        self.assertEqual(os.path.getsize(index_path(self.log_path)), INDEX_ENTRY.size)
+
+        # Log bị truncate ngoài clear_logs (index trỏ quá cuối file) -> rebuild
+        handler.close()
+        with open(self.log_path, "w", encoding="utf-8") as f:
+            f.write(log_line(0, "ERROR", "x"))
+        self.assertEqual(self.messages(level="ERROR"), ["x"])
+
+
+class LogRotationTest(TestCase):
+    def setUp(self):
+        self.base_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.base_dir.cleanup)
+        self.log_path = os.path.join(self.base_dir.name, "Product.jsonl")
+
+    def handler(self, **kwargs):
+        handler = QueueFileHandler(self.log_path, **kwargs)
+        handler.setFormatter(JsonFormatter())
+        self.addCleanup(handler.close)
+        return handler
+
+    def log(self, handler, count, level=logging.INFO):
+        for i in range(count):
+            handler.handle(logging.LogRecord("Product", level, __file__, 0, "record %d", (i,), None))
+
+    def messages(self, **filters):
+        return [json.loads(line)["message"] for _, _, line in iter_segment_records(self.log_path, **filters)]
+
+    def test_rotates_to_gz_segments_up_to_backup_count(self):
+        handler = self.handler(maxBytes=1000, backupCount=2)
+        self.log(handler, 100)
+        handler.stop_listener()
+
+        self.assertEqual(log_segments(self.log_path), [self.log_path, segment_path(self.log_path, 1), segment_path(self.log_path, 2)])
+        self.assertFalse(os.path.exists(segment_path(self.log_path, 3)))
+        for number in (1, 2):
+            with gzip.open(segment_path(self.log_path, number), "rb") as f:
+                self.assertLessEqual(len(f.read()), 1000)
+            self.assertTrue(os.path.exists(index_path(segment_path(self.log_path, number))))
+
+        # Đọc từ mới nhất qua các segment .gz: các bản ghi cuối, liên tục
+        messages = self.messages()
+        self.assertEqual(messages, [f"record {i}" for i in range(99, 99 - len(messages), -1)])
+        self.assertEqual(self.messages(level="INFO"), messages)
+
+    def indexed_handler(self, **kwargs):
+        handler = IndexedFileHandler(self.log_path, delay=True, **kwargs)
+        handler.setFormatter(JsonFormatter())
+        self.addCleanup(handler.close)
+        return handler
+
+    def assert_all_records_once(self, expected):
+        messages = self.messages()
+        self.assertCountEqual(messages, expected)
+        # Index của mọi segment trỏ đúng bản ghi
+        self.assertCountEqual(self.messages(level="INFO"), expected)
+        for path in log_segments(self.log_path)[1:]:
+            with gzip.open(path, "rb") as f:
+                self.assertLessEqual(len(f.read()), 1000)
+
+    def test_handlers_sharing_a_file_rotate_once(self):
+        # 2 handler trên cùng file = 2 worker gunicorn
+        workers = [self.indexed_handler(maxBytes=1000, backupCount=20) for _ in range(2)]
+        expected = []
+        for i in range(60):
+            message = f"w{i % 2}-{i}"
+            workers[i % 2].handle(logging.LogRecord("Product", logging.INFO, __file__, 0, message, None, None))
+            expected.append(message)
+        self.assertGreater(len(log_segments(self.log_path)), 3)
+        self.assert_all_records_once(expected)
+
+    @skipUnless(hasattr(os, "fork"), "os.fork is not available")
+    def test_processes_sharing_a_file_lose_no_records(self):
+        pids = []
+        for worker in range(3):
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    handler = IndexedFileHandler(self.log_path, delay=True, maxBytes=1000, backupCount=50)
+                    handler.setFormatter(JsonFormatter())
+                    for i in range(40):
+                        handler.handle(logging.LogRecord("Product", logging.INFO, __file__, 0, f"p{worker}-{i}", None, None))
+                    handler.close()
+                finally:
+                    os._exit(0)
+            pids.append(pid)
+        for pid in pids:
+            os.waitpid(pid, 0)
+        self.assert_all_records_once([f"p{worker}-{i}" for worker in range(3) for i in range(40)])
+
+    def test_no_rotation_without_backup_count(self):
+        handler = self.handler(maxBytes=1000)
+        self.log(handler, 50)
+        handler.stop_listener()
+        self.assertEqual(log_segments(self.log_path), [self.log_path])
+        self.assertEqual(len(self.messages()), 50)
+
+    def test_listener_start_stop(self):
+        handler = self.handler()
+        self.assertTrue(handler.listener._thread.is_alive())
+        self.log(handler, 3)
+        # stop xả hết queue trước khi dừng thread
+        handler.stop_listener()
+        self.assertIsNone(handler.listener._thread)
+        self.assertEqual(self.messages(), ["record 2", "record 1", "record 0"])
+        handler.stop_listener()
+        handler.close()
+
+    @skipUnless(hasattr(os, "fork"), "os.fork is not available")
+    def test_listener_restarts_after_fork(self):
+        handler = self.handler()
+        pid = os.fork()
+        if pid == 0:
+            # Process con: thread listener của process cha không đi theo fork
+            try:
+                handler.handle(logging.LogRecord("Product", logging.INFO, __file__, 0, "child", None, None))
+                handler.stop_listener()
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        self.assertTrue(handler.listener._thread.is_alive())
+        handler.handle(logging.LogRecord("Product", logging.INFO, __file__, 0, "parent", None, None))
+        handler.stop_listener()
+        self.assertEqual(sorted(self.messages()), ["child", "parent"])
@@ -6,7 +6,10 @@ app_name = "products"
 
 urlpatterns = [
     path("products", AllProduct.as_view(), name="list product"),
+    path("products/facets", ProductFacetView.as_view(), name="product facets"),
     path("products/<int:pk>", ProductDetailView.as_view(), name="detail product"),
+    path("products/import", ProductImportView.as_view(), name="import product"),
+    path("products/export", export_products, name="export product"),
 
 
     ### log
@@ -7,61 +7,150 @@ from django.utils.decorators import method_decorator
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from rest_framework.parsers import MultiPartParser, FormParser
-from django.http import Http404
+from django.http import Http404, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+import io
 
 
 from product.models import *
-from django.db.models import Q
+from category.models import subtree_path
+from django.db.models import Q, Max, Count
 from .serializers import *
+from utils.pagination import CursorPaginator, InvalidCursor, page_params, paginate_page, wants_cursor
+from utils.counting import count_params
+from utils.throttling import CatalogThrottle, throttle_scope
+from utils.search import DEFAULT_SEARCH_MODE, apply_keyword_search
+from utils.cache import get_or_build, list_stamp
+from utils.conditional import catalog_condition, request_stamp
+from images.normalize import ImageRejected
+from .importer import CatalogImporter, ImportFormatError, guess_format, iter_rows
+from .facets import apply_variant_filter, cached_facet_counts, parse_variant_filter
+from .exporter import EXPORT_CONTENT_TYPES, EXPORT_FORMATS, export_queryset, iter_export_lines, iter_export_records, parse_updated_since
+
+
+def product_table_stamp():
+    stamp = Product.objects.aggregate(last_modified=Max("updated_at"), total=Count("id"))
+    return f"{stamp['total']}:{stamp['last_modified']}", stamp["last_modified"]
+
+
+def product_list_stamp(request):
+    """
+    Version của danh sách giữ trong cache, đổi mỗi lần ghi (utils.cache.invalidate),
+    cache trống -> updated_at mới nhất + số sản phẩm (bắt được cả xoá).
+    Kèm query string để mỗi trang / bộ lọc có ETag riêng.
+    """
+    version, last_modified = list_stamp("product", product_table_stamp)
+    return f"products:{request.get_full_path()}:{version}", last_modified
+
+
+def product_detail_stamp(request, pk):
+    """
+    updated_at của sản phẩm (variant thay đổi cũng cập nhật updated_at của sản phẩm)
+    và của danh mục (chi tiết có hiển thị tên danh mục).
+    """
+    row = Product.objects.filter(pk=pk).values_list("updated_at", "category__updated_at").first()
+    if row is None:
+        return None
+    updated_at, category_updated_at = row
+    last_modified = max(updated_at, category_updated_at) if category_updated_at else updated_at
+    return f"product:{pk}:{updated_at}:{category_updated_at}", last_modified
+
+
+### ordering -> các cột sắp xếp (kết thúc bằng id để seek cursor ổn định)
+PRODUCT_ORDERINGS = {
+    "name": ("name", "id"),
+    "price": ("min_price", "id"),
+    "-price": ("-min_price", "-id"),
+}
+
+
+def filter_products(params):
+    """
+    Bộ lọc dùng chung cho danh sách sản phẩm và facet:
+    keyword (+ search_mode), category (gồm cả danh mục con),
+    min_price / max_price (khoảng giá bán của sản phẩm giao với khoảng lọc).
+    Trả về (queryset chưa lọc biến thể, biến thể đã chọn theo loại).
+    Raise ValueError nếu tham số không hợp lệ.
+    """
+    keyword = params.get("keyword", None)
+    search_mode = params.get("search_mode", DEFAULT_SEARCH_MODE)
+    category = params.get("category", None)
+
+    products = Product.objects.all().order_by('name')
+    # Lọc theo keyword nếu có
+    if keyword:
+        products = apply_keyword_search(products, keyword, search_mode, ("name",), PRODUCT_SEARCH_VECTOR)
+    if category:
+        # Gồm cả sản phẩm của các danh mục con: path LIKE '/1/5/%' (dùng index)
+        try:
+            path = subtree_path(int(category))
+        except ValueError:
+            raise ValueError("Category must be an integer.")
+        products = products.filter(category__path__startswith=path) if path else products.none()
+    try:
+        min_price = float(params["min_price"]) if params.get("min_price") else None
+        max_price = float(params["max_price"]) if params.get("max_price") else None
+    except ValueError:
+        raise ValueError("min_price and max_price must be numbers.")
+    if min_price is not None:
+        products = products.filter(max_price__gte=min_price)
+    if max_price is not None:
+        products = products.filter(min_price__lte=max_price)
+    return products, parse_variant_filter(params)
 
 
 class AllProduct(APIView):
     """
     API để xử lý danh sách sản phẩm (GET) và tạo sản phẩm (POST).
+    Lọc theo biến thể: ?variant=<id>&variant=<id> (AND giữa các loại, OR trong cùng loại)
+    Sắp xếp: ?ordering=name | price | -price (theo giá bán thấp nhất)
     """
 
+    throttle_classes = [CatalogThrottle]
+
 
+    @method_decorator(catalog_condition(product_list_stamp))
     def get(self, request):
         try:
-            page = request.query_params.get("page", 1)
-            limit = request.query_params.get("limit", 10)
-            keyword = request.query_params.get("keyword", None)
-            category = request.query_params.get("category",None)
             try:
-                page = int(page)
-                limit = int(limit)
-            except ValueError:
+                page, limit = page_params(request.query_params)
+                products, groups = filter_products(request.query_params)
+            except ValueError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            products = apply_variant_filter(products, groups)
+            ordering = request.query_params.get("ordering")
+            if ordering and ordering not in PRODUCT_ORDERINGS:
                 return Response(
-                    {"error": "Page and limit must be integers."},
+                    {"error": f"ordering must be one of: {', '.join(PRODUCT_ORDERINGS)}."},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
+            if ordering:
+                products = products.order_by(*PRODUCT_ORDERINGS[ordering])
 
-            products = Product.objects.all().order_by('name')
-            # Lọc theo keyword nếu có
-            if keyword:
-                products = products.filter(name__icontains=keyword)
-            if category:
-                products = products.filter(category_id=category)
+            # Chỉ đọc các cột của menu (dict, không tạo model instance)
+            products = ProductMenuValues.queryset(products)
 
+            # Phân trang cursor (opt-in): seek theo cột của ordering (mặc định (name, id)), không OFFSET / count()
+            # (search_mode xếp theo độ liên quan chỉ áp dụng cho phân trang page/limit)
+            if wants_cursor(request):
+                try:
+                    page_data = CursorPaginator(PRODUCT_ORDERINGS[ordering or "name"], limit).paginate(
+                        request, products, request.query_params.get("cursor")
+                    )
+                except InvalidCursor as e:
+                    return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+                page_data["results"] = ProductMenuValues.rows(page_data["results"])
+                return Response(page_data, status=status.HTTP_200_OK)
 
-            # Tính toán phân trang
-            total_items = products.count()
-            total_pages = ceil(total_items / limit)
-            start = (page - 1) * limit
-            end = start + limit
-            paginated_Product = products[start:end]
-
-            serializer = ProductMenuSerializer(paginated_Product,many=True)   
-            return Response(
-                {
-                    "total_items": total_items,
-                    "total_pages": total_pages,
-                    "current_page": page,
-                    "page_size": limit,
-                    "results": serializer.data,
-                },
-                status=status.HTTP_200_OK,
-            )
+            # Phân trang page/limit, total_items theo count_strategy
+            # (include_total=false -> bỏ qua count, chỉ trả has_next)
+            try:
+                include_total, count_strategy = count_params(request.query_params)
+            except ValueError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            page_data = paginate_page(products, page, limit, include_total, count_strategy)
+            page_data["results"] = ProductMenuValues.rows(page_data["results"])
+            return Response(page_data, status=status.HTTP_200_OK)
         except Exception as e:
             return Response(
                 {"error": f"An unexpected error occurred: {str(e)}"},
@@ -83,12 +172,82 @@ class AllProduct(APIView):
                 serializer.save()
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        except ImageRejected as e:
+            return Response(e.message_dict, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response(
                 {"error": f"An unexpected error occurred: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
+
+class ProductFacetView(APIView):
+    """
+    Số sản phẩm theo từng biến thể (size, màu, ...) để dựng bộ lọc,
+    nhận cùng bộ lọc với danh sách sản phẩm (keyword, category, variant).
+    """
+
+    throttle_classes = [CatalogThrottle]
+
+    @method_decorator(catalog_condition(product_list_stamp))
+    def get(self, request):
+        try:
+            try:
+                products, groups = filter_products(request.query_params)
+            except ValueError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            return Response({"facets": cached_facet_counts(products, groups)}, status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response(
+                {"error": f"An unexpected error occurred: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+def product_detail_data(pk):
+    """
+    Dữ liệu chi tiết sản phẩm (dùng cho cache). None nếu sản phẩm hết hàng.
+    """
+    # 2 query cố định: product + category, rồi toàn bộ variant + variant type
+    product = get_object_or_404(Product.objects.select_related("category"), pk=pk)
+    if not product or product.available == False:
+        return None
+    pvs = ProductVariant.objects.filter(product=product).select_related("variant__v_type")
+    # Gom nhóm theo tên loại biến thể trong 1 vòng lặp
+    data_variants = {}
+    for pv in pvs:
+        data_variants.setdefault(pv.variant.v_type.name, []).append(
+            {
+                "id": pv.variant.id,
+                "name": pv.variant.name,
+                "type": pv.variant.v_type.name,
+                "price_diff": pv.price_diff,
+                "price": pv.effective_price,
+                "available": pv.available,
+                "image": pv.image.url if pv.image else None,
+                "image_srcset": pv.image_srcset(),
+            }
+        )
+
+    return {
+        "id": product.id,
+        "name": product.name,
+        "slug": product.slug,
+        "description": product.description,
+        "code": product.code,
+        "origin_price": product.origin_price,
+        "min_price": product.min_price,
+        "max_price": product.max_price,
+        "category": product.category.name if product.category else None,
+        "available": product.available,
+        "image": product.image.url if product.image else None,
+        "image_srcset": product.image_srcset(),
+        "created_at": product.created_at,
+        "updated_at": product.updated_at,
+        "variants": data_variants
+    }
+
+
 class ProductDetailView(APIView):
     """
     API để xử lý chi tiết, cập nhật và xóa sản phẩm.
@@ -98,57 +257,31 @@ class ProductDetailView(APIView):
     parser_classes = [MultiPartParser, FormParser]
 
 
+    @method_decorator(catalog_condition(product_detail_stamp))
     def get(self, request, pk):
-        product = get_object_or_404(Product,pk=pk)
-        if not product or product.available == False:
+        stamp = request_stamp(request)
+        # Không có stamp -> không có bản ghi
+        data_return = stamp and get_or_build("product", pk, lambda: product_detail_data(pk), version=stamp[0])
+        if data_return is None:
             return Response(
                 {"error": "Product not found."},
                 status=status.HTTP_404_NOT_FOUND,
             )
-        pvs = ProductVariant.objects.filter(product=product)
-        data_variants = {key: [] for key in pvs.values_list('variant__v_type__name',flat=True).distinct()}
-        for pv in pvs:
-            if pv.variant.v_type.name in data_variants.keys():
-                data_variants[pv.variant.v_type.name].append(
-                {
-                    "id": pv.variant.id,
-                    "name": pv.variant.name,
-                    "type": pv.variant.v_type.name,
-                    "price_diff": pv.price_diff,
-                    "available": pv.available,
-                    "image": pv.image.url if pv.image else None
-                }
-            )
-
-        data_return = {
-            "id": product.id,
-            "name": product.name,
-            "slug": product.slug,
-            "description": product.description,
-            "code": product.code,
-            "origin_price": product.origin_price,
-            "category": product.category.name if product.category else None,
-            "available": product.available,
-            "image": product.image.url if product.image else None,
-            "created_at": product.created_at,
-            "updated_at": product.updated_at,
-            "variants": data_variants
-        }
-        
-        
         return Response(data_return, status=status.HTTP_200_OK)
 
     def put(self, request, pk):
         try:
-            Product = get_object_or_404(Product, pk=pk)
+            product = get_object_or_404(Product, pk=pk)
             serializer = UpdateProductSerializer(
-                Product, data=request.data, partial=True
+                product, data=request.data, partial=True
             )
             if serializer.is_valid():
                 serializer.save()
                 return Response(serializer.data, status=status.HTTP_200_OK)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+        except ImageRejected as e:
+            return Response(e.message_dict, status=status.HTTP_400_BAD_REQUEST)
         except Http404:
             return Response(
                 {"error": "Product not found."},
@@ -176,3 +309,76 @@ class ProductDetailView(APIView):
             )
 
 
+class ProductImportView(APIView):
+    """
+    API import sản phẩm hàng loạt từ file NDJSON / CSV (upload field "file").
+    File lớn (hàng trăm nghìn dòng) nên dùng `manage.py import_catalog`.
+    """
+
+    parser_classes = [MultiPartParser, FormParser]
+    MAX_REPORTED_ERRORS = 1000
+
+    def post(self, request):
+
+        ### check if super user
+        if not request.user.is_superuser:
+            return HttpResponseForbidden(content="You do not have permission to import products")
+
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response({"error": "file is required."}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = request.data.get("format") or guess_format(upload.name)
+
+        try:
+            # Đọc file dạng stream (không load cả file vào bộ nhớ)
+            stream = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+            importer = CatalogImporter()
+            errors = []
+            error_count = 0
+            for error in importer.import_rows(iter_rows(stream, file_format)):
+                error_count += 1
+                if error_count <= self.MAX_REPORTED_ERRORS:
+                    errors.append(error)
+            return Response(
+                {
+                    **importer.stats,
+                    "errors": errors,
+                    "errors_truncated": error_count > self.MAX_REPORTED_ERRORS,
+                },
+                status=status.HTTP_200_OK,
+            )
+        except (ImportFormatError, UnicodeDecodeError) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response(
+                {"error": f"An unexpected error occurred: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+@require_GET
+@throttle_scope("export")
+def export_products(request):
+    """
+    Xuất toàn bộ catalog (sản phẩm + danh mục + biến thể) dạng stream,
+    cùng định dạng với products/import.
+    Query params:
+    - format: ndjson (mặc định) | csv
+    - updated_since: chỉ xuất sản phẩm cập nhật từ thời điểm này (ISO 8601)
+    - category: id danh mục (gồm cả danh mục con)
+    """
+    file_format = request.GET.get("format", "ndjson")
+    if file_format not in EXPORT_FORMATS:
+        return JsonResponse({"error": f"format must be one of: {', '.join(EXPORT_FORMATS)}."}, status=400)
+    try:
+        updated_since = parse_updated_since(request.GET.get("updated_since"))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    category = request.GET.get("category")
+    if category and not category.isdigit():
+        return JsonResponse({"error": "Category must be an integer."}, status=400)
+
+    records = iter_export_records(export_queryset(updated_since, category))
+    response = StreamingHttpResponse(iter_export_lines(file_format, records), content_type=EXPORT_CONTENT_TYPES[file_format])
+    response["Content-Disposition"] = f'attachment; filename="catalog.{file_format}"'
+    return response
@@ -0,0 +1,102 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import JsonResponse, HttpResponseForbidden
+
+CACHE_KINDS = ("product", "category")
+
+
+def catalog_cache():
+    return caches[settings.CATALOG_CACHE.get("ALIAS", "default")]
+
+
+def detail_key(kind, pk):
+    return f"catalog:{kind}:{pk}"
+
+
+def list_version_key(kind):
+    return f"catalog:list:{kind}"
+
+
+def _stats_key(kind, outcome):
+    return f"catalog:stats:{kind}:{outcome}"
+
+
+def _count(cache, kind, outcome):
+    key = _stats_key(kind, outcome)
+    # add() không ghi đè nếu key đã có -> incr luôn tồn tại key
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def get_or_build(kind, pk, builder, version=None):
+    """
+    Read-through cache cho response chi tiết.
+    builder() trả về dict dữ liệu, hoặc None nếu không được cache
+    (vd: sản phẩm hết hàng / danh mục không active -> view tự trả 404).
+    Dữ liệu được lưu kèm version (validator của ETag, tính từ DB): version khác
+    -> miss, kể cả khi bản ghi bị sửa ở process khác không xoá được cache này.
+    """
+    cache = catalog_cache()
+    key = detail_key(kind, pk)
+    cached = cache.get(key)
+    if cached is not None and cached[0] == version:
+        _count(cache, kind, "hits")
+        return cached[1]
+
+    _count(cache, kind, "misses")
+    data = builder()
+    if data is not None:
+        cache.set(key, (version, data), timeout=settings.CATALOG_CACHE.get("TIMEOUT", 300))
+    return data
+
+
+def invalidate(kind, pks):
+    """
+    Xoá cache chi tiết của các object và version của danh sách sau khi transaction
+    commit (nếu không có transaction thì xoá ngay).
+    """
+    keys = [detail_key(kind, pk) for pk in pks if pk is not None]
+    transaction.on_commit(lambda: catalog_cache().delete_many(keys + [list_version_key(kind)]))
+
+
+def list_stamp(kind, builder):
+    """
+    (version, last_modified) của danh sách kind. builder() tính từ DB (aggregate cả bảng),
+    kết quả cache LIST_STAMP_TIMEOUT giây: process ghi xoá ngay qua invalidate(),
+    process khác (worker gunicorn, import_catalog) thấy thay đổi khi hết hạn.
+    """
+    cache = catalog_cache()
+    key = list_version_key(kind)
+    stamp = cache.get(key)
+    if stamp is None:
+        stamp = builder()
+        cache.set(key, stamp, timeout=settings.CATALOG_CACHE.get("LIST_STAMP_TIMEOUT", 5))
+    return stamp
+
+
+def cache_stats():
+    cache = catalog_cache()
+    stats = {}
+    for kind in CACHE_KINDS:
+        hits = cache.get(_stats_key(kind, "hits"), 0)
+        misses = cache.get(_stats_key(kind, "misses"), 0)
+        total = hits + misses
+        stats[kind] = {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / total, 4) if total else None,
+        }
+    return stats
+
+
+def view_cache_stats(request):
+
+    ### check if super user
+    if not request.user.is_superuser:
+        return HttpResponseForbidden(content="You do not have permission to view this")
+
+    return JsonResponse({"stats": cache_stats()})
@@ -0,0 +1,53 @@
+import hashlib
+from functools import wraps
+
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+
+def request_stamp(request):
+    """
+    (version, last_modified) catalog_condition đã tính cho request này, None nếu không có object
+    """
+    return getattr(request, "_catalog_stamp", None)
+
+
+def catalog_condition(stamp_func):
+    """
+    Conditional GET (ETag / Last-Modified / 304) cho các API catalog.
+
+    stamp_func(request, *args, **kwargs) trả về (version, last_modified)
+    từ một query rẻ (updated_at / aggregate), hoặc None nếu không có object
+    -> view chạy bình thường (vd: trả 404). Nếu client gửi If-None-Match /
+    If-Modified-Since khớp thì trả 304 mà không build body.
+    """
+
+    def _stamp(request, *args, **kwargs):
+        # etag_func và last_modified_func dùng chung 1 lần query
+        if not hasattr(request, "_catalog_stamp"):
+            request._catalog_stamp = stamp_func(request, *args, **kwargs)
+        return request._catalog_stamp
+
+    def etag_func(request, *args, **kwargs):
+        stamp = _stamp(request, *args, **kwargs)
+        if stamp is None:
+            return None
+        return hashlib.md5(stamp[0].encode("utf-8")).hexdigest()
+
+    def last_modified_func(request, *args, **kwargs):
+        stamp = _stamp(request, *args, **kwargs)
+        return stamp[1] if stamp else None
+
+    def decorator(func):
+        conditional = condition(etag_func=etag_func, last_modified_func=last_modified_func)(func)
+
+        @wraps(func)
+        def inner(request, *args, **kwargs):
+            response = conditional(request, *args, **kwargs)
+            # Buộc client revalidate thay vì tự cache theo heuristic Last-Modified
+            patch_cache_control(response, no_cache=True)
+            return response
+
+        return inner
+
+    return decorator
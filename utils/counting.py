@@ -0,0 +1,95 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.db import connections
+
+from utils.cache import catalog_cache
+
+COUNT_STRATEGIES = ("exact", "estimate", "cached")
+FALSE_VALUES = ("false", "0", "no")
+
+
+def count_params(params):
+    """
+    Đọc include_total / count_strategy từ query params.
+    Raise ValueError nếu count_strategy không hợp lệ.
+    """
+    include_total = params.get("include_total", "true").lower() not in FALSE_VALUES
+    strategy = params.get("count_strategy") or settings.CATALOG_PAGINATION.get("COUNT_STRATEGY", "exact")
+    if strategy not in COUNT_STRATEGIES:
+        raise ValueError(f"count_strategy must be one of: {', '.join(COUNT_STRATEGIES)}.")
+    return include_total, strategy
+
+
+def _table_estimate(queryset):
+    """
+    Số dòng ước lượng của cả bảng từ thống kê của Postgres (pg_class.reltuples).
+    None nếu bảng chưa được ANALYZE.
+    """
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+            [queryset.model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+def _plan_estimate(queryset):
+    """
+    Số dòng planner dự đoán cho query (EXPLAIN, không chạy query)
+    """
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def estimate_count(queryset):
+    """
+    Ước lượng số dòng: không lọc -> reltuples, có lọc -> EXPLAIN.
+    Ước lượng nhỏ hơn ESTIMATE_EXACT_BELOW thì count() thật (rẻ và chính xác).
+    Trả về (count, exact)
+    """
+    estimate = None
+    if not queryset.query.where:
+        estimate = _table_estimate(queryset)
+    if estimate is None:
+        estimate = _plan_estimate(queryset)
+    if estimate < settings.CATALOG_PAGINATION.get("ESTIMATE_EXACT_BELOW", 10000):
+        return queryset.count(), True
+    return estimate, False
+
+
+def cached_count(queryset):
+    """
+    count() cache ngắn hạn theo câu SQL (mỗi bộ lọc một key).
+    Trả về (count, exact) - exact=False khi lấy từ cache (có thể đã cũ).
+    """
+    sql, params = queryset.order_by().query.sql_with_params()
+    digest = hashlib.md5(f"{sql}:{params!r}".encode("utf-8")).hexdigest()
+    key = f"catalog:count:{queryset.model._meta.label_lower}:{digest}"
+    cache = catalog_cache()
+    total = cache.get(key)
+    if total is not None:
+        return total, False
+    total = queryset.count()
+    cache.set(key, total, timeout=settings.CATALOG_PAGINATION.get("COUNT_CACHE_TIMEOUT", 60))
+    return total, True
+
+
+def count_rows(queryset, strategy="exact"):
+    """
+    Tổng số dòng theo strategy: exact | estimate | cached. Trả về (count, exact)
+    """
+    if strategy == "estimate":
+        return estimate_count(queryset)
+    if strategy == "cached":
+        return cached_count(queryset)
+    return queryset.count(), True
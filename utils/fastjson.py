@@ -0,0 +1,111 @@
+import datetime
+import decimal
+import json
+import uuid
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.functional import Promise
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson là tuỳ chọn
+    orjson = None
+
+
+
+def _datetime(obj):
+    """
+    datetime / date / time -> chuỗi theo ECMA-262 (giống DjangoJSONEncoder): cắt còn
+    mili giây, UTC ghi "Z". Cả 2 backend đều đi qua đây để output giống hệt nhau.
+    """
+    if isinstance(obj, datetime.datetime):
+        value = obj.isoformat()
+        if obj.microsecond:
+            value = value[:23] + value[26:]
+        return value[:-6] + "Z" if value.endswith("+00:00") else value
+    if isinstance(obj, datetime.date):
+        return obj.isoformat()
+    if obj.tzinfo is not None and obj.utcoffset() is not None:
+        raise ValueError("JSON can't represent timezone-aware times.")
+    value = obj.isoformat()
+    return value[:12] if obj.microsecond else value
+
+
+def _default(obj):
+    """
+    Kiểu không phải JSON gốc (giống DjangoJSONEncoder):
+    Decimal -> chuỗi (không mất độ chính xác), lazy string -> str, set / generator -> list
+    """
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return _datetime(obj)
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if isinstance(obj, Promise):
+        return str(obj)
+    if isinstance(obj, datetime.timedelta):
+        return obj.total_seconds()
+    if isinstance(obj, bytes):
+        return obj.decode("utf-8")
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    if hasattr(obj, "__iter__"):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _stdlib_default(obj):
+    # orjson tự xử lý UUID, stdlib thì không
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    return _default(obj)
+
+
+def backend():
+    """
+    settings.JSON_BACKEND: "orjson" (mặc định) | "stdlib".
+    Chưa cài orjson -> luôn dùng json của stdlib.
+    """
+    name = getattr(settings, "JSON_BACKEND", "orjson")
+    return "orjson" if name == "orjson" and orjson is not None else "stdlib"
+
+
+def dumps(data):
+    """
+    Object -> JSON bytes UTF-8, giữ nguyên tiếng Việt (ensure_ascii=False),
+    không có khoảng trắng thừa. datetime cắt còn mili giây, UTC ghi dạng "...Z".
+    """
+    if backend() == "orjson":
+        try:
+            # datetime đi qua _default (orjson tự ghi micro giây)
+            return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+        except orjson.JSONEncodeError:
+            # vd: số nguyên vượt 64 bit -> để stdlib xử lý
+            pass
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=_stdlib_default).encode("utf-8")
+
+
+def dumps_str(data):
+    return dumps(data).decode("utf-8")
+
+
+def loads(data):
+    """
+    JSON (bytes / str) -> object. Raise ValueError nếu không hợp lệ
+    (orjson.JSONDecodeError là lớp con của ValueError).
+    """
+    if backend() == "orjson":
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJsonResponse(HttpResponse):
+    """
+    Thay cho JsonResponse của Django (chỉ nhận dict, trừ khi safe=False)
+    """
+
+    def __init__(self, data, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError("In order to allow non-dict objects to be serialized set the safe parameter to False.")
+        kwargs.setdefault("content_type", "application/json")
+        super().__init__(content=dumps(data), **kwargs)
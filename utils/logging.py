@@ -1,12 +1,42 @@
-import json
+import atexit
+import contextlib
+import copy
+import gzip
 import logging
+import logging.handlers
+import queue
+import shutil
+import struct
+import tempfile
+import time
+import weakref
 from datetime import datetime
 
 ##import for view_logs_base
 import os
-from django.http import JsonResponse, Http404,HttpResponseForbidden
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: không khoá được giữa các process
+    fcntl = None
+from django.http import Http404,HttpResponseForbidden, StreamingHttpResponse
 from django.conf import settings
 
+from utils.fastjson import FastJsonResponse, dumps, dumps_str, loads
+
+TAIL_BLOCK_SIZE = 64 * 1024
+DEFAULT_TAIL_LIMIT = 100
+MAX_TAIL_LIMIT = 1000
+### segment .gz giải nén lớn hơn mức này được ghi ra file tạm thay vì giữ trong bộ nhớ
+SEGMENT_SPOOL_SIZE = 1024 * 1024
+
+### sidecar index <log>.idx: mỗi bản ghi log = 1 entry cố định
+### (timestamp giây, levelno, byte offset, độ dài) -> tìm nhị phân theo thời gian
+INDEX_ENTRY = struct.Struct("<IBQI")
+INDEX_READ_ENTRIES = 4096
+### các process ghi song song nên timestamp trong index chỉ gần tăng dần
+INDEX_TIME_SLACK = 5
+
 class JsonFormatter(logging.Formatter):
     def format(self, record):
         log_object = {
@@ -15,9 +45,502 @@ class JsonFormatter(logging.Formatter):
             "logger": record.name,
             "message": record.getMessage(),
         }
-        return json.dumps(log_object, ensure_ascii=False)
+        return dumps_str(log_object)
+
+def index_path(log_path):
+    return log_path + ".idx"
+
+def segment_path(log_path, number):
+    """
+    Segment 0 là file đang ghi, 1..n là các file đã xoay vòng (nén gzip), 1 là mới nhất
+    """
+    return log_path if number == 0 else f"{log_path}.{number}.gz"
+
+def log_segments(log_path):
+    """
+    Danh sách segment của 1 file log, mới nhất trước
+    """
+    segments = [log_path]
+    while os.path.exists(segment_path(log_path, len(segments))):
+        segments.append(segment_path(log_path, len(segments)))
+    return segments
+
+def _open_segment(path):
+    """
+    Mở segment để đọc nhị phân có seek. Segment .gz được giải nén dạng stream
+    (gzip.open) sang file tạm: giữ trong bộ nhớ tới SEGMENT_SPOOL_SIZE, lớn hơn thì
+    ghi ra đĩa. Seek ngược trực tiếp trên gzip phải giải nén lại từ đầu file.
+    """
+    if path.endswith(".gz"):
+        spool = tempfile.SpooledTemporaryFile(max_size=SEGMENT_SPOOL_SIZE)
+        with gzip.open(path, "rb") as g:
+            shutil.copyfileobj(g, spool, TAIL_BLOCK_SIZE)
+        spool.seek(0)
+        return spool
+    return open(path, "rb")
+
+class IndexedFileHandler(logging.FileHandler):
+    """
+    FileHandler ghi thêm 1 entry vào sidecar index (<file>.idx) cho mỗi
+    bản ghi để view_logs_base lọc level / since / until mà không quét file log.
+    Ghi ở chế độ append nhị phân nên offset đúng kể cả khi nhiều worker
+    cùng ghi một file.
+
+    Xoay vòng khi file vượt maxBytes hoặc sau interval giây (0 = tắt):
+    file hiện tại được nén thành <file>.1.gz (index đi kèm <file>.1.gz.idx),
+    giữ tối đa backupCount segment. Nhiều process (worker gunicorn) cùng ghi
+    một file: ghi dưới khoá chia sẻ, xoay vòng dưới khoá độc quyền (flock trên
+    <file>.lock), trước mỗi lần ghi so inode như WatchedFileHandler -> process
+    khác đã xoay vòng thì mở lại file mới thay vì ghi vào file cũ.
+    """
+
+    def __init__(self, filename, mode="a", encoding="utf-8", delay=False, errors=None,
+                 maxBytes=0, interval=0, backupCount=0):
+        self.index_stream = None
+        self.lock_stream = None
+        self.lock_pid = None
+        self.maxBytes = maxBytes
+        self.interval = interval
+        self.backupCount = backupCount
+        super().__init__(filename, mode, encoding, delay, errors)
+        self.rollover_at = self._first_timestamp() + interval if interval else None
+
+    def _open(self):
+        return open(self.baseFilename, "ab")
+
+    def _first_timestamp(self):
+        """
+        Thời điểm bản ghi đầu tiên của file hiện tại (để xoay vòng theo thời gian đúng sau khi restart)
+        """
+        try:
+            with open(index_path(self.baseFilename), "rb") as idx:
+                return INDEX_ENTRY.unpack(idx.read(INDEX_ENTRY.size))[0]
+        except (OSError, struct.error):
+            return time.time()
+
+    @contextlib.contextmanager
+    def file_lock(self, exclusive=False):
+        if fcntl is None:
+            yield
+            return
+        # flock gắn với file đã mở: process con sau fork phải mở file khoá riêng
+        if self.lock_stream is None or self.lock_pid != os.getpid():
+            if self.lock_stream is not None:
+                self.lock_stream.close()
+            self.lock_stream = open(self.baseFilename + ".lock", "ab")
+            self.lock_pid = os.getpid()
+        fcntl.flock(self.lock_stream, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self.lock_stream, fcntl.LOCK_UN)
+
+    def reopen_if_moved(self):
+        """
+        File đang mở không còn là baseFilename (process khác vừa xoay vòng / xoá)
+        -> đóng file log + index cũ, mở file mới
+        """
+        try:
+            current = os.stat(self.baseFilename)
+        except FileNotFoundError:
+            current = None
+        if self.stream is not None and current is not None:
+            opened = os.fstat(self.stream.fileno())
+            if (opened.st_dev, opened.st_ino) == (current.st_dev, current.st_ino):
+                return
+        for stream in (self.stream, self.index_stream):
+            if stream is not None:
+                stream.close()
+        self.index_stream = None
+        self.stream = self._open()
+        if self.interval:
+            self.rollover_at = self._first_timestamp() + self.interval
+
+    def should_rollover(self, size):
+        if not self.backupCount:
+            return False
+        if self.interval and time.time() >= self.rollover_at:
+            return True
+        if self.maxBytes and self.stream is not None:
+            current = os.fstat(self.stream.fileno()).st_size
+            return current > 0 and current + size > self.maxBytes
+        return False
+
+    def do_rollover(self):
+        for stream in (self.stream, self.index_stream):
+            if stream is not None:
+                stream.close()
+        self.stream = self.index_stream = None
+
+        base = self.baseFilename
+        # Index phải đủ (kể cả dòng do process khác ghi) trước khi segment thành bất biến
+        sync_index(base)
+        for number in range(self.backupCount - 1, 0, -1):
+            source = segment_path(base, number)
+            if os.path.exists(source):
+                os.replace(source, segment_path(base, number + 1))
+                if os.path.exists(index_path(source)):
+                    os.replace(index_path(source), index_path(segment_path(base, number + 1)))
+        rotated = segment_path(base, 1)
+        with open(base, "rb") as source, gzip.open(rotated, "wb") as target:
+            shutil.copyfileobj(source, target)
+        os.replace(index_path(base), index_path(rotated))
+        os.remove(base)
+
+        self.stream = self._open()
+        if self.interval:
+            self.rollover_at = time.time() + self.interval
+
+    def write_record(self, record, data):
+        if self.index_stream is None:
+            self.index_stream = open(index_path(self.baseFilename), "ab")
+        self.stream.write(data)
+        self.stream.flush()
+        # O_APPEND: sau khi ghi, vị trí hiện tại là cuối bản ghi vừa ghi
+        end = self.stream.tell()
+        self.index_stream.write(
+            INDEX_ENTRY.pack(int(record.created), min(record.levelno, 255), end - len(data), len(data))
+        )
+        self.index_stream.flush()
+
+    def emit(self, record):
+        try:
+            data = (self.format(record) + self.terminator).encode(self.encoding or "utf-8")
+            with self.file_lock():
+                self.reopen_if_moved()
+                if not self.should_rollover(len(data)):
+                    self.write_record(record, data)
+                    return
+            # Khoá chia sẻ không nâng lên độc quyền được -> khoá lại rồi kiểm tra lại,
+            # process khác có thể vừa xoay vòng xong
+            with self.file_lock(exclusive=True):
+                self.reopen_if_moved()
+                if self.should_rollover(len(data)):
+                    self.do_rollover()
+                self.write_record(record, data)
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        self.acquire()
+        try:
+            for name in ("index_stream", "lock_stream"):
+                stream = getattr(self, name)
+                if stream is not None:
+                    stream.close()
+                    setattr(self, name, None)
+        finally:
+            self.release()
+        super().close()
+
+class QueueFileHandler(logging.handlers.QueueHandler):
+    """
+    Handler không chặn request thread: bản ghi được đưa vào queue, một
+    QueueListener chạy nền format JSON, ghi file, cập nhật index và xoay
+    vòng (IndexedFileHandler). Cấu hình trong LOGGING như một FileHandler.
+
+    Listener được start lúc load settings. Thread không đi theo fork
+    (vd: gunicorn --preload, multiprocessing) -> process con tạo queue +
+    listener mới ngay sau fork (os.register_at_fork), bản ghi còn trong
+    queue của process cha không bị ghi 2 lần.
+    """
+
+    def __init__(self, filename, maxBytes=0, interval=0, backupCount=0, encoding="utf-8"):
+        # Tạo target trước để logging.shutdown đóng handler này (dừng listener, xả queue) trước target
+        self.target = IndexedFileHandler(
+            filename, encoding=encoding, delay=True,
+            maxBytes=maxBytes, interval=interval, backupCount=backupCount,
+        )
+        super().__init__(queue.SimpleQueue())
+        self.start_listener()
+        atexit.register(self.stop_listener)
+        _queue_handlers.add(self)
+
+    def start_listener(self):
+        self.listener = logging.handlers.QueueListener(self.queue, self.target)
+        self.listener.start()
+
+    def restart_after_fork(self):
+        if self.listener._thread is None:
+            return  # đã dừng (close) ở process cha
+        # Thread listener của process cha không tồn tại trong process con
+        self.listener._thread = None
+        self.queue = queue.SimpleQueue()
+        self.start_listener()
+
+    def setFormatter(self, fmt):
+        # Format chạy trên thread nền -> formatter thuộc về target
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        """
+        Chỉ chốt message (args có thể bị thay đổi sau khi log),
+        phần format JSON để listener làm.
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def stop_listener(self):
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+    def close(self):
+        self.stop_listener()
+        self.target.close()
+        super().close()
+
+### QueueFileHandler đang dùng, khởi động lại listener trong process con sau fork
+_queue_handlers = weakref.WeakSet()
+
+def _restart_listeners_after_fork():
+    for handler in list(_queue_handlers):
+        handler.restart_after_fork()
+
+os.register_at_fork(after_in_child=_restart_listeners_after_fork)
+
+def iter_lines_reverse(f, end, block_size=TAIL_BLOCK_SIZE):
+    """
+    Đọc file từ vị trí end ngược về đầu file theo từng block.
+    Yield (byte offset đầu dòng, nội dung dòng dạng bytes), dòng mới nhất trước.
+    """
+    pos = end
+    buffer = b""
+    while pos > 0:
+        read_size = min(block_size, pos)
+        pos -= read_size
+        f.seek(pos)
+        buffer = f.read(read_size) + buffer
+        lines = buffer.split(b"\n")
+        # lines[0] có thể là nửa sau của một dòng -> giữ lại cho block kế tiếp
+        line_end = pos + len(buffer)
+        for line in reversed(lines[1:]):
+            line_start = line_end - len(line)
+            if line:
+                yield line_start, line
+            line_end = line_start - 1
+        buffer = lines[0]
+    if buffer:
+        yield 0, buffer
+
+def iter_log_records(log_path, before=None, level=None):
+    """
+    Yield (byte offset, dòng log JSON dạng bytes) mới nhất trước, chỉ các
+    dòng đứng trước byte offset `before` và khớp `level` (lọc ngay khi quét).
+    """
+    # Dòng cũ ghi bằng json.dumps có khoảng trắng sau dấu ":", dòng mới thì không
+    level_markers = (f'"level":"{level}"'.encode(), f'"level": "{level}"'.encode()) if level else None
+    with _open_segment(log_path) as f:
+        end = f.seek(0, os.SEEK_END)
+        if before is not None:
+            end = min(before, end)
+        for offset, line in iter_lines_reverse(f, end):
+            # So khớp bytes trước, chỉ parse JSON các dòng có khả năng khớp
+            if level_markers and not any(marker in line for marker in level_markers):
+                continue
+            try:
+                log = loads(line)
+            except ValueError:
+                continue
+            if level and log.get("level") != level:
+                continue
+            yield offset, line
+
+def _index_entries(line, offset):
+    """
+    Entry index cho 1 dòng log (dùng khi rebuild / bổ sung index)
+    """
+    try:
+        log = loads(line)
+        timestamp = datetime.fromisoformat(log["timestamp"]).timestamp()
+        levelno = logging.getLevelName(log["level"])
+    except (ValueError, KeyError, TypeError, UnicodeDecodeError):
+        return b""
+    if not isinstance(levelno, int):
+        levelno = 0
+    return INDEX_ENTRY.pack(int(timestamp), min(levelno, 255), offset, len(line) + 1)
+
+def sync_index(log_path):
+    """
+    Đảm bảo index khớp với file log:
+    - index hỏng / dài hơn file log (log bị truncate) -> rebuild từ đầu
+    - log có bản ghi chưa được index (vd: ghi trước khi có index) -> index bổ sung phần cuối
+    Segment .gz không đổi sau khi xoay vòng -> chỉ rebuild khi thiếu / hỏng index.
+    """
+    idx_path = index_path(log_path)
+    idx_size = os.path.getsize(idx_path) if os.path.exists(idx_path) else 0
+    if log_path.endswith(".gz") and idx_size and idx_size % INDEX_ENTRY.size == 0:
+        return
+    indexed_end = 0
+    if idx_size and idx_size % INDEX_ENTRY.size == 0:
+        with open(idx_path, "rb") as idx:
+            idx.seek(idx_size - INDEX_ENTRY.size)
+            _, _, offset, length = INDEX_ENTRY.unpack(idx.read(INDEX_ENTRY.size))
+            indexed_end = offset + length
+    with _open_segment(log_path) as f:
+        log_size = f.seek(0, os.SEEK_END)
+        # Entry cuối phải kết thúc ở cuối 1 dòng, không thì file đã bị truncate rồi ghi lại
+        if 0 < indexed_end <= log_size:
+            f.seek(indexed_end - 1)
+            boundary = f.read(1) == b"\n"
+        else:
+            boundary = True
+    rebuild = idx_size % INDEX_ENTRY.size != 0 or indexed_end > log_size or not boundary
+    if rebuild:
+        indexed_end = 0
+    elif indexed_end == log_size:
+        return
+
+    # Ghi đè tại chỗ (không thay file) để handler đang mở index ở chế độ append vẫn ghi đúng file
+    with _open_segment(log_path) as f, open(idx_path, "r+b" if os.path.exists(idx_path) else "wb") as idx:
+        if rebuild:
+            idx.truncate(0)
+        idx.seek(0, os.SEEK_END)
+        f.seek(indexed_end)
+        offset = indexed_end
+        for line in f:
+            if not line.endswith(b"\n"):
+                break  # dòng đang ghi dở
+            idx.write(_index_entries(line.rstrip(b"\n"), offset))
+            offset += len(line)
+
+def _read_index_entry(idx, position):
+    idx.seek(position * INDEX_ENTRY.size)
+    return INDEX_ENTRY.unpack(idx.read(INDEX_ENTRY.size))
+
+def _bisect_index(idx, count, timestamp):
+    """
+    Vị trí entry đầu tiên có timestamp >= timestamp
+    """
+    lo, hi = 0, count
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if _read_index_entry(idx, mid)[0] < timestamp:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+def iter_indexed_records(log_path, before=None, level=None, since=None, until=None):
+    """
+    Như iter_log_records nhưng dùng sidecar index: tìm nhị phân khoảng
+    [since, until] trong index, lọc level trên index rồi seek thẳng tới
+    các offset khớp trong file log. Mới nhất trước.
+    """
+    sync_index(log_path)
+    levelno = logging.getLevelName(level) if level else None
+    with open(index_path(log_path), "rb") as idx:
+        count = os.fstat(idx.fileno()).st_size // INDEX_ENTRY.size
+        lo = _bisect_index(idx, count, int(since.timestamp()) - INDEX_TIME_SLACK) if since else 0
+        hi = _bisect_index(idx, count, int(until.timestamp()) + INDEX_TIME_SLACK + 1) if until else count
+        if lo >= hi:
+            return  # segment nằm ngoài khoảng thời gian -> không cần mở (giải nén) file log
+        with _open_segment(log_path) as f:
+            seen = set()
+            while hi > lo:
+                start = max(lo, hi - INDEX_READ_ENTRIES)
+                idx.seek(start * INDEX_ENTRY.size)
+                chunk = idx.read((hi - start) * INDEX_ENTRY.size)
+                hi = start
+                for _, entry_level, offset, length in reversed(list(INDEX_ENTRY.iter_unpack(chunk))):
+                    if levelno is not None and entry_level != levelno:
+                        continue
+                    if before is not None and offset >= before:
+                        continue
+                    if offset in seen:
+                        continue
+                    seen.add(offset)
+                    f.seek(offset)
+                    line = f.read(length).rstrip(b"\n")
+                    try:
+                        log = loads(line)
+                        timestamp = datetime.fromisoformat(log["timestamp"])
+                    except (ValueError, KeyError, TypeError, UnicodeDecodeError):
+                        continue
+                    # Index chỉ chính xác tới giây -> lọc lại chính xác theo timestamp trong log
+                    if (since and timestamp < since) or (until and timestamp > until):
+                        continue
+                    yield offset, line
+
+def parse_log_cursor(value):
+    """
+    Cursor next_before: "<offset>" (file hiện tại) hoặc "<segment>:<offset>"
+    ("<segment>:" = từ cuối segment). Trả về (segment, offset | None).
+    """
+    if value is None:
+        return 0, None
+    segment, separator, offset = value.partition(":")
+    if not separator:
+        segment, offset = "0", value
+    segment = int(segment)
+    offset = int(offset) if offset else None
+    if segment < 0 or (offset is not None and offset < 0):
+        raise ValueError("Invalid cursor.")
+    return segment, offset
+
+def format_log_cursor(segment, offset):
+    return offset if segment == 0 else f"{segment}:{offset if offset is not None else ''}"
+
+def iter_segment_records(log_path, cursor=(0, None), level=None, since=None, until=None):
+    """
+    Đọc lần lượt file hiện tại rồi các segment đã xoay vòng (mới nhất trước).
+    Yield (segment, byte offset, dòng log). Nếu file vừa xoay vòng giữa
+    2 lần gọi, cursor cũ có thể lệch đi 1 segment.
+    """
+    start_segment, before = cursor
+    indexed = bool(level or since or until)
+    for number, path in enumerate(log_segments(log_path)):
+        if number < start_segment:
+            continue
+        segment_before = before if number == start_segment else None
+        if indexed:
+            records = iter_indexed_records(path, segment_before, level, since, until)
+        else:
+            records = iter_log_records(path, segment_before)
+        for offset, line in records:
+            yield number, offset, line
+
+def _stream_logs(log_path, records, limit):
+    """
+    Stream {"logs": [...], "next_before": cursor} - next_before là cursor
+    để xem tiếp về trước, null nếu đã đọc hết (cả các segment cũ).
+    """
+    yield b'{"logs": ['
+    count = 0
+    next_before = None
+    for segment, offset, line in records:
+        yield (b", " if count else b"") + line
+        count += 1
+        if count == limit:
+            if offset:
+                next_before = format_log_cursor(segment, offset)
+            elif os.path.exists(segment_path(log_path, segment + 1)):
+                next_before = format_log_cursor(segment + 1, None)
+            break
+    yield b'], "next_before": ' + dumps(next_before) + b'}'
+
+def _parse_log_time(value):
+    """
+    ISO 8601 -> datetime naive theo giờ local (giống timestamp trong log)
+    """
+    if not value:
+        return None
+    value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value
 
 def view_logs_base(request,file_name):
+    """
+    Xem log mới nhất trước (không load cả file).
+    Query params:
+    - limit: số bản ghi tối đa (mặc định 100, tối đa 1000)
+    - before: cursor (next_before của lần gọi trước) để xem tiếp về trước,
+      kể cả sang các segment đã xoay vòng
+    - level: lọc theo level (INFO, ERROR, ...)
+    - since / until: khoảng thời gian (ISO 8601), dùng cùng sidecar index
+    """
 
     ### check if super user
     if not request.user.is_superuser:
@@ -29,24 +552,30 @@ def view_logs_base(request,file_name):
         raise Http404("Log file not found")
 
     level_filter = request.GET.get("level")
+    level_filter = level_filter.upper() if level_filter else None
+    try:
+        limit = min(int(request.GET.get("limit", DEFAULT_TAIL_LIMIT)), MAX_TAIL_LIMIT)
+        cursor = parse_log_cursor(request.GET.get("before"))
+    except ValueError:
+        return FastJsonResponse({"error": "limit must be an integer and before must be a valid cursor."}, status=400)
+    if limit <= 0:
+        return FastJsonResponse({"error": "limit must be positive."}, status=400)
+    try:
+        since = _parse_log_time(request.GET.get("since"))
+        until = _parse_log_time(request.GET.get("until"))
+    except ValueError:
+        return FastJsonResponse({"error": "since and until must be ISO 8601 datetimes."}, status=400)
 
-    logs = []
-
-    with open(log_path, "r", encoding="utf-8") as f:
-        for line in f.readlines():
-            try:
-                log = json.loads(line)
-                if level_filter and log["level"] != level_filter.upper():
-                    continue
-                logs.append(log)
-            except json.JSONDecodeError:
-                continue
-
-    return JsonResponse({"logs": logs}, json_dumps_params={"ensure_ascii": False})
+    # Có điều kiện lọc -> dùng sidecar index, không thì đọc ngược từ cuối file
+    records = iter_segment_records(log_path, cursor, level_filter, since, until)
+    return StreamingHttpResponse(
+        _stream_logs(log_path, records, limit),
+        content_type="application/json; charset=utf-8",
+    )
 
 def clear_logs(request,file_name):
     """
-    Xoá nội dung file log (truncate). Trả về JSON success/fail.
+    Xoá nội dung file log (truncate) và các segment đã xoay vòng. Trả về JSON success/fail.
     POST only. (Frontend phải gửi CSRF token)
     """
     ### check if super user
@@ -62,6 +591,14 @@ def clear_logs(request,file_name):
         # Option 1: truncate file
         with open(log_path, "w", encoding="utf-8") as f:
             f.truncate(0)
-        return JsonResponse({"ok": True, "message": "Log file cleared."})
+        # Index cũ không còn đúng -> truncate theo
+        if os.path.exists(index_path(log_path)):
+            with open(index_path(log_path), "r+b") as idx:
+                idx.truncate(0)
+        for path in log_segments(log_path)[1:]:
+            os.remove(path)
+            if os.path.exists(index_path(path)):
+                os.remove(index_path(path))
+        return FastJsonResponse({"ok": True, "message": "Log file cleared."})
     except Exception as e:
-        return JsonResponse({"ok": False, "message": f"Failed to clear log: {e}"}, status=500)
\ No newline at end of file
+        return FastJsonResponse({"ok": False, "message": f"Failed to clear log: {e}"}, status=500)
\ No newline at end of file
@@ -0,0 +1,196 @@
+import base64
+import binascii
+import json
+from math import ceil
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+from utils.counting import count_rows
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values, reverse=False, ordering=()):
+    """
+    Mã hoá vị trí (giá trị các cột sắp xếp của bản ghi biên) thành token
+    mờ (opaque) để client gửi lại qua ?cursor=. Token gắn với ordering:
+    dùng cho ordering khác -> InvalidCursor.
+    """
+    payload = json.dumps({"v": list(values), "r": reverse, "o": list(ordering)}, separators=(",", ":"), ensure_ascii=False)
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token, ordering=()):
+    """
+    Giải mã token cursor -> (values, reverse)
+    Raise InvalidCursor nếu token bị sửa / không hợp lệ / thuộc ordering khác
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+        values = payload["v"]
+        reverse = bool(payload.get("r", False))
+        token_ordering = payload.get("o", [])
+    except (binascii.Error, UnicodeError, ValueError, KeyError, TypeError, AttributeError):
+        raise InvalidCursor("Invalid cursor.")
+    if not isinstance(values, list) or token_ordering != list(ordering):
+        raise InvalidCursor("Invalid cursor.")
+    return values, reverse
+
+
+def coerce_cursor_values(model, ordering, values):
+    """
+    Giá trị trong token -> kiểu của cột sắp xếp (Field.to_python), trước khi vào Q().
+    Raise InvalidCursor nếu thiếu / thừa giá trị, null, không phải giá trị đơn
+    hoặc không chuyển được.
+    """
+    if len(values) != len(ordering):
+        raise InvalidCursor("Invalid cursor.")
+    coerced = []
+    for field, value in zip(ordering, values):
+        if value is None or isinstance(value, (dict, list)):
+            raise InvalidCursor("Invalid cursor.")
+        try:
+            coerced.append(model._meta.get_field(field.lstrip("-")).to_python(value))
+        except (ValidationError, TypeError, ValueError):
+            raise InvalidCursor("Invalid cursor.")
+    return coerced
+
+
+def _flip(field):
+    return field[1:] if field.startswith("-") else f"-{field}"
+
+
+def _seek(ordering, values):
+    """
+    Điều kiện keyset "đứng sau bản ghi có values" theo thứ tự ordering:
+    (a > x) OR (a = x AND b > y) OR ...
+    Chỉ dùng so sánh trên các cột đã có index nên không phải OFFSET.
+    """
+    condition = Q()
+    equal = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip("-")
+        lookup = "lt" if field.startswith("-") else "gt"
+        condition |= equal & Q(**{f"{name}__{lookup}": value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+class CursorPaginator:
+    """
+    Phân trang keyset (cursor) cho các API danh sách.
+
+    ordering phải kết thúc bằng một cột duy nhất (vd: id) để thứ tự ổn định.
+    Kết quả trả về gồm results (list object) và link next/previous.
+    """
+
+    def __init__(self, ordering=("name", "id"), limit=10):
+        self.ordering = tuple(ordering)
+        self.limit = limit
+
+    def _values(self, obj):
+        # obj là model instance hoặc dict (queryset.values())
+        if isinstance(obj, dict):
+            return [obj[field.lstrip("-")] for field in self.ordering]
+        return [getattr(obj, field.lstrip("-")) for field in self.ordering]
+
+    def _link(self, request, token):
+        if token is None:
+            return None
+        params = request.query_params.copy() if hasattr(request, "query_params") else request.GET.copy()
+        params.pop("page", None)
+        params["cursor"] = token
+        return request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
+
+    def paginate(self, request, queryset, token=None):
+        if token:
+            values, reverse = decode_cursor(token, self.ordering)
+            values = coerce_cursor_values(queryset.model, self.ordering, values)
+        else:
+            values, reverse = None, False
+
+        ordering = [_flip(field) for field in self.ordering] if reverse else list(self.ordering)
+        if values is not None:
+            queryset = queryset.filter(_seek(ordering, values))
+        rows = list(queryset.order_by(*ordering)[: self.limit + 1])
+
+        has_more = len(rows) > self.limit
+        rows = rows[: self.limit]
+        if reverse:
+            rows.reverse()
+            has_next, has_previous = values is not None, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+
+        next_token = encode_cursor(self._values(rows[-1]), ordering=self.ordering) if rows and has_next else None
+        previous_token = (
+            encode_cursor(self._values(rows[0]), reverse=True, ordering=self.ordering) if rows and has_previous else None
+        )
+        return {
+            "next": self._link(request, next_token),
+            "previous": self._link(request, previous_token),
+            "page_size": self.limit,
+            "results": rows,
+        }
+
+
+def wants_cursor(request):
+    """
+    Chế độ cursor là opt-in: ?pagination=cursor hoặc có ?cursor=
+    """
+    params = request.query_params
+    return params.get("pagination") == "cursor" or bool(params.get("cursor"))
+
+
+def page_params(params):
+    """
+    Đọc page / limit (phân trang page/limit và cursor). limit lớn hơn
+    CATALOG_PAGINATION["MAX_LIMIT"] bị giảm về MAX_LIMIT.
+    Raise ValueError nếu không phải số nguyên dương.
+    """
+    config = settings.CATALOG_PAGINATION
+    try:
+        page = int(params.get("page", 1))
+        limit = int(params.get("limit", config["DEFAULT_LIMIT"]))
+    except ValueError:
+        raise ValueError("Page and limit must be integers.")
+    if page < 1 or limit < 1:
+        raise ValueError("Page and limit must be positive integers.")
+    return page, min(limit, config["MAX_LIMIT"])
+
+
+def paginate_page(queryset, page, limit, include_total=True, count_strategy="exact"):
+    """
+    Phân trang page/limit. Lấy limit + 1 dòng để biết has_next mà không cần count.
+    include_total=False -> bỏ qua count (total_items / total_pages = None).
+    total_exact cho biết total_items là số chính xác hay ước lượng / từ cache.
+    """
+    start = (page - 1) * limit
+    rows = list(queryset[start:start + limit + 1])
+    has_next = len(rows) > limit
+    rows = rows[:limit]
+
+    total_items = total_pages = total_exact = None
+    if include_total:
+        if page == 1 and not has_next:
+            # Trang đầu đã chứa tất cả -> biết chính xác mà không cần count
+            total_items, total_exact = len(rows), True
+        else:
+            total_items, total_exact = count_rows(queryset, count_strategy)
+            # Ước lượng không được mâu thuẫn với các dòng đã đọc
+            total_items = max(total_items, start + len(rows) + (1 if has_next else 0))
+        total_pages = ceil(total_items / limit)
+    return {
+        "total_items": total_items,
+        "total_pages": total_pages,
+        "total_exact": total_exact,
+        "current_page": page,
+        "page_size": limit,
+        "has_next": has_next,
+        "results": rows,
+    }
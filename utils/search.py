@@ -0,0 +1,42 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db.models import Q
+from django.db.models.functions import Greatest, Upper
+
+SEARCH_CONFIG = "simple"  ### Postgres không có stemmer tiếng Việt -> dùng 'simple'
+SEARCH_MODES = ("contains", "fulltext", "trigram")
+DEFAULT_SEARCH_MODE = "contains"
+
+
+def apply_keyword_search(queryset, keyword, mode, fields, vector):
+    """
+    Lọc queryset theo keyword với search_mode:
+    - contains: ILIKE '%keyword%' trên fields (giữ hành vi cũ), dùng GIN
+      index UPPER(field) gin_trgm_ops nên không còn seq scan
+    - fulltext: tsvector (vector) @@ websearch_to_tsquery, xếp theo rank
+    - trigram: so khớp gần đúng (pg_trgm %), xếp theo độ tương đồng
+    Chế độ fulltext / trigram trả về queryset đã sắp xếp theo độ liên quan.
+    """
+    if mode == "contains":
+        condition = Q()
+        for field in fields:
+            condition |= Q(**{f"{field}__icontains": keyword})
+        return queryset.filter(condition)
+
+    if mode == "fulltext":
+        query = SearchQuery(keyword, config=SEARCH_CONFIG, search_type="websearch")
+        queryset = queryset.annotate(search=vector, rank=SearchRank(vector, query)).filter(search=query)
+        return queryset.order_by("-rank", "name")
+
+    if mode == "trigram":
+        # So khớp trên UPPER(field) để dùng chung GIN index với chế độ contains
+        # (pg_trgm không phân biệt hoa thường nên kết quả không đổi)
+        annotations = {f"{field}_upper": Upper(field) for field in fields}
+        condition = Q()
+        for field in fields:
+            condition |= Q(**{f"{field}_upper__trigram_similar": keyword})
+        similarities = [TrigramSimilarity(f"{field}_upper", keyword) for field in fields]
+        similarity = Greatest(*similarities) if len(similarities) > 1 else similarities[0]
+        queryset = queryset.annotate(**annotations).filter(condition).annotate(similarity=similarity)
+        return queryset.order_by("-similarity", "name")
+
+    raise ValueError(f"search_mode must be one of: {', '.join(SEARCH_MODES)}.")
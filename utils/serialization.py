@@ -0,0 +1,51 @@
+from django.db.models import CharField
+from django.db.models.functions import Cast
+
+from images.delivery import image_url_builder
+
+
+class ValuesSerializer:
+    """
+    Serializer rút gọn cho API danh sách: đọc đúng các cột cần qua values(),
+    trả về list dict thường (không tạo model instance / field DRF).
+
+    fields: các key của output theo thứ tự, key có trong image_fields
+    ({key: tên CloudinaryField}) được build thành URL từ giá trị thô trong DB,
+    key có trong srcset_fields lấy map ảnh phái sinh đã lưu trong image_derivatives.
+    Output phải giống hệt serializer DRF tương ứng.
+    """
+
+    model = None
+    fields = ()
+    image_fields = {}
+    srcset_fields = {}
+
+    @classmethod
+    def _raw(cls, key):
+        return f"_{key}_raw"
+
+    @classmethod
+    def queryset(cls, queryset):
+        # Cast -> đọc chuỗi thô, bỏ qua from_db_value của CloudinaryField
+        raw = {cls._raw(key): Cast(name, output_field=CharField()) for key, name in cls.image_fields.items()}
+        columns = [key for key in cls.fields if key not in cls.image_fields and key not in cls.srcset_fields]
+        if cls.srcset_fields:
+            columns.append("image_derivatives")
+        return queryset.values(*columns, **raw)
+
+    @classmethod
+    def rows(cls, rows):
+        # key -> hàm(row), tạo 1 lần cho cả trang
+        getters = {}
+        for key, name in cls.image_fields.items():
+            build = image_url_builder(cls.model._meta.get_field(name))
+            getters[key] = lambda row, build=build, raw=cls._raw(key): build(row[raw])
+        for key, name in cls.srcset_fields.items():
+            getters[key] = lambda row, name=name: (row["image_derivatives"] or {}).get(name) or None
+        return [
+            {
+                key: getters[key](row) if key in getters else row[key]
+                for key in cls.fields
+            }
+            for row in rows
+        ]
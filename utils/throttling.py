@@ -0,0 +1,149 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {"s": 1, "sec": 1, "m": 60, "min": 60, "h": 3600, "hour": 3600, "d": 86400, "day": 86400}
+
+_backend = None
+_backend_config = None
+
+
+def parse_rate(rate):
+    """
+    "60/min" -> (dung lượng bucket, số token hồi lại mỗi giây)
+    Bucket đầy cho phép burst tối đa 60 request, sau đó 1 request / giây.
+    """
+    count, period = rate.split("/")
+    count = int(count)
+    return count, count / PERIODS[period]
+
+
+class LocalTokenBucketBackend:
+    """
+    Token bucket lưu trong bộ nhớ của process (mỗi worker gunicorn có bucket riêng,
+    giới hạn thực tế = rate x số worker). Thay bằng backend dùng chung qua
+    CATALOG_THROTTLE["BACKEND"] nếu cần giới hạn toàn cục.
+    """
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()  ### key -> (số token còn lại, thời điểm cập nhật)
+        self.lock = threading.Lock()
+
+    def consume(self, key, capacity, refill_rate, cost=1):
+        """
+        Lấy cost token từ bucket. Trả về (được phép, số giây cần chờ nếu bị chặn)
+        """
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self.buckets[key] = (tokens, now)
+            # Bỏ bucket ít dùng nhất để bộ nhớ không tăng theo số client
+            while len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        if allowed:
+            return True, 0
+        return False, (cost - tokens) / refill_rate
+
+    def reset(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+def get_backend():
+    """
+    Backend theo settings.CATALOG_THROTTLE = {"BACKEND": ..., "OPTIONS": {...}}
+    (khởi tạo lại nếu settings thay đổi, vd: override_settings trong test)
+    """
+    global _backend, _backend_config
+    config = getattr(settings, "CATALOG_THROTTLE", {})
+    backend_config = (config.get("BACKEND"), config.get("OPTIONS"))
+    if _backend is None or backend_config != _backend_config:
+        backend_class = import_string(config.get("BACKEND") or "utils.throttling.LocalTokenBucketBackend")
+        _backend = backend_class(**(config.get("OPTIONS") or {}))
+        _backend_config = backend_config
+    return _backend
+
+
+def throttle(scope, ident):
+    """
+    Trừ 1 token của client ident trong scope. Trả về số giây cần chờ, 0 nếu được phép
+    (scope không cấu hình rate -> không giới hạn).
+    """
+    rate = getattr(settings, "CATALOG_THROTTLE", {}).get("RATES", {}).get(scope)
+    if not rate:
+        return 0
+    capacity, refill_rate = parse_rate(rate)
+    allowed, wait = get_backend().consume(f"{scope}:{ident}", capacity, refill_rate)
+    return 0 if allowed else wait
+
+
+class CatalogThrottle(BaseThrottle):
+    """
+    Throttle các request tốn kém của API danh sách:
+    - search: có keyword
+    - deep_page: phân trang page/limit với offset >= DEEP_PAGE_OFFSET
+    Request thường (trang đầu, cursor) không bị giới hạn.
+    Client được nhận diện theo user (đã đăng nhập) hoặc IP.
+    """
+
+    def get_scopes(self, request):
+        params = request.query_params
+        scopes = []
+        if params.get("keyword"):
+            scopes.append("search")
+        try:
+            offset = (int(params.get("page", 1)) - 1) * int(params.get("limit", 1))
+        except ValueError:
+            offset = 0
+        if not params.get("cursor") and offset >= settings.CATALOG_THROTTLE.get("DEEP_PAGE_OFFSET", 1000):
+            scopes.append("deep_page")
+        return scopes
+
+    def get_ident(self, request):
+        if request.user and request.user.is_authenticated:
+            return f"user:{request.user.pk}"
+        return super().get_ident(request)
+
+    def allow_request(self, request, view):
+        self.wait_seconds = 0
+        ident = self.get_ident(request)
+        for scope in self.get_scopes(request):
+            self.wait_seconds = max(self.wait_seconds, throttle(scope, ident))
+        return self.wait_seconds == 0
+
+    def wait(self):
+        return self.wait_seconds
+
+
+def throttle_scope(scope):
+    """
+    Token bucket cho view Django thường (không qua DRF), vd: export.
+    Bị chặn -> 429 kèm Retry-After.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            ident = f"user:{request.user.pk}" if request.user.is_authenticated else BaseThrottle().get_ident(request)
+            wait = throttle(scope, ident)
+            if wait:
+                response = JsonResponse({"error": "Request was throttled."}, status=429)
+                response["Retry-After"] = str(math.ceil(wait))
+                return response
+            return view(request, *args, **kwargs)
+
+        return inner
+
+    return decorator